@@ -2,163 +2,186 @@
 """
 批量为章节文件添加docx_type样式标记
 
-根据章节ID自动判断层级并添加对应的样式类型：
+根据大纲层级自动判断并添加对应的样式类型（规则见 style_resolver.py）：
 - 0.1, 0.2 (摘要/Abstract) → abstract_title
 - 纯数字 (1-9) → chapter_title
 - X.X → section_title
 - X.X.X → subsection_title
 - X.X.X.X → subsection_title
 
+导出工具（thesis-to-docx-enhanced.py）已在导出时按同一规则即时解析样式，
+不再依赖章节文件中的docx_type；本工具保留用于给旧版导出工具或其他下游补写标记，
+以及在CI中检查章节文件的标记是否与规则一致。
+
+只写回内容确实变化的文件（临时文件 + 重命名），重复运行不会改动任何文件。
+
 使用方法:
-    python3 add-styles-to-chapters.py
+    python3 add-styles-to-chapters.py [--project 项目根目录] [--check] [--events 目标] [--quiet]
+
+    --check  只检查不写入，有文件需要更新时返回非0（用于CI）
+    --events 写出JSON Lines进度事件（见 pra_events.py），--quiet 不逐项输出
 """
 
+import argparse
 import json
 import os
+import sys
+from collections import Counter
 from pathlib import Path
 
+from pra_events import add_event_arguments, configure_events, events
+from style_resolver import StyleResolver
 
-def determine_style(chapter_id):
-    """根据章节ID确定样式类型"""
-    parts = chapter_id.split('.')
-
-    # 摘要和Abstract
-    if chapter_id in ['0.1', '0.2']:
-        return {
-            'title_style': 'abstract_title',
-            'text_style': 'abstract_content'
-        }
-
-    # 一级标题（第X章）
-    if len(parts) == 1 and parts[0].isdigit():
-        # 特殊处理：参考文献、致谢等
-        chapter_num = int(parts[0])
-        if chapter_num >= 7:  # 第7章是结论，第8章是参考文献，第9章是致谢
-            return {
-                'title_style': 'chapter_title',
-                'text_style': 'body_text'
-            }
-        return {
-            'title_style': 'chapter_title',
-            'text_style': 'body_text'
-        }
-
-    # 二级标题（X.X）
-    if len(parts) == 2:
-        return {
-            'title_style': 'section_title',
-            'text_style': 'body_text'
-        }
-
-    # 三级标题（X.X.X）
-    if len(parts) == 3:
-        return {
-            'title_style': 'subsection_title',
-            'text_style': 'body_text'
-        }
-
-    # 四级及以上标题（X.X.X.X）
-    if len(parts) >= 4:
-        return {
-            'title_style': 'subsection_title',
-            'text_style': 'body_text'
-        }
-
-    # 默认
+
+def determine_style(chapter_id, resolver=None):
+    """根据章节ID确定样式类型（规则与导出工具共用 style_resolver）"""
+    style = (resolver or StyleResolver()).resolve(chapter_id)
     return {
-        'title_style': 'body_text',
-        'text_style': 'body_text'
+        'title_style': style['docx_type'],
+        'text_style': style['docx_type_text']
     }
 
 
-def add_styles_to_chapter(chapter_file):
-    """为单个章节文件添加样式标记"""
-    try:
-        # 读取章节文件
-        with open(chapter_file, 'r', encoding='utf-8') as f:
-            chapter_data = json.load(f)
+def apply_styles(chapter_data, resolver=None):
+    """
+    在内存中计算添加样式标记后的章节数据（不修改传入的字典）
+
+    返回:
+        tuple: (新数据, 标题样式)，缺少id时返回 (None, None)
+    """
+    chapter_id = chapter_data.get('id', '')
+    if not chapter_id:
+        return None, None
+
+    styles = determine_style(chapter_id, resolver)
+    styled = dict(chapter_data)
 
-        # 获取章节ID
-        chapter_id = chapter_data.get('id', '')
-        if not chapter_id:
-            print(f"  ⚠️  {chapter_file.name}: 缺少id字段，跳过")
-            return False
+    # 添加样式标记
+    styled['docx_type'] = styles['title_style']
 
-        # 确定样式
-        styles = determine_style(chapter_id)
+    # 如果有content字段，添加文本样式
+    if 'content' in styled and styled['content']:
+        styled['docx_type_text'] = styles['text_style']
 
-        # 添加样式标记
-        chapter_data['docx_type'] = styles['title_style']
+    # 如果有text字段，也添加文本样式
+    if 'text' in styled and styled['text']:
+        styled['docx_type_desc'] = styles['text_style']
 
-        # 如果有content字段，添加文本样式
-        if 'content' in chapter_data and chapter_data['content']:
-            chapter_data['docx_type_text'] = styles['text_style']
+    return styled, styles['title_style']
 
-        # 如果有text字段，也添加文本样式
-        if 'text' in chapter_data and chapter_data['text']:
-            chapter_data['docx_type_desc'] = styles['text_style']
 
-        # 保存更新后的文件
-        with open(chapter_file, 'w', encoding='utf-8') as f:
-            json.dump(chapter_data, f, ensure_ascii=False, indent=2)
+def write_json_atomic(path, data):
+    """先写临时文件再重命名，中断时不会留下写了一半的章节文件"""
+    temp_file = path.with_name(f'.{path.name}.tmp')
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(temp_file, path)
 
-        print(f"  ✅ {chapter_file.name}: {chapter_id} → {styles['title_style']}")
-        return True
+
+def add_styles_to_chapter(chapter_file, check=False, resolver=None):
+    """
+    为单个章节文件添加样式标记，只在内容确实变化时写回
+
+    返回:
+        tuple: (状态, 标题样式)，状态为 'changed' / 'unchanged' / 'skipped' / 'failed'
+    """
+    try:
+        with open(chapter_file, 'r', encoding='utf-8') as f:
+            chapter_data = json.load(f)
+
+        styled, title_style = apply_styles(chapter_data, resolver)
+        if styled is None:
+            events.warning(f"{chapter_file.name}: 缺少id字段", f"  ⚠️  {chapter_file.name}: 缺少id字段，跳过")
+            return 'skipped', None
+
+        if styled == chapter_data:
+            events.item('chapter', chapter_file.name, status='unchanged', style=title_style)
+            return 'unchanged', title_style
+
+        if check:
+            events.item('chapter', chapter_file.name, f"  ✏️  {chapter_file.name}: 样式标记需要更新 → {title_style}",
+                        status='outdated', style=title_style)
+        else:
+            write_json_atomic(chapter_file, styled)
+            events.item('chapter', chapter_file.name, f"  ✅ {chapter_file.name}: {styled['id']} → {title_style}",
+                        status='changed', style=title_style)
+        return 'changed', title_style
 
     except Exception as e:
-        print(f"  ❌ {chapter_file.name}: 处理失败 - {e}")
-        return False
+        events.warning(f"{chapter_file.name}: {e}", f"  ❌ {chapter_file.name}: 处理失败 - {e}")
+        return 'failed', None
 
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description='批量为章节文件添加docx_type样式标记')
+    parser.add_argument('--project', default=None, help='项目根目录（默认为工具所在目录的上一级）')
+    parser.add_argument('--check', action='store_true', help='只检查不写入，有文件需要更新时返回非0（用于CI）')
+    add_event_arguments(parser)
+    args = parser.parse_args()
+    configure_events('add-styles-to-chapters', args.events, args.quiet)
+
     print("📝 批量为章节文件添加样式标记")
     print("=" * 60)
 
     # 获取项目路径
-    project_root = Path(__file__).parent.parent
+    project_root = Path(args.project) if args.project else Path(__file__).parent.parent
     chapters_dir = project_root / 'paper' / 'chapters'
 
     if not chapters_dir.exists():
         print(f"❌ 章节目录不存在: {chapters_dir}")
-        return
+        return 1
 
     # 获取所有章节JSON文件
     chapter_files = sorted(chapters_dir.glob('chapter.*.json'))
 
     if not chapter_files:
         print(f"❌ 未找到章节文件: {chapters_dir}")
-        return
+        return 1
+
+    # 与导出工具一致：层级取自大纲，并应用 paper/style-overrides.json
+    paper_dir = project_root / 'paper'
+    outline_nodes = []
+    outline_file = paper_dir / 'outline.json'
+    if outline_file.exists():
+        with open(outline_file, 'r', encoding='utf-8') as f:
+            outline_nodes = json.load(f).get('outline', [])
+    resolver = StyleResolver.from_paper_dir(paper_dir, outline_nodes)
 
     print(f"📂 找到 {len(chapter_files)} 个章节文件")
     print()
 
-    # 处理每个文件
-    success_count = 0
-    for chapter_file in chapter_files:
-        if add_styles_to_chapter(chapter_file):
-            success_count += 1
+    # 处理每个文件，同一遍中统计样式
+    status_counts = Counter()
+    style_counts = Counter()
+    with events.stage('styles', chapters=len(chapter_files)):
+        for chapter_file in chapter_files:
+            status, title_style = add_styles_to_chapter(chapter_file, args.check, resolver)
+            status_counts[status] += 1
+            if title_style:
+                style_counts[title_style] += 1
 
     print()
     print("=" * 60)
-    print(f"✅ 完成！成功处理 {success_count}/{len(chapter_files)} 个文件")
+    if args.check:
+        print(f"🔍 检查完成：{status_counts['changed']} 个文件需要更新，"
+              f"{status_counts['unchanged']} 个已是最新")
+    else:
+        print(f"✅ 完成！更新 {status_counts['changed']} 个，"
+              f"未变化 {status_counts['unchanged']} 个（共 {len(chapter_files)} 个文件）")
+    if status_counts['skipped'] or status_counts['failed']:
+        print(f"⚠️  跳过 {status_counts['skipped']} 个，失败 {status_counts['failed']} 个")
 
     # 显示样式统计
     print()
     print("📊 样式统计:")
-    style_counts = {}
-    for chapter_file in chapter_files:
-        try:
-            with open(chapter_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                style = data.get('docx_type', 'unknown')
-                style_counts[style] = style_counts.get(style, 0) + 1
-        except:
-            pass
-
     for style, count in sorted(style_counts.items()):
         print(f"  - {style}: {count} 个")
 
+    if status_counts['failed'] or (args.check and status_counts['changed']):
+        return 1
+    return 0
+
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
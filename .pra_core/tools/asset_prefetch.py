@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+资源预读
+导出开始前收集大纲中全部章节引用的图片和表格，统一检查（缺失、过大、未被引用），
+再由后台线程按构建顺序并发读取（SVG先取栅格缓存）到有界缓冲池中，
+构建线程插入图表时直接取用内存中的数据，不再等待磁盘读取。
+
+缓冲池按字节数限额：超出限额时预读线程等待构建线程用完释放；
+构建线程正在等待的资源始终允许装入，不会因限额而互相等待。
+"""
+
+import threading
+from collections import namedtuple
+
+from path_config import ASSET_FIELDS
+
+# 单个资源超过该大小时在清单中提示（嵌入后会明显增大文档）
+DEFAULT_MAX_ASSET_MB = 10
+DEFAULT_BUFFER_MB = 256
+DEFAULT_WORKERS = 4
+
+IMAGE_SUFFIXES = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg'}
+
+# 存放图表的路径变量（用于查找未被引用的资源）
+ASSET_VARIABLES = ('er', 'uml', 'dfd', 'flow', 'impl', 'tables')
+
+AssetRef = namedtuple('AssetRef', 'chapter_id field raw path kind')
+
+
+def build_order_refs(chapter_data):
+    """按导出工具处理顺序列出章节中的引用：先items（图、表），再章节级的图、表"""
+    refs = []
+    items = chapter_data.get('items')
+    if isinstance(items, list):
+        for index, item in enumerate(items):
+            if isinstance(item, dict):
+                refs.extend(
+                    (f'items[{index}].{field}', item[field])
+                    for field in ASSET_FIELDS if isinstance(item.get(field), str)
+                )
+    refs.extend((field, chapter_data[field]) for field in ASSET_FIELDS if isinstance(chapter_data.get(field), str))
+    return refs
+
+
+class AssetInventory:
+    """
+    资源清单
+
+    属性:
+        refs: [AssetRef]，按构建顺序
+        missing: [(AssetRef, 问题说明)]
+        oversized: [(AssetRef, 字节数)]
+        unreferenced: [路径]
+    """
+
+    def __init__(self, resolver, table_available=None, max_asset_mb=DEFAULT_MAX_ASSET_MB):
+        self.resolver = resolver
+        # 表格可能来自项目快照，由调用方判断是否可用
+        self.table_available = table_available or resolver.exists
+        self.max_asset_bytes = int(max_asset_mb * 1024 * 1024)
+        self.refs = []
+        self.missing = []
+        self.oversized = []
+        self.unreferenced = []
+
+    def collect(self, chapters):
+        """
+        参数:
+            chapters: [(章节ID, 章节数据)]，按构建顺序
+        """
+        referenced = set()
+        for chapter_id, chapter_data in chapters:
+            for field, raw in build_order_refs(chapter_data):
+                kind = 'table' if field.endswith('tablePath') else 'image'
+                path = self.resolver.resolve(raw)
+                ref = AssetRef(chapter_data.get('id', chapter_id), field, raw, path, kind)
+                if path is None:
+                    self.missing.append((ref, self.resolver.check(raw)))
+                    continue
+                referenced.add(str(path))
+                available = self.table_available(path) if kind == 'table' else self.resolver.exists(path)
+                if not available:
+                    self.missing.append((ref, '文件不存在'))
+                    continue
+                stat = self.resolver.stat(path)
+                if stat is not None and stat.st_size > self.max_asset_bytes:
+                    self.oversized.append((ref, stat.st_size))
+                self.refs.append(ref)
+
+        for name in ASSET_VARIABLES:
+            directory = self.resolver.path_vars.get(name)
+            if directory is None or not directory.is_dir():
+                continue
+            suffixes = {'.json'} if name == 'tables' else IMAGE_SUFFIXES
+            for path in sorted(directory.iterdir()):
+                if path.suffix.lower() in suffixes and str(path) not in referenced and not path.name.startswith('.'):
+                    self.unreferenced.append(path)
+        return self
+
+    def print_report(self, verbose_unreferenced=False):
+        images = sum(1 for ref in self.refs if ref.kind == 'image')
+        print(f"  📦 资源清单: 可用 {len(self.refs)} 个（图片 {images}，表格 {len(self.refs) - images}），"
+              f"不可用 {len(self.missing)}，过大 {len(self.oversized)}，未被引用 {len(self.unreferenced)}")
+        if self.missing:
+            print(f"  ⚠️  {len(self.missing)} 个图表资源不可用，导出时将跳过:")
+            for ref, problem in self.missing:
+                print(f"      {ref.chapter_id} {ref.field}: {ref.raw}（{problem}）")
+        for ref, size in self.oversized:
+            print(f"  ⚠️  资源过大: {ref.raw}（{size / 1024 / 1024:.1f} MB）")
+        if self.unreferenced and verbose_unreferenced:
+            for path in self.unreferenced:
+                print(f"      未被引用: {path.name}")
+
+
+class _Entry:
+    __slots__ = ('key', 'index', 'size', 'uses', 'ready', 'data', 'error')
+
+    def __init__(self, key, index, size):
+        self.key = key
+        self.index = index
+        self.size = size
+        self.uses = 1
+        self.ready = False
+        self.data = None
+        self.error = None
+
+
+class AssetPool:
+    """
+    有界预读缓冲池
+
+    参数:
+        keys: 资源键（按首次使用顺序，可重复，重复出现的计入使用次数）
+        loader: loader(key) → (数据, 字节数)，在预读线程中调用
+        size_hint: size_hint(key) → 预估字节数，用于装入前占用额度
+        budget_mb: 缓冲池上限（MB）
+        workers: 预读线程数
+    """
+
+    def __init__(self, keys, loader, size_hint, budget_mb=DEFAULT_BUFFER_MB, workers=DEFAULT_WORKERS):
+        self.loader = loader
+        self.budget = int(budget_mb * 1024 * 1024)
+        self._entries = {}
+        self._order = []
+        for key in keys:
+            if key in self._entries:
+                self._entries[key].uses += 1
+                continue
+            self._entries[key] = _Entry(key, len(self._order), size_hint(key))
+            self._order.append(key)
+
+        self._cond = threading.Condition()
+        self._used = 0
+        self._wanted = -1
+        self._next = 0
+        self._closed = False
+        self.peak = 0
+        self.waits = 0
+        self._threads = [
+            threading.Thread(target=self._worker, daemon=True)
+            for _ in range(min(workers, len(self._order)))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                if self._closed or self._next >= len(self._order):
+                    return
+                entry = self._entries[self._order[self._next]]
+                self._next += 1
+                # 超出额度时等待释放；构建线程已在等待的资源直接装入
+                while (not self._closed and self._used > 0 and self._used + entry.size > self.budget
+                       and entry.index > self._wanted):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                self._used += entry.size
+
+            try:
+                data, size = self.loader(entry.key)
+                error = None
+            except Exception as e:
+                data, size, error = None, entry.size, e
+
+            with self._cond:
+                self._used += size - entry.size
+                entry.size = size
+                entry.data, entry.error, entry.ready = data, error, True
+                self.peak = max(self.peak, self._used)
+                self._cond.notify_all()
+
+    def get(self, key):
+        """取出资源数据（未就绪时等待），最后一次使用后释放额度"""
+        with self._cond:
+            entry = self._entries[key]
+            if entry.index > self._wanted:
+                self._wanted = entry.index
+                self._cond.notify_all()
+            if not entry.ready:
+                self.waits += 1
+            while not entry.ready:
+                self._cond.wait()
+            data, error = entry.data, entry.error
+            entry.uses -= 1
+            if entry.uses <= 0:
+                self._used -= entry.size
+                entry.data = None
+                self._cond.notify_all()
+        if error is not None:
+            raise error
+        return data
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
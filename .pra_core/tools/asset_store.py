@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨项目共享的内容寻址存储
+文件按内容哈希（sha256）存为只读对象，各项目中内容相同的文件（模板、样式配置、
+工具副本、图表等）通过reflink或硬链接指向同一份对象，项目根目录的 .pra-store.json
+记录 {相对路径: 哈希}，可随时从存储中还原。
+
+设置环境变量 PRA_STORE 后，栅格缓存和PlantUML缓存（本身按内容哈希命名）也放到
+存储下的 cache/ 中由所有项目共用，同一张图在任一项目中渲染过即可直接命中。
+
+存储目录（默认 ~/.cache/pra/store，可用 PRA_STORE 指定）:
+    objects/ab/cdef...   按哈希存放的只读对象
+    cache/rasters/       共享栅格缓存
+    cache/plantuml/      共享PlantUML缓存
+
+落地方式（--mode）:
+    auto     依次尝试 reflink → 复制（默认）；ext4等不支持reflink的文件系统上只记录哈希、不节省空间
+    reflink  写时复制克隆（APFS、Btrfs、XFS），各项目可独立修改
+    hardlink 只对不会被改写的原始文档（HARDLINK_PATTERNS：参考论文、学校格式要求、Word模板等）
+             使用硬链接，其余文件仍按 auto 处理。硬链接的文件与存储对象及其他项目共用同一inode，
+             任何原地写入都会同时改掉所有副本，因此不用于章节、图表等工具会重新生成的文件
+    copy     普通复制（只用于还原，不节省空间）
+"""
+
+import errno
+import fnmatch
+import hashlib
+import json
+import os
+import shutil
+import stat
+import subprocess
+import sys
+from pathlib import Path
+
+STORE_ENV = 'PRA_STORE'
+DEFAULT_STORE = Path.home() / '.cache' / 'pra' / 'store'
+MANIFEST_NAME = '.pra-store.json'
+
+MODES = ('auto', 'reflink', 'hardlink', 'copy')
+
+# hardlink 方式下允许硬链接的文件（相对项目根目录）：只读的原始文档，工具不会改写
+HARDLINK_PATTERNS = (
+    'doc_source/*.doc', 'doc_source/*.docx', 'doc_source/*.pdf',
+    'reference-papers/*.doc', 'reference-papers/*.docx', 'reference-papers/*.pdf',
+    'thesis-formats/*.doc', 'thesis-formats/*.docx', 'thesis-formats/*.pdf',
+    'templates/*.docx', 'templates/*.dotx',
+)
+
+# 不纳入存储的目录（版本库、可再生缓存、输出）
+EXCLUDED_DIRS = {'.git', '.cache', '__pycache__', 'node_modules', '.venv', 'venv'}
+
+# Linux FICLONE ioctl
+FICLONE = 0x40049409
+
+READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+
+def store_root(path=None):
+    """存储根目录：参数 > 环境变量 PRA_STORE > ~/.cache/pra/store"""
+    if path:
+        return Path(path).expanduser()
+    return Path(os.environ.get(STORE_ENV) or DEFAULT_STORE).expanduser()
+
+
+def shared_cache_dir(name, fallback):
+    """设置了 PRA_STORE 时返回共享缓存目录 $PRA_STORE/cache/<name>，否则返回项目内的fallback"""
+    root = os.environ.get(STORE_ENV)
+    return Path(root).expanduser() / 'cache' / name if root else Path(fallback)
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """文件内容的sha256（分块读取）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _reflink(source, target):
+    """写时复制克隆，不支持时抛出OSError"""
+    if sys.platform == 'darwin':
+        subprocess.run(['cp', '-c', str(source), str(target)], check=True, capture_output=True)
+        return
+    import fcntl
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.unlink(target)
+            raise
+
+
+def _temp_name(target):
+    return target.with_name(f'.{target.name}.{os.getpid()}.tmp')
+
+
+def _file_mode(source, target):
+    """
+    落地后的权限位：替换已有的独立文件时沿用其权限，否则取source的权限（存储对象只读，
+    保留可执行位）；reflink/copy 得到的是项目自己的文件，总是加上属主写权限
+    """
+    try:
+        if not os.path.samefile(source, target):
+            return stat.S_IMODE(os.stat(target).st_mode) | stat.S_IWUSR
+    except FileNotFoundError:
+        pass
+    return stat.S_IMODE(os.stat(source).st_mode) | stat.S_IWUSR
+
+
+def place(source, target, mode='auto'):
+    """
+    把source以指定方式落地为target（临时文件 + 重命名），reflink/copy 时保留权限位（见 _file_mode）
+
+    返回:
+        str: 实际使用的方式 reflink / hardlink / copy
+    """
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = _temp_name(target)
+    file_mode = _file_mode(source, target)
+    attempts = ('reflink', 'copy') if mode == 'auto' else (mode,)
+    for attempt in attempts:
+        try:
+            if attempt == 'reflink':
+                _reflink(source, temp_file)
+            elif attempt == 'hardlink':
+                os.link(source, temp_file)
+            else:
+                shutil.copyfile(source, temp_file)
+            if attempt != 'hardlink':
+                # reflink/copy 新建的文件是默认权限（macOS的 cp -c 则带上对象的只读权限）
+                os.chmod(temp_file, file_mode)
+            os.replace(temp_file, target)
+            return attempt
+        except (OSError, subprocess.CalledProcessError) as e:
+            if temp_file.exists() or temp_file.is_symlink():
+                temp_file.unlink()
+            # 跨设备、文件系统不支持等情况下尝试下一种方式
+            if attempt == attempts[-1]:
+                raise
+            if isinstance(e, OSError) and e.errno not in (
+                    errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, None):
+                raise
+    return None
+
+
+class AssetStore:
+    """内容寻址存储"""
+
+    def __init__(self, root=None):
+        self.root = store_root(root)
+        self.objects_dir = self.root / 'objects'
+
+    def blob_path(self, digest):
+        return self.objects_dir / digest[:2] / digest[2:]
+
+    def has(self, digest):
+        return self.blob_path(digest).exists()
+
+    def add(self, path, digest=None):
+        """
+        把文件内容存入存储（已存在时不重复写入）
+
+        返回:
+            tuple: (哈希, 是否新增)
+        """
+        digest = digest or file_digest(path)
+        blob = self.blob_path(digest)
+        if blob.exists():
+            return digest, False
+        # 存入副本而不是链接原文件，原文件之后被原地修改也不会破坏对象
+        try:
+            place(path, blob, 'reflink')
+        except (OSError, subprocess.CalledProcessError):
+            place(path, blob, 'copy')
+        # 对象只读（保留可执行位）
+        os.chmod(blob, READ_ONLY | (os.stat(path).st_mode & 0o111))
+        return digest, True
+
+    def materialize(self, digest, target, mode='auto'):
+        """
+        把对象落地到target；已是同一对象（同一inode）时不做任何事
+
+        返回:
+            str | None: 实际使用的方式，未改动时为None
+        """
+        blob = self.blob_path(digest)
+        if not blob.exists():
+            raise FileNotFoundError(f'存储中没有对象 {digest}')
+        target = Path(target)
+        if target.exists() and os.path.samefile(blob, target):
+            return None
+        return place(blob, target, mode)
+
+    def stats(self):
+        """对象数与占用字节数"""
+        count = size = 0
+        if self.objects_dir.exists():
+            for blob in self.objects_dir.rglob('*'):
+                if blob.is_file():
+                    count += 1
+                    size += blob.stat().st_size
+        return count, size
+
+
+def is_hardlink_safe(relative):
+    """相对路径是否属于可以硬链接的只读原始文档"""
+    return any(fnmatch.fnmatch(relative, pattern) for pattern in HARDLINK_PATTERNS)
+
+
+def iter_files(project_root):
+    """项目中需要纳入存储的文件（跳过版本库、缓存和隐藏文件）"""
+    project_root = Path(project_root)
+    for directory, dirs, files in os.walk(project_root):
+        dirs[:] = sorted(d for d in dirs if d not in EXCLUDED_DIRS and not d.startswith('.'))
+        for name in sorted(files):
+            if name.startswith('.') or name.endswith('.tmp'):
+                continue
+            path = Path(directory) / name
+            if path.is_file() and not path.is_symlink():
+                yield path
+
+
+def load_manifest(project_root):
+    manifest_file = Path(project_root) / MANIFEST_NAME
+    if not manifest_file.exists():
+        return {}
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        return json.load(f).get('files', {})
+
+
+def save_manifest(project_root, files):
+    manifest_file = Path(project_root) / MANIFEST_NAME
+    temp_file = _temp_name(manifest_file)
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump({'files': dict(sorted(files.items()))}, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    os.replace(temp_file, manifest_file)
+
+
+def link_mode_for(relative, mode):
+    """按文件确定落地方式：hardlink 只用于原始文档，其余文件退回 auto"""
+    if mode == 'hardlink' and not is_hardlink_safe(relative):
+        return 'auto'
+    return mode
+
+
+def dedupe_project(store, project_root, mode='auto', min_size=1024):
+    """
+    把项目中的文件存入存储并改为指向存储对象，写出 .pra-store.json
+
+    不支持reflink时文件保持原样（只记录哈希），不会为了"链接"而把文件替换成一份新的副本；
+    以前用硬链接落地、但不属于 HARDLINK_PATTERNS 的文件会改回独立的文件。
+
+    参数:
+        mode: hardlink 只用于 HARDLINK_PATTERNS 中的原始文档，其余文件按 auto 处理
+        min_size: 小于该字节数的文件只记录哈希，不改为链接（节省有限）
+
+    返回:
+        dict: {'files': n, 'added': n, 'linked': n, 'unlinked': n, 'saved': 字节, 'modes': {方式: n}}
+    """
+    project_root = Path(project_root)
+    result = {'files': 0, 'added': 0, 'linked': 0, 'unlinked': 0, 'saved': 0, 'modes': {}}
+    manifest = {}
+    for path in iter_files(project_root):
+        size = path.stat().st_size
+        digest, added = store.add(path)
+        relative = path.relative_to(project_root).as_posix()
+        manifest[relative] = digest
+        result['files'] += 1
+        result['added'] += added
+        file_mode = link_mode_for(relative, mode)
+
+        if file_mode != 'hardlink' and path.stat().st_nlink > 1 and os.path.samefile(store.blob_path(digest), path):
+            # 与存储对象共用inode的可写文件：改回独立文件，原地写入不再波及其他项目
+            place(store.blob_path(digest), path, 'auto')
+            result['unlinked'] += 1
+        if size < min_size or file_mode == 'copy':
+            continue
+        try:
+            used = store.materialize(digest, path, 'reflink' if file_mode == 'auto' else file_mode)
+        except (OSError, subprocess.CalledProcessError):
+            if file_mode != 'auto':
+                raise
+            # 文件系统不支持reflink，保留原文件
+            continue
+        if used is not None:
+            result['linked'] += 1
+            result['modes'][used] = result['modes'].get(used, 0) + 1
+            if not added:
+                result['saved'] += size
+    save_manifest(project_root, manifest)
+    return result
+
+
+def restore_project(store, project_root, mode='auto'):
+    """
+    按 .pra-store.json 还原缺失的文件（已存在的文件不覆盖）
+
+    返回:
+        tuple: (还原数, 存储中缺失的对象 [(路径, 哈希)])
+    """
+    project_root = Path(project_root)
+    restored = 0
+    unavailable = []
+    for relative, digest in load_manifest(project_root).items():
+        target = project_root / relative
+        if target.exists():
+            continue
+        if not store.has(digest):
+            unavailable.append((relative, digest))
+            continue
+        store.materialize(digest, target, link_mode_for(relative, mode))
+        restored += 1
+    return restored, unavailable
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DOCX包的低内存处理与保存
+python-docx 默认把每张插图的完整字节保存在内存中直到 doc.save()，图多时（300 DPI
+的PNG几十张）占用数百MB。启用磁盘回读图片部件后，插图时只读取图片头（尺寸、DPI）
+并分块计算哈希，部件中只保存文件路径和哈希，保存时再逐个从磁盘读回写入zip，
+同一时刻只有一张图片的内容在内存中。
+
+save_docx 替代 doc.save()：按与python-docx相同的顺序写出各部件，但
+    - PNG/JPEG/GIF 本身已压缩，直接存储（不再deflate一遍）；磁盘回读的图片分块流式写入
+    - XML等部件按指定级别deflate，较大的部件在线程池中并行压缩（zlib压缩时释放GIL）
+    - 全部部件写完后写出zip中央目录
+    - 输出可复现：部件顺序、zip时间戳固定（设置 SOURCE_DATE_EPOCH 时用该时间，
+      并同步到文档属性中的创建/修改时间），相同内容得到逐字节相同的文件
+
+publish_docx 在此基础上先写临时文件，与现有输出的内容哈希相同时保留原文件不动
+（修改时间不变，下游截图、归档等不会被触发），不同时重命名替换，并写出哈希清单
+.<文件名>.manifest.json（整体sha256与各部件sha256）。
+
+使用方法:
+    from docx_package import enable_spilled_images, save_docx
+    doc = Document()
+    enable_spilled_images(doc)
+    doc.add_picture('figure.png')   # 按路径插入的图片改为磁盘回读
+    save_docx(doc, 'output.docx', level=6)
+    changed, manifest = publish_docx(doc, 'output.docx')
+"""
+
+import hashlib
+import json
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from docx.image.image import Image, _ImageHeaderFactory
+from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+from docx.opc.pkgwriter import _ContentTypesItem
+from docx.package import ImageParts
+from docx.parts.image import ImagePart
+
+# 已压缩的媒体格式，存储时不再deflate
+STORED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+
+DEFAULT_LEVEL = 6
+# 不小于该大小的部件放到线程池中压缩
+PARALLEL_THRESHOLD = 256 * 1024
+STREAM_CHUNK = 1024 * 1024
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+# zip格式能表示的最早时间，未设置 SOURCE_DATE_EPOCH 时统一使用
+FIXED_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+END_RECORD = struct.Struct('<IHHHHIIH')
+
+
+def _file_sha1(path, chunk_size=1024 * 1024):
+    """分块计算SHA1（与python-docx按SHA1合并相同图片的规则一致）"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SpilledImagePart(ImagePart):
+    """只保存路径和哈希的图片部件，内容在保存时才从磁盘读取"""
+
+    def __init__(self, partname, content_type, path, sha1, image):
+        super().__init__(partname, content_type, b'', image)
+        self.path = path
+        self._sha1 = sha1
+        stat = os.stat(path)
+        self._signature = (stat.st_size, stat.st_mtime_ns)
+
+    def check_unchanged(self):
+        """插入后文件被修改时报错，避免把不一致的内容写入文档"""
+        stat = os.stat(self.path)
+        if (stat.st_size, stat.st_mtime_ns) != self._signature:
+            raise RuntimeError(f'插入后图片文件被修改: {self.path}')
+
+    @property
+    def blob(self):
+        self.check_unchanged()
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    @property
+    def sha1(self):
+        return self._sha1
+
+    @property
+    def size(self):
+        return self._signature[0]
+
+
+class SpillingImageParts(ImageParts):
+    """按路径插入的图片创建为 SpilledImagePart，其他（流）保持默认行为"""
+
+    def get_or_add_image_part(self, image_descriptor):
+        if not isinstance(image_descriptor, str):
+            return super().get_or_add_image_part(image_descriptor)
+
+        sha1 = _file_sha1(image_descriptor)
+        matching_image_part = self._get_by_sha1(sha1)
+        if matching_image_part is not None:
+            return matching_image_part
+
+        # 只解析图片头，不把整个文件读入内存
+        with open(image_descriptor, 'rb') as f:
+            image_header = _ImageHeaderFactory(f)
+        image = Image(None, os.path.basename(image_descriptor), image_header)
+        partname = self._next_image_partname(image.ext)
+        image_part = SpilledImagePart(partname, image.content_type, image_descriptor, sha1, image)
+        self.append(image_part)
+        return image_part
+
+
+def enable_spilled_images(doc):
+    """让文档此后按路径插入的图片改为磁盘回读（须在插入第一张图片之前调用）"""
+    package = doc.part.package
+    if 'image_parts' in package.__dict__ and len(package.image_parts):
+        raise RuntimeError('文档中已有图片，无法再切换为磁盘回读')
+    # ImageParts 是 lazyproperty，缓存在实例字典中
+    package.__dict__['image_parts'] = SpillingImageParts()
+
+
+def spilled_image_bytes(doc):
+    """已插入的磁盘回读图片总字节数（未驻留内存）"""
+    return sum(part.size for part in doc.part.package.image_parts if isinstance(part, SpilledImagePart))
+
+
+def _file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_date():
+    """SOURCE_DATE_EPOCH 对应的UTC时间，未设置时返回None"""
+    epoch = os.environ.get('SOURCE_DATE_EPOCH')
+    if not epoch:
+        return None
+    return datetime.fromtimestamp(int(epoch), tz=timezone.utc)
+
+
+def build_date_time():
+    """可复现的zip成员时间"""
+    date = source_date()
+    return FIXED_DATE_TIME if date is None or date.year < 1980 else date.timetuple()[:6]
+
+
+def _dos_date_time(date_time):
+    year, month, day, hour, minute, second = date_time[:6]
+    return (year - 1980) << 9 | month << 5 | day, hour << 11 | minute << 5 | second // 2
+
+
+def _deflate(data, level):
+    """原始deflate流（zip成员格式），返回 (压缩数据, CRC32, sha256)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(), zlib.crc32(data), hashlib.sha256(data).hexdigest()
+
+
+def package_members(doc):
+    """
+    按python-docx的写出顺序列出包中的成员
+
+    返回:
+        list: [(成员名, bytes 或 SpilledImagePart)]
+    """
+    package = doc.part.package
+    date = source_date()
+    if date is not None:
+        doc.core_properties.created = doc.core_properties.modified = date.replace(tzinfo=None)
+    parts = list(package.parts)
+    for part in parts:
+        part.before_marshal()
+    members = [
+        (CONTENT_TYPES_URI.membername, _ContentTypesItem.from_parts(parts).blob),
+        (PACKAGE_URI.rels_uri.membername, package.rels.xml),
+    ]
+    for part in parts:
+        streamed = isinstance(part, SpilledImagePart) and part.partname.ext.lower() in STORED_EXTENSIONS
+        members.append((part.partname.membername, part if streamed else part.blob))
+        if len(part.rels):
+            members.append((part.partname.rels_uri.membername, part.rels.xml))
+    return members
+
+
+class _ZipWriter:
+    """只写zip：逐个写入本地文件头和数据，最后写出中央目录"""
+
+    def __init__(self, f, date_time):
+        self.f = f
+        self.date, self.time = _dos_date_time(date_time)
+        self.entries = []
+
+    def _local_header(self, name, method, crc, compressed, size):
+        return LOCAL_HEADER.pack(0x04034b50, 20, 0, method, self.time, self.date,
+                                 crc, compressed, size, len(name), 0) + name
+
+    def write(self, name, method, data, crc, size):
+        """写入已压缩（或存储）的数据"""
+        name = name.encode('utf-8')
+        if len(data) > 0xFFFFFFFF or size > 0xFFFFFFFF:
+            raise ValueError('部件超过4GB，不支持')
+        offset = self.f.tell()
+        self.f.write(self._local_header(name, method, crc, len(data), size))
+        self.f.write(data)
+        self.entries.append((name, method, crc, len(data), size, offset))
+
+    def write_stream(self, name, path):
+        """从文件分块存储写入，写完后回填CRC和长度，返回内容sha256"""
+        name = name.encode('utf-8')
+        offset = self.f.tell()
+        self.f.write(self._local_header(name, ZIP_STORED, 0, 0, 0))
+        crc = size = 0
+        digest = hashlib.sha256()
+        with open(path, 'rb') as src:
+            for chunk in iter(lambda: src.read(STREAM_CHUNK), b''):
+                crc = zlib.crc32(chunk, crc)
+                digest.update(chunk)
+                size += len(chunk)
+                self.f.write(chunk)
+        if size > 0xFFFFFFFF:
+            raise ValueError('部件超过4GB，不支持')
+        end = self.f.tell()
+        self.f.seek(offset)
+        self.f.write(self._local_header(name, ZIP_STORED, crc, size, size))
+        self.f.seek(end)
+        self.entries.append((name, ZIP_STORED, crc, size, size, offset))
+        return digest.hexdigest()
+
+    def close(self):
+        directory_offset = self.f.tell()
+        for name, method, crc, compressed, size, offset in self.entries:
+            self.f.write(CENTRAL_HEADER.pack(0x02014b50, 20, 20, 0, method, self.time, self.date,
+                                             crc, compressed, size, len(name), 0, 0, 0, 0, 0, offset) + name)
+        directory_size = self.f.tell() - directory_offset
+        self.f.write(END_RECORD.pack(0x06054b50, 0, 0, len(self.entries), len(self.entries),
+                                     directory_size, directory_offset, 0))
+
+
+def save_docx(doc, output_path, level=DEFAULT_LEVEL, jobs=None, date_time=None):
+    """
+    保存文档（已压缩媒体直接存储、大部件并行压缩）
+
+    参数:
+        level: XML等部件的deflate级别（0为全部存储）
+        jobs: 并行压缩线程数（默认CPU核数）
+        date_time: zip成员时间 (年, 月, 日, 时, 分, 秒)，默认为可复现的固定时间（build_date_time）
+
+    返回:
+        dict: {'members': n, 'stored': n, 'deflated': n, 'parallel': n, 'bytes': 未压缩总字节数,
+               'parts': {成员名: sha256}}
+    """
+    members = package_members(doc)
+    stats = {'members': len(members), 'stored': 0, 'deflated': 0, 'parallel': 0, 'bytes': 0, 'parts': {}}
+
+    def plan(name):
+        return ZIP_STORED if level == 0 or name.rsplit('.', 1)[-1].lower() in STORED_EXTENSIONS else ZIP_DEFLATED
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        # 大部件先全部提交，写出时按原顺序取结果
+        futures = {}
+        for index, (name, data) in enumerate(members):
+            if isinstance(data, bytes) and plan(name) == ZIP_DEFLATED and len(data) >= PARALLEL_THRESHOLD:
+                futures[index] = executor.submit(_deflate, data, level)
+        stats['parallel'] = len(futures)
+
+        with open(output_path, 'wb') as f:
+            writer = _ZipWriter(f, date_time or build_date_time())
+            for index, (name, data) in enumerate(members):
+                if isinstance(data, SpilledImagePart):
+                    data.check_unchanged()
+                    stats['parts'][name] = writer.write_stream(name, data.path)
+                    stats['stored'] += 1
+                    stats['bytes'] += data.size
+                    continue
+                stats['bytes'] += len(data)
+                if plan(name) == ZIP_STORED:
+                    writer.write(name, ZIP_STORED, data, zlib.crc32(data), len(data))
+                    stats['parts'][name] = hashlib.sha256(data).hexdigest()
+                    stats['stored'] += 1
+                    continue
+                compressed, crc, digest = futures.pop(index).result() if index in futures else _deflate(data, level)
+                writer.write(name, ZIP_DEFLATED, compressed, crc, len(data))
+                stats['parts'][name] = digest
+                stats['deflated'] += 1
+            writer.close()
+    return stats
+
+
+def manifest_path(output_path):
+    """输出文件的哈希清单 .<文件名>.manifest.json（与输出同目录）"""
+    output_path = Path(output_path)
+    return output_path.with_name(f'.{output_path.name}.manifest.json')
+
+
+def current_digest(output_path):
+    """现有输出的sha256：清单记录的大小和修改时间与文件一致时直接取用，否则重新计算"""
+    output_path = Path(output_path)
+    if not output_path.exists():
+        return None
+    stat = output_path.stat()
+    try:
+        with open(manifest_path(output_path), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('size') == stat.st_size and manifest.get('mtime_ns') == stat.st_mtime_ns:
+            return manifest['sha256']
+    except (OSError, ValueError, KeyError):
+        pass
+    return _file_sha256(output_path)
+
+
+def publish_docx(doc, output_path, level=DEFAULT_LEVEL, jobs=None):
+    """
+    可复现地保存文档，内容未变化时不改动现有文件
+
+    返回:
+        tuple: (是否写出了新文件, 清单dict)；清单含 sha256、size、parts 以及 save_docx 的统计
+    """
+    output_path = Path(output_path)
+    temp_file = output_path.with_name(f'.{output_path.name}.{os.getpid()}.tmp')
+    try:
+        stats = save_docx(doc, temp_file, level, jobs)
+        digest = _file_sha256(temp_file)
+        changed = digest != current_digest(output_path)
+        if changed:
+            os.replace(temp_file, output_path)
+    finally:
+        if temp_file.exists():
+            temp_file.unlink()
+
+    stat = output_path.stat()
+    manifest = {
+        'sha256': digest,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'parts': stats.pop('parts'),
+    }
+    manifest_file = manifest_path(output_path)
+    temp_manifest = manifest_file.with_name(f'{manifest_file.name}.{os.getpid()}.tmp')
+    with open(temp_manifest, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    os.replace(temp_manifest, manifest_file)
+    manifest['stats'] = stats
+    return changed, manifest
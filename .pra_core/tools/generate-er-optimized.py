@@ -6,22 +6,173 @@
 支持多层圆环布局，优化字段过多的表
 """
 
+import argparse
+import hashlib
 import json
 import math
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from xml.sax.saxutils import escape
+
+from pra_events import add_event_arguments, configure_events, events
+from raster_cache import RASTER_SUPPORT, cache_dir_for, print_batch_stats, rasterize_batch
+from svg_optimize import optimize_svg
+from text_metrics import measure_text
+
+# 生成器版本：布局算法变化时递增，使清单中的旧记录全部失效
+GENERATOR_VERSION = 3
+
+# 布局参数（参与输入哈希计算，修改后对应的图会重新生成）
+LAYOUT_PARAMS = {
+    'rect_min_width': 180,      # 中心矩形最小宽度，表名较长时按文字加宽
+    'rect_height': 80,
+    'title_font_size': 18,
+    'field_font_size': 14,
+    'ellipse_ry': 32,
+    'ellipse_min_rx': 60,       # 椭圆最小横半径，字段名较长时按文字加宽
+    'text_padding': 12,         # 文字与椭圆边缘的水平留白
+    'gap': 16,                  # 椭圆之间、椭圆与矩形之间的最小间距
+    'min_ring_radius': 220,     # 第一层圆环的最小横半径
+    'ring_aspect': 0.75,        # 圆环纵横比（与A4版心比例接近）
+    'margin': 20,               # 画布四周留白
+}
+
+MANIFEST_NAME = '.er-manifest.json'
+
+
+def fit_ellipse_rx(text):
+    """椭圆横半径：保证单行文字（含留白）完整落在椭圆内"""
+    ry = LAYOUT_PARAMS['ellipse_ry']
+    half_text_w = measure_text(text, LAYOUT_PARAMS['field_font_size']) / 2 + LAYOUT_PARAMS['text_padding']
+    half_text_h = LAYOUT_PARAMS['field_font_size'] / 2
+    # 文字框角点 (w, h) 落在椭圆上： (w/rx)^2 + (h/ry)^2 = 1
+    rx = half_text_w / math.sqrt(1 - (half_text_h / ry) ** 2)
+    return max(LAYOUT_PARAMS['ellipse_min_rx'], rx)
+
+
+def ring_angles(count, ring_index):
+    """圆环上均匀分布的角度，从顶部开始；奇数层错开半个间隔，避免与内层对齐"""
+    step = 2 * math.pi / count
+    offset = -math.pi / 2 + (step / 2 if ring_index % 2 else 0)
+    return [offset + step * i for i in range(count)]
+
+
+def ring_points(a, b, angles):
+    """整层计算椭圆圆环上的点"""
+    return [(a * math.cos(t), b * math.sin(t)) for t in angles]
+
+
+def ellipses_clear(p, q, hx, hy):
+    """
+    两个椭圆（横半径均不超过hx-间距/2）是否互不重叠
+
+    将坐标按 (hx, hy) 缩放后两个椭圆都变成单位圆，圆心距离不小于2即不重叠
+    """
+    return math.hypot((p[0] - q[0]) / hx, (p[1] - q[1]) / hy) >= 2
+
+
+def ring_capacity(a, b, ring_index, hx, hy, limit):
+    """该层圆环最多能放下的椭圆数量（相邻椭圆互不重叠）"""
+    capacity = 1
+    for count in range(2, limit + 1):
+        points = ring_points(a, b, ring_angles(count, ring_index))
+        if not all(ellipses_clear(points[i - 1], points[i], hx, hy) for i in range(count)):
+            break
+        capacity = count
+    return capacity
+
+
+def distribute(total, capacities):
+    """按各层容量比例分配字段数，避免内层挤满、外层只剩零星几个"""
+    capacity_sum = sum(capacities)
+    counts = [total * c // capacity_sum for c in capacities]
+    ring = 0
+    while sum(counts) < total:
+        if counts[ring] < capacities[ring]:
+            counts[ring] += 1
+        ring = (ring + 1) % len(counts)
+    return [c for c in counts if c]
+
+
+def layout_fields(rxs, rect_half_w, rect_half_h):
+    """
+    多层圆环布局
+
+    参数:
+        rxs: 各字段椭圆横半径
+        rect_half_w, rect_half_h: 中心矩形半宽、半高
+
+    返回:
+        list: 各字段椭圆中心坐标（相对矩形中心），顺序与 rxs 一致
+    """
+    ry = LAYOUT_PARAMS['ellipse_ry']
+    gap = LAYOUT_PARAMS['gap']
+    # 碰撞检测统一按最宽椭圆外扩半个间距计算，任意两个字段互换位置都不会重叠
+    hx = max(rxs) + gap / 2
+    hy = ry + gap / 2
+
+    scale = 1.0
+    while True:
+        # 第一层避开中心矩形，之后每层向外推进一个椭圆的宽度，纵向按圆环纵横比同步推进
+        a1 = max(LAYOUT_PARAMS['min_ring_radius'], rect_half_w + 2 * hx) * scale
+        b1 = max(a1 * LAYOUT_PARAMS['ring_aspect'], rect_half_h + 2 * hy)
+        pitch_a = 2 * hx * scale
+        pitch_b = max(pitch_a * LAYOUT_PARAMS['ring_aspect'], 2 * hy)
+
+        capacities = []
+        remaining = len(rxs)
+        while remaining > 0:
+            k = len(capacities)
+            cap = ring_capacity(a1 + k * pitch_a, b1 + k * pitch_b, k, hx, hy, remaining)
+            capacities.append(cap)
+            remaining -= cap
+
+        positions = []
+        for k, count in enumerate(distribute(len(rxs), capacities)):
+            positions.extend(ring_points(a1 + k * pitch_a, b1 + k * pitch_b, ring_angles(count, k)))
+
+        if layout_is_clear(positions, rxs, rect_half_w, rect_half_h):
+            return positions
+        # 错层角度导致相邻层个别椭圆相碰时整体外扩重试
+        scale *= 1.1
+
+
+def layout_is_clear(positions, rxs, rect_half_w, rect_half_h):
+    """最终校验：椭圆之间、椭圆与中心矩形之间均无重叠"""
+    ry = LAYOUT_PARAMS['ellipse_ry']
+    gap = LAYOUT_PARAMS['gap']
+    for i, (x, y) in enumerate(positions):
+        if abs(x) < rect_half_w + rxs[i] + gap and abs(y) < rect_half_h + ry + gap:
+            return False
+        for j in range(i):
+            hx = max(rxs[i], rxs[j]) + gap / 2
+            if not ellipses_clear((x, y), positions[j], hx, ry + gap / 2):
+                return False
+    return True
+
+
+def rect_edge_point(half_w, half_h, dx, dy):
+    """从矩形中心沿 (dx, dy) 方向射出与矩形边框的交点（相对矩形中心）"""
+    t = min(half_w / abs(dx) if dx else math.inf, half_h / abs(dy) if dy else math.inf)
+    return dx * t, dy * t
+
+
+def ellipse_edge_point(cx, cy, rx, ry, tx, ty):
+    """从椭圆中心指向 (tx, ty) 的射线与椭圆边缘的交点（精确连线）"""
+    dx, dy = tx - cx, ty - cy
+    t = 1 / math.hypot(dx / rx, dy / ry)
+    return cx + dx * t, cy + dy * t
 
 
-def calculate_ellipse_point(cx, cy, rx, ry, angle):
-    """计算椭圆边缘上的点（精确连线）"""
-    x = cx + rx * math.cos(angle)
-    y = cy + ry * math.sin(angle)
-    return x, y
+def num(value):
+    """坐标输出保留两位小数"""
+    return round(value, 2)
 
 
 def generate_single_er(table_json_path, output_dir):
-    """生成单个表的ER图SVG（支持多层圆环布局）"""
+    """生成单个表的ER图SVG（多层圆环布局），返回 (输出文件路径, 字段数)；没有字段时抛出ValueError"""
 
     # 读取JSON
     with open(table_json_path, 'r', encoding='utf-8') as f:
@@ -36,124 +187,144 @@ def generate_single_er(table_json_path, output_dir):
     field_count = len(fields)
 
     if field_count == 0:
-        print(f"警告：{table_name} 没有字段数据")
-        return False
-
-    # SVG画布尺寸
-    width = 1200
-    height = 900
-
-    # 中心矩形（表实体）
-    rect_cx = width / 2
-    rect_cy = height / 2
-    rect_width = 180
-    rect_height = 80
-
-    # 椭圆（字段属性）
-    ellipse_rx = 85
-    ellipse_ry = 32
-
-    # 动态半径策略（单层布局，根据字段数量调整半径）
-    if field_count <= 8:
-        radius = 250  # 紧凑
-    elif field_count <= 12:
-        radius = 320  # 适中
-    elif field_count <= 16:
-        radius = 380  # 宽松
-    else:
-        radius = 420  # 超多字段
+        # 在进程池中运行，不直接输出：由主进程按失败记录（事件流、--quiet 都生效）
+        raise ValueError(f'{table_name} 没有字段数据')
+
+    field_names = [str(field[1]) for field in fields]
+    title_font = LAYOUT_PARAMS['title_font_size']
+    field_font = LAYOUT_PARAMS['field_font_size']
+    ry = LAYOUT_PARAMS['ellipse_ry']
+    margin = LAYOUT_PARAMS['margin']
+
+    # 中心矩形（表实体），宽度随表名加宽
+    rect_width = max(LAYOUT_PARAMS['rect_min_width'], measure_text(table_cn_name, title_font) + 40)
+    rect_height = LAYOUT_PARAMS['rect_height']
+
+    # 椭圆（字段属性）按文字宽度定尺寸，再做多层圆环布局
+    rxs = [fit_ellipse_rx(name) for name in field_names]
+    positions = layout_fields(rxs, rect_width / 2, rect_height / 2)
+
+    # 画布收缩到实际内容范围
+    min_x = min([-rect_width / 2] + [x - rx for (x, _), rx in zip(positions, rxs)])
+    max_x = max([rect_width / 2] + [x + rx for (x, _), rx in zip(positions, rxs)])
+    min_y = min([-rect_height / 2] + [y - ry for _, y in positions])
+    max_y = max([rect_height / 2] + [y + ry for _, y in positions])
+    width = math.ceil(max_x - min_x + 2 * margin)
+    height = math.ceil(max_y - min_y + 2 * margin)
+    rect_cx = margin - min_x
+    rect_cy = margin - min_y
 
     svg_lines = []
     svg_lines.append('<?xml version="1.0" encoding="UTF-8"?>')
     svg_lines.append(f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}" xmlns="http://www.w3.org/2000/svg">')
-    svg_lines.append(f'  <rect width="{width}" height="{height}" fill="#ffffff"/>')
 
     # 绘制中心矩形
     rect_x = rect_cx - rect_width / 2
     rect_y = rect_cy - rect_height / 2
-    svg_lines.append(f'  <rect x="{rect_x}" y="{rect_y}" width="{rect_width}" height="{rect_height}" fill="#fff" stroke="#333" stroke-width="3"/>')
-    svg_lines.append(f'  <text x="{rect_cx}" y="{rect_cy + 6}" text-anchor="middle" font-family="Microsoft YaHei, SimHei, Arial" font-size="18" font-weight="bold" fill="#333">{table_cn_name}</text>')
-
-    # 绘制椭圆（单层布局，动态半径）
-    for i, field in enumerate(fields):
-        field_cn_name = field[1]
-
-        # 计算角度（均匀分布）
-        angle = 2 * math.pi * i / field_count - math.pi / 2  # 从顶部开始
-
-        # 计算椭圆中心位置
-        ellipse_cx = rect_cx + radius * math.cos(angle)
-        ellipse_cy = rect_cy + radius * math.sin(angle)
-
-        # 计算矩形边缘到椭圆中心的连线角度
-        dx = ellipse_cx - rect_cx
-        dy = ellipse_cy - rect_cy
-        angle_to_ellipse = math.atan2(dy, dx)
-
-        # 计算矩形边缘点（精确连线起点）
-        rect_half_w = rect_width / 2
-        rect_half_h = rect_height / 2
-
-        # 根据角度判断连接到矩形的哪条边
-        tan_angle = abs(math.tan(angle_to_ellipse)) if math.cos(angle_to_ellipse) != 0 else float('inf')
-
-        if tan_angle < rect_half_h / rect_half_w:
-            # 连接到左边或右边
-            if dx > 0:  # 右边
-                line_start_x = rect_x + rect_width
-                line_start_y = rect_cy + rect_half_w * math.tan(angle_to_ellipse)
-            else:  # 左边
-                line_start_x = rect_x
-                line_start_y = rect_cy - rect_half_w * math.tan(angle_to_ellipse)
-        else:
-            # 连接到上边或下边
-            if dy > 0:  # 下边
-                line_start_x = rect_cx + rect_half_h / math.tan(angle_to_ellipse) if math.tan(angle_to_ellipse) != 0 else rect_cx
-                line_start_y = rect_y + rect_height
-            else:  # 上边
-                line_start_x = rect_cx - rect_half_h / math.tan(angle_to_ellipse) if math.tan(angle_to_ellipse) != 0 else rect_cx
-                line_start_y = rect_y
-
-        # 计算椭圆边缘点（精确连线终点）
-        angle_from_rect = math.atan2(ellipse_cy - line_start_y, ellipse_cx - line_start_x)
-        ellipse_edge_x, ellipse_edge_y = calculate_ellipse_point(
-            ellipse_cx, ellipse_cy, ellipse_rx, ellipse_ry, angle_from_rect
+    svg_lines.append(f'  <rect x="{num(rect_x)}" y="{num(rect_y)}" width="{num(rect_width)}" height="{rect_height}" fill="#fff" stroke="#333" stroke-width="3"/>')
+    svg_lines.append(f'  <text x="{num(rect_cx)}" y="{num(rect_cy + 6)}" text-anchor="middle" font-family="Microsoft YaHei, SimHei, Arial" font-size="{title_font}" font-weight="bold" fill="#333">{escape(table_cn_name)}</text>')
+
+    for name, rx, (x, y) in zip(field_names, rxs, positions):
+        ellipse_cx = rect_cx + x
+        ellipse_cy = rect_cy + y
+
+        # 连线：矩形边框 → 椭圆边缘，两端都落在图形轮廓上
+        sx, sy = rect_edge_point(rect_width / 2, rect_height / 2, x, y)
+        line_start_x, line_start_y = rect_cx + sx, rect_cy + sy
+        ellipse_edge_x, ellipse_edge_y = ellipse_edge_point(
+            ellipse_cx, ellipse_cy, rx, ry, line_start_x, line_start_y
         )
-
-        # 绘制连线（从矩形边缘到椭圆边缘）
-        svg_lines.append(f'  <line x1="{line_start_x}" y1="{line_start_y}" x2="{ellipse_edge_x}" y2="{ellipse_edge_y}" stroke="#666" stroke-width="2"/>')
+        svg_lines.append(f'  <line x1="{num(line_start_x)}" y1="{num(line_start_y)}" x2="{num(ellipse_edge_x)}" y2="{num(ellipse_edge_y)}" stroke="#666" stroke-width="2"/>')
 
         # 绘制椭圆
-        svg_lines.append(f'  <ellipse cx="{ellipse_cx}" cy="{ellipse_cy}" rx="{ellipse_rx}" ry="{ellipse_ry}" fill="#fff" stroke="#666" stroke-width="2"/>')
+        svg_lines.append(f'  <ellipse cx="{num(ellipse_cx)}" cy="{num(ellipse_cy)}" rx="{num(rx)}" ry="{ry}" fill="#fff" stroke="#666" stroke-width="2"/>')
 
         # 绘制字段名文本
-        svg_lines.append(f'  <text x="{ellipse_cx}" y="{ellipse_cy + 6}" text-anchor="middle" font-family="Microsoft YaHei, SimHei, Arial" font-size="14" fill="#333">{field_cn_name}</text>')
+        svg_lines.append(f'  <text x="{num(ellipse_cx)}" y="{num(ellipse_cy + 5)}" text-anchor="middle" font-family="Microsoft YaHei, SimHei, Arial" font-size="{field_font}" fill="#333">{escape(name)}</text>')
 
     svg_lines.append('</svg>')
 
-    # 写入SVG文件
+    # 写入SVG文件（临时文件 + 重命名，不原地改写可能与其他项目共享的文件）
     output_file = os.path.join(output_dir, f'Tab-{table_name}.svg')
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(svg_lines))
+    temp_file = output_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        f.write(optimize_svg('\n'.join(svg_lines)))
+    os.replace(temp_file, output_file)
 
-    print(f"✅ 生成: Tab-{table_name}.svg ({field_count}个字段)")
-    return True
+    return output_file, field_count
+
+
+def file_sha256(path):
+    """计算文件内容哈希"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def input_hash(table_file):
+    """输入哈希 = 表JSON内容 + 布局参数 + 生成器版本"""
+    digest = hashlib.sha256()
+    with open(table_file, 'rb') as f:
+        digest.update(f.read())
+    digest.update(json.dumps(LAYOUT_PARAMS, sort_keys=True).encode('utf-8'))
+    digest.update(str(GENERATOR_VERSION).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir):
+    """读取ER图清单 {表文件名: {input, output, outputHash}}"""
+    manifest_file = Path(output_dir) / MANIFEST_NAME
+    if manifest_file.exists():
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {'version': 1, 'tables': {}}
+
+
+def save_manifest(output_dir, manifest):
+    """原子写入ER图清单"""
+    manifest_file = Path(output_dir) / MANIFEST_NAME
+    temp_file = manifest_file.with_suffix('.tmp')
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_file, manifest_file)
+
+
+def is_up_to_date(entry, digest, output_dir):
+    """清单记录与当前输入一致，且输出文件未被改动"""
+    if not entry or entry.get('input') != digest:
+        return False
+    output_file = Path(output_dir) / entry.get('output', '')
+    return output_file.is_file() and file_sha256(output_file) == entry.get('outputHash')
+
+
+def _generate_job(table_file, output_dir):
+    """进程池任务：生成单个ER图，返回 (输出文件, 字段数, 错误信息)"""
+    try:
+        output_file, field_count = generate_single_er(table_file, output_dir)
+    except Exception as e:
+        return None, 0, str(e)
+    return output_file, field_count, None
 
 
 def main():
     """批量生成ER图"""
 
-    if len(sys.argv) < 2:
-        print("用法: python generate-er-optimized.py <tables目录路径>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='批量生成单体ER图（增量 + 并行）')
+    parser.add_argument('tables_dir', help='tables目录路径（包含Tab-*.json）')
+    parser.add_argument('--force', action='store_true', help='忽略清单，全部重新生成')
+    parser.add_argument('--jobs', type=int, default=None, help='并行进程数（默认CPU核数）')
+    parser.add_argument('--png', action='store_true', help='同时按导出参数栅格化为PNG，写入 paper/.cache/rasters')
+    add_event_arguments(parser)
+    args = parser.parse_args()
+    configure_events('generate-er-optimized', args.events, args.quiet)
 
-    tables_dir = sys.argv[1]
+    tables_dir = args.tables_dir
+    paper_dir = os.path.dirname(os.path.dirname(tables_dir))
 
     # 输出目录
-    output_dir = os.path.join(
-        os.path.dirname(os.path.dirname(tables_dir)),
-        'assets', 'diagrams', 'er'
-    )
+    output_dir = os.path.join(paper_dir, 'assets', 'diagrams', 'er')
 
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
@@ -161,27 +332,80 @@ def main():
     # 扫描所有Tab-*.json文件
     table_files = sorted(Path(tables_dir).glob('Tab-*.json'))
 
-    success_count = 0
-    fail_count = 0
-
     print(f"\n🔍 扫描目录: {tables_dir}")
     print(f"📁 输出目录: {output_dir}")
     print(f"📊 发现表文件: {len(table_files)} 个\n")
 
+    # 对比清单，跳过输入和布局参数都没变的表
+    manifest = {} if args.force else load_manifest(output_dir)
+    old_entries = manifest.get('tables', {})
+    entries = {}
+    pending = []
+    skipped = []
     for table_file in table_files:
-        try:
-            if generate_single_er(str(table_file), output_dir):
-                success_count += 1
-        except Exception as e:
-            print(f"❌ 失败: {table_file.name} - {str(e)}")
-            fail_count += 1
+        digest = input_hash(table_file)
+        entry = old_entries.get(table_file.name)
+        if is_up_to_date(entry, digest, output_dir):
+            entries[table_file.name] = entry
+            skipped.append(table_file.name)
+        else:
+            pending.append((table_file, digest))
+
+    if skipped:
+        print(f"⏭️  未变化，跳过: {len(skipped)} 个")
+
+    success_count = 0
+    fail_count = 0
+    generated = []
+
+    # 逐项输出在主进程中进行（子进程不共享事件流）
+    with events.stage('generate', pending=len(pending), skipped=len(skipped)):
+        if pending:
+            with ProcessPoolExecutor(max_workers=args.jobs or os.cpu_count()) as executor:
+                results = executor.map(
+                    _generate_job,
+                    [str(table_file) for table_file, _ in pending],
+                    [output_dir] * len(pending)
+                )
+                for (table_file, digest), (output_file, field_count, error) in zip(pending, results):
+                    if output_file:
+                        success_count += 1
+                        output_name = os.path.basename(output_file)
+                        entries[table_file.name] = {
+                            'input': digest,
+                            'output': output_name,
+                            'outputHash': file_sha256(output_file),
+                        }
+                        generated.append(output_name)
+                        events.item('er', output_name, f"✅ 生成: {output_name} ({field_count}个字段)",
+                                    fields=field_count, bytes=os.path.getsize(output_file))
+                    else:
+                        events.warning(f"{table_file.name}: {error}", f"❌ 失败: {table_file.name} - {error}")
+                        fail_count += 1
+
+    save_manifest(output_dir, {
+        'version': 1,
+        'generator': GENERATOR_VERSION,
+        'tables': entries,
+        'lastRun': {'generated': sorted(generated), 'skipped': len(skipped), 'failed': fail_count},
+    })
+
+    # 栅格缓存按内容哈希命中，未变化的图不会重复渲染
+    if args.png:
+        if RASTER_SUPPORT:
+            svg_files = [os.path.join(output_dir, entry['output']) for entry in entries.values()]
+            print_batch_stats(rasterize_batch(svg_files, cache_dir_for(paper_dir), jobs=args.jobs))
+        else:
+            print("⚠️  未找到SVG栅格化工具（cairosvg 或 rsvg-convert），跳过PNG")
 
     print(f"\n{'='*60}")
     print(f"✅ 成功生成: {success_count} 个")
+    print(f"⏭️  跳过未变化: {len(skipped)} 个")
     print(f"❌ 失败: {fail_count} 个")
     print(f"📊 优化特性: 多层圆环布局 + 精确连线 + 工整间距")
     print(f"{'='*60}\n")
+    return 1 if fail_count else 0
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
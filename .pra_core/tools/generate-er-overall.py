@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+整体ER图生成工具
+读取 paper/assets/tables/Tab-*.json，推断表之间的外键关系，
+按分层布局绘制实体（矩形）与联系（菱形），输出 er-overall.svg
+
+外键识别:
+    - 约束列写明 REFERENCES 表名(字段) 或 FK→表名.字段
+    - 字段名形如 <实体>_id，且能匹配到某张表（canteen_id → canteens / canteen）
+
+使用方法:
+    python3 generate-er-overall.py <tables目录> [--output 输出文件] [--png] [--events 目标] [--quiet]
+
+示例:
+    python3 tools/generate-er-overall.py paper/assets/tables
+    # 输出 paper/assets/diagrams/er/er-overall.svg
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+from collections import defaultdict
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from pra_events import add_event_arguments, configure_events, events
+from raster_cache import RASTER_SUPPORT, cache_dir_for, print_batch_stats, rasterize_batch
+from svg_optimize import optimize_svg
+from text_metrics import measure_text
+
+# 布局参数
+ENTITY_FONT_SIZE = 16
+ENTITY_MIN_WIDTH = 120
+ENTITY_HEIGHT = 50
+DIAMOND_FONT_SIZE = 14
+DIAMOND_HEIGHT = 44
+RELATION_LABEL = '拥有'
+H_GAP = 60              # 同层实体的水平间距
+LAYER_GAP = 170         # 相邻层实体的垂直间距（中间放置菱形）
+CLEARANCE = 12          # 图形之间的最小间隙
+MARGIN = 20
+GRID_CELL = 200         # 空间索引网格尺寸
+ORDER_SWEEPS = 8        # 重心法排序的迭代次数
+
+FONT_FAMILY = 'Microsoft YaHei, SimHei, Arial'
+
+REFERENCES_RE = re.compile(r'(?:REFERENCES|FK\s*(?:→|->))\s*`?(\w+)`?\s*[(.]\s*`?(\w+)', re.IGNORECASE)
+
+
+class SpatialGrid:
+    """均匀网格空间索引：按包围盒登记对象，碰撞与相交检测只在所占格子内进行"""
+
+    def __init__(self, cell=GRID_CELL):
+        self.cell = cell
+        self.cells = defaultdict(list)
+
+    def _keys(self, box):
+        x0, y0, x1, y1 = box
+        for gx in range(math.floor(x0 / self.cell), math.floor(x1 / self.cell) + 1):
+            for gy in range(math.floor(y0 / self.cell), math.floor(y1 / self.cell) + 1):
+                yield gx, gy
+
+    def insert(self, box, item):
+        for key in self._keys(box):
+            self.cells[key].append(item)
+
+    def query(self, box):
+        """返回与包围盒所在格子有交集的对象（去重，保持插入顺序）"""
+        found = {}
+        for key in self._keys(box):
+            for item in self.cells.get(key, ()):
+                found[id(item)] = item
+        return list(found.values())
+
+
+def boxes_overlap(a, b, clearance=0):
+    return (a[0] < b[2] + clearance and b[0] < a[2] + clearance
+            and a[1] < b[3] + clearance and b[1] < a[3] + clearance)
+
+
+def segment_box(seg):
+    (x1, y1), (x2, y2) = seg
+    return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+
+def segments_cross(s, t):
+    """两条线段是否在内部相交（共享端点不算）"""
+    def orient(p, q, r):
+        return (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+
+    p1, p2 = s
+    q1, q2 = t
+    if {p1, p2} & {q1, q2}:
+        return False
+    d1, d2 = orient(q1, q2, p1), orient(q1, q2, p2)
+    d3, d4 = orient(p1, p2, q1), orient(p1, p2, q2)
+    return d1 * d2 < 0 and d3 * d4 < 0
+
+
+def count_crossings(segments):
+    """借助空间索引统计线段交叉数，只比较包围盒落在同一格子的线段"""
+    grid = SpatialGrid()
+    crossings = 0
+    for seg in segments:
+        box = segment_box(seg)
+        crossings += sum(1 for other in grid.query(box)
+                         if boxes_overlap(box, segment_box(other)) and segments_cross(seg, other))
+        grid.insert(box, seg)
+    return crossings
+
+
+def load_tables(tables_dir):
+    """读取全部表定义，返回 {表名: {cnName, columns}}"""
+    tables = {}
+    for table_file in sorted(Path(tables_dir).glob('Tab-*.json')):
+        with open(table_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        name = data.get('tableName') or table_file.stem[len('Tab-'):]
+        columns = [col for col in data.get('columns', []) if col and col[0] != '字段名']
+        tables[name] = {'cnName': data.get('tableCnName', name), 'columns': columns}
+    return tables
+
+
+def match_table(stem, table_names):
+    """按单复数规则把 canteen / category 之类的前缀匹配到表名"""
+    for candidate in (stem, stem + 's', stem + 'es', stem[:-1] + 'ies' if stem.endswith('y') else None):
+        if candidate in table_names:
+            return candidate
+    return None
+
+
+def infer_relations(tables):
+    """
+    推断外键关系
+
+    返回:
+        list: [(子表, 外键字段, 父表)]，按表名、字段顺序排列
+    """
+    relations = []
+    for name, table in tables.items():
+        for col in table['columns']:
+            field = str(col[0])
+            constraint = str(col[3]) if len(col) > 3 else ''
+            match = REFERENCES_RE.search(constraint)
+            if match and match.group(1) in tables:
+                parent = match.group(1)
+            elif field.endswith('_id'):
+                parent = match_table(field[:-3], tables)
+            else:
+                parent = None
+            if parent and parent != name:
+                relations.append((name, field, parent))
+    return relations
+
+
+def assign_layers(tables, relations):
+    """最长路径分层：被引用的表在上，引用它的表在下；环上的回边不参与分层"""
+    parents = defaultdict(list)
+    for child, _, parent in relations:
+        parents[child].append(parent)
+
+    layers = {}
+    visiting = set()
+
+    def visit(name):
+        if name in layers:
+            return layers[name]
+        visiting.add(name)
+        depth = 0
+        for parent in parents[name]:
+            if parent not in visiting:
+                depth = max(depth, visit(parent) + 1)
+        visiting.discard(name)
+        layers[name] = depth
+        return depth
+
+    for name in tables:
+        visit(name)
+    return layers
+
+
+class OverallLayout:
+    """整体ER图分层布局：层内重心法排序 + 空间索引避让"""
+
+    def __init__(self, tables, relations):
+        self.tables = tables
+        self.relations = relations
+        self.widths = {
+            name: max(ENTITY_MIN_WIDTH, measure_text(t['cnName'], ENTITY_FONT_SIZE) + 40)
+            for name, t in tables.items()
+        }
+        self.diamond_width = measure_text(RELATION_LABEL, DIAMOND_FONT_SIZE) + 60
+        self.layers = assign_layers(tables, relations)
+
+        self.neighbors = defaultdict(list)
+        for child, _, parent in relations:
+            self.neighbors[child].append(parent)
+            self.neighbors[parent].append(child)
+
+    def place_entities(self, rows):
+        """按层内顺序计算实体中心坐标，每层水平居中"""
+        positions = {}
+        for depth, row in enumerate(rows):
+            total = sum(self.widths[n] for n in row) + H_GAP * (len(row) - 1)
+            x = -total / 2
+            for name in row:
+                positions[name] = (x + self.widths[name] / 2, depth * LAYER_GAP)
+                x += self.widths[name] + H_GAP
+        return positions
+
+    def edge_segments(self, positions):
+        return [(positions[parent], positions[child]) for child, _, parent in self.relations]
+
+    def order_layers(self):
+        """重心法交替上下扫描，保留交叉最少的层内顺序"""
+        rows = [[] for _ in range(max(self.layers.values(), default=0) + 1)]
+        for name in self.tables:
+            rows[self.layers[name]].append(name)
+
+        best_rows = [list(r) for r in rows]
+        positions = self.place_entities(rows)
+        best = count_crossings(self.edge_segments(positions))
+
+        for sweep in range(ORDER_SWEEPS):
+            if best == 0:
+                break
+            downward = sweep % 2 == 0
+            order = range(1, len(rows)) if downward else range(len(rows) - 2, -1, -1)
+            for depth in order:
+                # 向下扫描参考上方各层的相邻实体，向上扫描参考下方各层（跨层长边也计入）
+                def barycenter(name):
+                    xs = [positions[n][0] for n in self.neighbors[name]
+                          if (self.layers[n] < depth if downward else self.layers[n] > depth)]
+                    return sum(xs) / len(xs) if xs else positions[name][0]
+
+                rows[depth].sort(key=barycenter)
+                positions = self.place_entities(rows)
+
+            crossings = count_crossings(self.edge_segments(positions))
+            if crossings < best:
+                best, best_rows = crossings, [list(r) for r in rows]
+
+        return best_rows, best
+
+    def entity_box(self, name, positions):
+        x, y = positions[name]
+        w = self.widths[name]
+        return x - w / 2, y - ENTITY_HEIGHT / 2, x + w / 2, y + ENTITY_HEIGHT / 2
+
+    def place_diamonds(self, positions):
+        """
+        菱形放在父子实体连线上；与已放置的图形重叠时沿连线滑动，仍冲突则横向错开
+        """
+        grid = SpatialGrid()
+        for name in self.tables:
+            box = self.entity_box(name, positions)
+            grid.insert(box, box)
+
+        half_w, half_h = self.diamond_width / 2, DIAMOND_HEIGHT / 2
+        diamonds = []
+        for child, _, parent in self.relations:
+            (px, py), (cx, cy) = positions[parent], positions[child]
+            candidates = [(px + (cx - px) * t, py + (cy - py) * t) for t in (0.5, 0.4, 0.6, 0.3, 0.7)]
+            candidates += [(x + dx, y) for x, y in candidates[:1]
+                           for dx in (self.diamond_width + CLEARANCE, -self.diamond_width - CLEARANCE)]
+            for x, y in candidates:
+                box = (x - half_w, y - half_h, x + half_w, y + half_h)
+                if not any(boxes_overlap(box, other, CLEARANCE) for other in grid.query(box)):
+                    break
+            grid.insert(box, box)
+            diamonds.append((x, y))
+        return diamonds
+
+    def run(self):
+        rows, crossings = self.order_layers()
+        positions = self.place_entities(rows)
+        return positions, self.place_diamonds(positions), crossings
+
+
+def rect_edge_point(cx, cy, half_w, half_h, tx, ty):
+    """从矩形中心指向 (tx, ty) 的射线与矩形边框的交点"""
+    dx, dy = tx - cx, ty - cy
+    if not dx and not dy:
+        return cx, cy
+    t = min(half_w / abs(dx) if dx else math.inf, half_h / abs(dy) if dy else math.inf)
+    return cx + dx * t, cy + dy * t
+
+
+def diamond_edge_point(cx, cy, half_w, half_h, tx, ty):
+    """从菱形中心指向 (tx, ty) 的射线与菱形边框的交点"""
+    dx, dy = tx - cx, ty - cy
+    if not dx and not dy:
+        return cx, cy
+    t = 1 / (abs(dx) / half_w + abs(dy) / half_h)
+    return cx + dx * t, cy + dy * t
+
+
+def num(value):
+    """坐标输出保留两位小数"""
+    return round(value, 2)
+
+
+def render_svg(layout, positions, diamonds):
+    """生成整体ER图SVG文本，画布收缩到实际内容范围"""
+    half_dw, half_dh = layout.diamond_width / 2, DIAMOND_HEIGHT / 2
+    boxes = [layout.entity_box(name, positions) for name in layout.tables]
+    boxes += [(x - half_dw, y - half_dh, x + half_dw, y + half_dh) for x, y in diamonds]
+    min_x = min(b[0] for b in boxes)
+    min_y = min(b[1] for b in boxes)
+    width = math.ceil(max(b[2] for b in boxes) - min_x + 2 * MARGIN)
+    height = math.ceil(max(b[3] for b in boxes) - min_y + 2 * MARGIN)
+    ox, oy = MARGIN - min_x, MARGIN - min_y
+
+    svg_lines = []
+    svg_lines.append('<?xml version="1.0" encoding="UTF-8"?>')
+    svg_lines.append(f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}" xmlns="http://www.w3.org/2000/svg">')
+
+    # 连线与基数标注（先画线，图形覆盖在线上）
+    for (child, _, parent), (dx, dy) in zip(layout.relations, diamonds):
+        dx, dy = dx + ox, dy + oy
+        for name, label in ((parent, '1'), (child, 'N')):
+            ex, ey = positions[name][0] + ox, positions[name][1] + oy
+            x1, y1 = rect_edge_point(ex, ey, layout.widths[name] / 2, ENTITY_HEIGHT / 2, dx, dy)
+            x2, y2 = diamond_edge_point(dx, dy, half_dw, half_dh, ex, ey)
+            svg_lines.append(f'  <line x1="{num(x1)}" y1="{num(y1)}" x2="{num(x2)}" y2="{num(y2)}" stroke="#666" stroke-width="2"/>')
+            lx, ly = (x1 + x2) / 2 + 8, (y1 + y2) / 2
+            svg_lines.append(f'  <text x="{num(lx)}" y="{num(ly)}" font-family="{FONT_FAMILY}" font-size="14" fill="#333">{label}</text>')
+
+    for name in layout.tables:
+        x, y = positions[name][0] + ox, positions[name][1] + oy
+        w = layout.widths[name]
+        svg_lines.append(f'  <rect x="{num(x - w / 2)}" y="{num(y - ENTITY_HEIGHT / 2)}" width="{num(w)}" height="{ENTITY_HEIGHT}" fill="#fff" stroke="#333" stroke-width="2"/>')
+        svg_lines.append(f'  <text x="{num(x)}" y="{num(y + 6)}" text-anchor="middle" font-family="{FONT_FAMILY}" font-size="{ENTITY_FONT_SIZE}" font-weight="bold" fill="#333">{escape(layout.tables[name]["cnName"])}</text>')
+
+    for x, y in diamonds:
+        x, y = x + ox, y + oy
+        points = f'{num(x)},{num(y - half_dh)} {num(x + half_dw)},{num(y)} {num(x)},{num(y + half_dh)} {num(x - half_dw)},{num(y)}'
+        svg_lines.append(f'  <polygon points="{points}" fill="#fff" stroke="#666" stroke-width="2"/>')
+        svg_lines.append(f'  <text x="{num(x)}" y="{num(y + 5)}" text-anchor="middle" font-family="{FONT_FAMILY}" font-size="{DIAMOND_FONT_SIZE}" fill="#333">{RELATION_LABEL}</text>')
+
+    svg_lines.append('</svg>')
+    return optimize_svg('\n'.join(svg_lines))
+
+
+def generate_overall_er(tables_dir, output_file):
+    """生成整体ER图，成功时返回输出文件路径"""
+    tables = load_tables(tables_dir)
+    if not tables:
+        events.warning(f"未找到表文件: {tables_dir}", f"❌ 未找到表文件: {tables_dir}")
+        return None
+
+    with events.stage('layout', tables=len(tables)):
+        relations = infer_relations(tables)
+        layout = OverallLayout(tables, relations)
+        positions, diamonds, crossings = layout.run()
+        for child, field, parent in relations:
+            events.item('relation', f"{child}.{field}", f"  🔗 {child}.{field} → {parent}", parent=parent)
+
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    temp_file = output_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        f.write(render_svg(layout, positions, diamonds))
+    os.replace(temp_file, output_file)
+
+    events.item('er', os.path.basename(output_file),
+                f"✅ 生成: {output_file} ({len(tables)}个实体, {len(relations)}个联系, {crossings}处交叉)",
+                entities=len(tables), relations=len(relations), crossings=crossings,
+                bytes=os.path.getsize(output_file))
+    return output_file
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='生成整体ER图（实体 + 联系）')
+    parser.add_argument('tables_dir', help='tables目录路径（包含Tab-*.json）')
+    parser.add_argument('--output', default=None,
+                        help='输出SVG（默认 paper/assets/diagrams/er/er-overall.svg）')
+    parser.add_argument('--png', action='store_true', help='同时按导出参数栅格化为PNG，写入 paper/.cache/rasters')
+    add_event_arguments(parser)
+    args = parser.parse_args()
+    configure_events('generate-er-overall', args.events, args.quiet)
+
+    paper_dir = os.path.dirname(os.path.dirname(args.tables_dir))
+    output_file = args.output or os.path.join(paper_dir, 'assets', 'diagrams', 'er', 'er-overall.svg')
+    if not generate_overall_er(args.tables_dir, output_file):
+        return 1
+
+    if args.png:
+        if not RASTER_SUPPORT:
+            events.warning("未找到SVG栅格化工具，跳过PNG", "⚠️  未找到SVG栅格化工具（cairosvg 或 rsvg-convert），跳过PNG")
+        else:
+            stats = rasterize_batch([output_file], cache_dir_for(paper_dir))
+            print_batch_stats(stats)
+            if stats['failed']:
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+路径变量配置
+章节中的 imagePath / tablePath 使用 ${变量} 引用资源目录。变量默认值与工作流05的
+路径变量系统一致，可在 paper/path-config.json 中增加或覆盖:
+
+    {
+      "variables": {
+        "impl": "${assets}/screenshots",
+        "photos": "/Volumes/share/photos"
+      }
+    }
+
+变量值可以引用其他变量（展开时检查循环引用），相对路径以 paper 目录为基准。
+一个路径中可以出现多个变量，统一用同一个预编译正则一次替换完成；
+解析结果和文件状态在本次运行内缓存。
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+
+CONFIG_FILE = 'path-config.json'
+
+# 与工作流05「路径变量系统」一致
+DEFAULT_VARIABLES = {
+    'assets': 'assets',
+    'tables': '${assets}/tables',
+    'er': '${assets}/diagrams/er',
+    'uml': '${assets}/diagrams/uml',
+    'impl': '${assets}/diagrams/impl',
+    'dfd': '${assets}/diagrams/dfd',
+    'flow': '${assets}/diagrams/flow',
+    'plantuml': '${assets}/plantuml',
+}
+
+VAR_RE = re.compile(r'\$\{([^}]*)\}')
+
+ASSET_FIELDS = ('imagePath', 'tablePath')
+
+
+class PathConfigError(ValueError):
+    """path-config.json 格式错误、变量未定义或循环引用"""
+
+
+def load_config(paper_dir):
+    """读取 paper/path-config.json 中的变量定义（文件不存在时为空）"""
+    config_file = Path(paper_dir) / CONFIG_FILE
+    if not config_file.exists():
+        return {}
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except ValueError as e:
+        raise PathConfigError(f'{CONFIG_FILE} 解析失败: {e}')
+    variables = config.get('variables') if isinstance(config, dict) else None
+    if not isinstance(variables, dict) or not all(isinstance(v, str) for v in variables.values()):
+        raise PathConfigError(f'{CONFIG_FILE} 中 variables 应为 {{变量名: 路径字符串}}')
+    return variables
+
+
+def expand_variables(definitions, base_dir):
+    """
+    展开变量之间的引用
+
+    返回:
+        dict: {变量名: 绝对路径字符串}
+
+    异常:
+        PathConfigError: 引用了未定义的变量或存在循环引用
+    """
+    # 先按文本展开（变量可以只是路径片段），最后再把相对路径落到base_dir下
+    expanded = {}
+
+    def expand(name, chain):
+        if name in expanded:
+            return expanded[name]
+        if name in chain:
+            raise PathConfigError(f'路径变量循环引用: {" → ".join(chain + (name,))}')
+        if name not in definitions:
+            raise PathConfigError(f'路径变量 ${{{chain[-1]}}} 引用了未定义的 ${{{name}}}')
+        expanded[name] = VAR_RE.sub(lambda m: expand(m.group(1), chain + (name,)), definitions[name])
+        return expanded[name]
+
+    resolved = {}
+    for name in definitions:
+        path = Path(os.path.expanduser(expand(name, ())))
+        resolved[name] = str(path if path.is_absolute() else Path(base_dir) / path)
+    return resolved
+
+
+def asset_refs(chapter_data):
+    """章节中的资源引用 [(字段路径, 路径字符串)]，包含items中的子项"""
+    refs = [(field, chapter_data[field]) for field in ASSET_FIELDS if isinstance(chapter_data.get(field), str)]
+    items = chapter_data.get('items')
+    if isinstance(items, list):
+        for index, item in enumerate(items):
+            if isinstance(item, dict):
+                refs.extend(
+                    (f'items[{index}].{field}', item[field])
+                    for field in ASSET_FIELDS if isinstance(item.get(field), str)
+                )
+    return refs
+
+
+class PathResolver:
+    """路径变量解析器"""
+
+    def __init__(self, project_root):
+        self.project_root = Path(project_root)
+        self.paper_dir = self.project_root / 'paper'
+        definitions = dict(DEFAULT_VARIABLES)
+        definitions.update(load_config(self.paper_dir))
+        self.variables = expand_variables(definitions, self.paper_dir)
+        self.path_vars = {name: Path(value) for name, value in self.variables.items()}
+        self._resolved = {}
+        self._stats = {}
+
+    def unknown_variables(self, path_str):
+        """路径中引用的未定义变量名"""
+        return [name for name in VAR_RE.findall(path_str) if name not in self.variables]
+
+    def resolve(self, path_str):
+        """解析路径变量，含未定义变量时返回None"""
+        if not path_str or not isinstance(path_str, str):
+            return None
+        if path_str in self._resolved:
+            return self._resolved[path_str]
+
+        resolved = None
+        if not self.unknown_variables(path_str):
+            # 处理 ${var}/file.ext 格式（一个路径中可有多个变量）
+            resolved = Path(VAR_RE.sub(lambda m: self.variables[m.group(1)], path_str))
+        self._resolved[path_str] = resolved
+        return resolved
+
+    def stat(self, path):
+        """缓存的 os.stat 结果，文件不存在时为None"""
+        key = str(path)
+        if key not in self._stats:
+            try:
+                self._stats[key] = os.stat(key)
+            except OSError:
+                self._stats[key] = None
+        return self._stats[key]
+
+    def exists(self, path):
+        return path is not None and self.stat(path) is not None
+
+    def check(self, path_str):
+        """
+        检查一个资源引用
+
+        返回:
+            str | None: 问题说明，可正常使用时为None
+        """
+        unknown = self.unknown_variables(path_str)
+        if unknown:
+            return f'未知路径变量 {", ".join(f"${{{name}}}" for name in unknown)}'
+        if not self.exists(self.resolve(path_str)):
+            return '文件不存在'
+        return None
@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+论文构建流水线
+把生产流程中的各步骤声明为依赖图，按内容哈希判断是否需要重建，
+互不依赖的步骤并行执行（pra.py build 调用）:
+
+    er          单体ER图          generate-er-optimized.py   tables/*.json → er/Tab-*.svg
+    plantuml    PlantUML渲染      render-plantuml.py         plantuml/*.puml → uml|dfd|flow/*.png
+    flow        流程图/数据流图   render-flow.py             *.flow.json / *.dot → 同名 .svg
+    styles      章节样式标记      add-styles-to-chapters.py  outline.json + chapters → chapters
+    docx        论文导出          thesis-to-docx-enhanced.py 上述全部 → 论文.docx
+    screenshots 逐页截图          word-to-screenshots.py     论文.docx → reference-papers/
+
+每一步的输入（含步骤所用的工具脚本及其导入的本地模块）按内容哈希汇总，与上次成功时
+记录的一致、且输出齐全未被改动时跳过。输入哈希在步骤开始前计算，运行期间被修改的输入
+下次构建时仍会重建。文件哈希按 (大小, 修改时间) 缓存，未变化的文件不重复计算。
+状态记录在 paper/.cache/build-state.json，每步输出日志在 paper/.cache/build-logs/。
+"""
+
+import ast
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from path_config import PathResolver
+from pra_events import events
+from project_index import current_hashes
+
+STATE_FILE = Path('.cache') / 'build-state.json'
+LOG_DIR = Path('.cache') / 'build-logs'
+STATE_VERSION = 1
+
+TOOLS_DIR = Path(__file__).resolve().parent
+DEFAULT_DOCX_NAME = '食堂评价系统论文-完整版.docx'
+DEFAULT_STYLE = Path('templates') / 'docx-styles-yxnu.json'
+
+# 与 render-plantuml.py 的输出目录规则一致
+PLANTUML_OUTPUT_DIRS = (('dfd-', 'dfd'), ('flow-', 'flow'))
+FLOW_SPEC_SUFFIXES = ('.flow.json', '.dot')
+
+# 改写自身输入的步骤（styles）最多连续运行的次数，直到一次运行前后输入不变
+MAX_SETTLE_RUNS = 3
+
+_module_cache = {}
+
+
+def local_modules(script):
+    """
+    工具脚本（递归）导入的本目录模块，如 docx_package.py、path_config.py
+
+    返回:
+        list: 模块文件路径（不含脚本本身）
+    """
+    if script in _module_cache:
+        return _module_cache[script]
+    found = []
+    pending = [TOOLS_DIR / script]
+    seen = {TOOLS_DIR / script}
+    while pending:
+        try:
+            tree = ast.parse((pending.pop()).read_text(encoding='utf-8'))
+        except (OSError, SyntaxError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                module_file = TOOLS_DIR / f'{name.split(".")[0]}.py'
+                if module_file not in seen and module_file.is_file():
+                    seen.add(module_file)
+                    found.append(module_file)
+                    pending.append(module_file)
+    _module_cache[script] = sorted(found)
+    return _module_cache[script]
+
+
+class Step:
+    """
+    流水线步骤
+
+    参数:
+        name: 步骤名
+        description: 说明
+        script: 工具脚本名（脚本及其导入的本地模块计入输入哈希）
+        deps: 依赖的步骤名
+        args: args(ctx) → 脚本参数列表
+        inputs: inputs(ctx) → 输入文件列表
+        outputs: outputs(ctx) → 预期输出文件列表（缺失时重建）
+        force_args: --force 构建时追加的参数（让工具忽略自己的清单/缓存）
+        incremental_args: 非 --force 时追加的参数
+        rewrites_inputs: 步骤会改写自己的输入（styles），运行到输入不再变化为止
+    """
+
+    def __init__(self, name, description, script, deps, args, inputs, outputs,
+                 force_args=(), incremental_args=(), rewrites_inputs=False):
+        self.name = name
+        self.description = description
+        self.script = script
+        self.deps = deps
+        self.args = args
+        self.inputs = inputs
+        self.outputs = outputs
+        self.force_args = list(force_args)
+        self.incremental_args = list(incremental_args)
+        self.rewrites_inputs = rewrites_inputs
+
+    def command(self, ctx, force=False):
+        return ([sys.executable, str(TOOLS_DIR / self.script)] + self.args(ctx)
+                + (self.force_args if force else self.incremental_args))
+
+
+class BuildContext:
+    """步骤共用的路径信息"""
+
+    def __init__(self, project_root, output_file=None, style_file=None):
+        self.project_root = Path(project_root).resolve()
+        self.paper_dir = self.project_root / 'paper'
+        self.resolver = PathResolver(self.project_root)
+        self.output_file = Path(output_file).resolve() if output_file else self.paper_dir / DEFAULT_DOCX_NAME
+        self.style_file = Path(style_file).resolve() if style_file else self.project_root / DEFAULT_STYLE
+
+    def var(self, name):
+        return self.resolver.path_vars[name]
+
+    def files(self, directory, pattern):
+        directory = Path(directory)
+        return sorted(p for p in directory.glob(pattern) if p.is_file()) if directory.is_dir() else []
+
+    def flow_specs(self):
+        specs = []
+        for name in ('dfd', 'flow'):
+            directory = self.var(name)
+            if directory.is_dir():
+                specs.extend(sorted(p for p in directory.rglob('*') if p.name.endswith(FLOW_SPEC_SUFFIXES)))
+        return specs
+
+
+def _er_outputs(ctx):
+    outputs = []
+    for table_file in ctx.files(ctx.var('tables'), 'Tab-*.json'):
+        try:
+            with open(table_file, 'r', encoding='utf-8') as f:
+                name = json.load(f).get('tableName')
+        except (OSError, ValueError):
+            continue
+        if name:
+            outputs.append(ctx.var('er') / f'Tab-{name}.svg')
+    return outputs
+
+
+def _plantuml_outputs(ctx):
+    outputs = []
+    diagrams_dir = ctx.var('plantuml').parent / 'diagrams'
+    for puml_file in ctx.files(ctx.var('plantuml'), '*.puml'):
+        subdir = next((d for prefix, d in PLANTUML_OUTPUT_DIRS if puml_file.name.startswith(prefix)), 'uml')
+        outputs.append(diagrams_dir / subdir / f'{puml_file.stem}.png')
+    return outputs
+
+
+def _flow_outputs(ctx):
+    outputs = []
+    for spec in ctx.flow_specs():
+        stem = spec.name[:-len('.flow.json')] if spec.name.endswith('.flow.json') else spec.stem
+        outputs.append(spec.with_name(f'{stem}.svg'))
+    return outputs
+
+
+def _chapter_inputs(ctx):
+    files = [ctx.paper_dir / 'outline.json', ctx.paper_dir / 'style-overrides.json']
+    return files + ctx.files(ctx.paper_dir / 'chapters', 'chapter.*.json')
+
+
+def _docx_inputs(ctx):
+    files = _chapter_inputs(ctx) + [ctx.style_file, ctx.paper_dir / 'path-config.json']
+    files += ctx.files(ctx.var('tables'), '*.json')
+    for name in ('er', 'uml', 'dfd', 'flow', 'impl'):
+        files += [p for p in ctx.files(ctx.var(name), '**/*') if not p.name.startswith('.')]
+    return files
+
+
+def _screenshots_dir(ctx):
+    return ctx.project_root / 'reference-papers' / f'{ctx.output_file.stem}_screenshots'
+
+
+def _plantuml_inputs(ctx):
+    # 源码及 !include 的文件（.iuml 等）都在同一目录
+    return [p for p in ctx.files(ctx.var('plantuml'), '*') if not p.name.startswith('.')]
+
+
+STEPS = [
+    Step('er', '单体ER图', 'generate-er-optimized.py', [],
+         lambda ctx: [str(ctx.var('tables')), '--png'],
+         lambda ctx: ctx.files(ctx.var('tables'), 'Tab-*.json'),
+         _er_outputs, force_args=['--force']),
+    Step('plantuml', 'PlantUML渲染', 'render-plantuml.py', [],
+         lambda ctx: [str(ctx.var('plantuml'))],
+         _plantuml_inputs,
+         _plantuml_outputs, force_args=['--force']),
+    Step('flow', '流程图/数据流图', 'render-flow.py', [],
+         lambda ctx: [str(p) for p in ctx.flow_specs()] + ['--png'],
+         lambda ctx: ctx.flow_specs(),
+         _flow_outputs, force_args=['--force']),
+    Step('styles', '章节样式标记', 'add-styles-to-chapters.py', [],
+         lambda ctx: ['--project', str(ctx.project_root)],
+         _chapter_inputs,
+         lambda ctx: [], rewrites_inputs=True),
+    Step('docx', '论文导出', 'thesis-to-docx-enhanced.py', ['er', 'plantuml', 'flow', 'styles'],
+         lambda ctx: ['--project', str(ctx.project_root), '--output', str(ctx.output_file),
+                      '--style', str(ctx.style_file), '--validate'],
+         _docx_inputs,
+         lambda ctx: [ctx.output_file]),
+    Step('screenshots', '逐页截图', 'word-to-screenshots.py', ['docx'],
+         lambda ctx: [str(ctx.output_file), str(_screenshots_dir(ctx).parent)],
+         lambda ctx: [ctx.output_file],
+         lambda ctx: [_screenshots_dir(ctx) / '.screenshots-manifest.json'],
+         # --force 也走增量模式：全部重新渲染但刷新指纹清单，清单（步骤输出）不会丢失
+         force_args=['--incremental', '--force'], incremental_args=['--incremental']),
+]
+
+STEP_NAMES = [step.name for step in STEPS]
+
+
+class Pipeline:
+    """按依赖图执行步骤，内容哈希判断新鲜度"""
+
+    def __init__(self, ctx, steps=STEPS):
+        self.ctx = ctx
+        self.steps = {step.name: step for step in steps}
+        self.state_file = ctx.paper_dir / STATE_FILE
+        self.log_dir = ctx.paper_dir / LOG_DIR
+        self.state = self._load_state()
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+
+    def _load_state(self):
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('version') == STATE_VERSION:
+                return state
+        except (OSError, ValueError):
+            pass
+        return {'version': STATE_VERSION, 'hashes': {}, 'steps': {}}
+
+    def _save_state(self):
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = self.state_file.with_name(f'.{self.state_file.name}.{os.getpid()}.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.state_file)
+
+    def file_hash(self, path):
+        """文件sha256，按 (大小, 修改时间) 缓存；文件不存在时为None"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = str(path)
+        with self._lock:
+            cached = self.state['hashes'].get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        with self._lock:
+            self.state['hashes'][key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def _relative(self, path):
+        try:
+            return Path(path).relative_to(self.ctx.project_root).as_posix()
+        except ValueError:
+            return str(path)
+
+    def index_hashes(self):
+        """
+        同步项目索引（project_index.py）并取其中的文件哈希 {相对paper的路径: 哈希}；
+        paper目录下的输入直接用索引判断是否变化，索引不可用时返回{}，全部按自身缓存计算
+        """
+        with self._index_lock:
+            try:
+                return current_hashes(self.ctx.project_root)
+            except (sqlite3.Error, OSError, ValueError):
+                return {}
+
+    def input_digest(self, step):
+        """步骤输入（含工具脚本及其导入的本地模块）的汇总哈希，不存在的可选输入不计入"""
+        digest = hashlib.sha256()
+        tools = [TOOLS_DIR / step.script] + local_modules(step.script)
+        indexed = self.index_hashes()
+        for path in tools + sorted(set(step.inputs(self.ctx))):
+            try:
+                file_digest = indexed.get(Path(path).relative_to(self.ctx.paper_dir).as_posix())
+            except ValueError:
+                file_digest = None
+            file_digest = file_digest or self.file_hash(path)
+            if file_digest is not None:
+                digest.update(f'{self._relative(path)}\0{file_digest}\n'.encode('utf-8'))
+        return digest.hexdigest()
+
+    def output_digests(self, step):
+        return {self._relative(path): self.file_hash(path) for path in step.outputs(self.ctx)}
+
+    def stale_reason(self, step, force=False):
+        """需要重建的原因，已是最新时返回None"""
+        if force:
+            return '--force'
+        record = self.state['steps'].get(step.name)
+        if record is None:
+            return '首次构建'
+        if record.get('inputs') != self.input_digest(step):
+            return '输入变化'
+        outputs = self.output_digests(step)
+        if any(digest is None for digest in outputs.values()):
+            return '输出缺失'
+        if outputs != record.get('outputs', {}):
+            return '输出被修改'
+        return None
+
+    def has_inputs(self, step):
+        return bool(step.inputs(self.ctx))
+
+    def select(self, targets=None, skip=()):
+        """目标步骤及其全部上游（按声明顺序，即拓扑序），去掉skip中的步骤"""
+        wanted = set()
+
+        def add(name):
+            if name in wanted:
+                return
+            wanted.add(name)
+            for dep in self.steps[name].deps:
+                add(dep)
+
+        for name in targets or self.steps:
+            add(name)
+        return [name for name in self.steps if name in wanted and name not in skip]
+
+    def plan(self, names, force=False):
+        """
+        预演：[(步骤名, 动作, 原因)]，动作为 build / fresh / skip
+        上游将重建的步骤按保守原则计为重建（真正执行时再按内容哈希判断）
+        """
+        planned = []
+        rebuilding = set()
+        for name in names:
+            step = self.steps[name]
+            if not self.has_inputs(step):
+                planned.append((name, 'skip', '无输入'))
+                continue
+            reason = self.stale_reason(step, force)
+            if reason is None:
+                upstream = [dep for dep in step.deps if dep in rebuilding]
+                if upstream:
+                    reason = f'上游将重建（{", ".join(upstream)}）'
+            if reason:
+                rebuilding.add(name)
+                planned.append((name, 'build', reason))
+            else:
+                planned.append((name, 'fresh', '已是最新'))
+        return planned
+
+    def _run_step(self, step, force=False):
+        """执行一个步骤，返回 (是否成功, 耗时, 日志路径)"""
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        log_file = self.log_dir / f'{step.name}.log'
+        command = step.command(self.ctx, force)
+        # 事件目标（pra build --events）传给子进程，各工具的逐项事件写入同一事件流
+        env, pass_fds = events.child_environment(dict(os.environ, PYTHONIOENCODING='utf-8'))
+        start = time.perf_counter()
+        with open(log_file, 'w', encoding='utf-8') as log:
+            for attempt in range(1, MAX_SETTLE_RUNS + 1):
+                # 记录运行前的输入哈希：运行期间被修改的输入（如导出时保存的章节）下次仍会重建
+                inputs = self.input_digest(step)
+                log.write('$ ' + ' '.join(command) + '\n\n')
+                log.flush()
+                result = subprocess.run(command, cwd=self.ctx.project_root, stdout=log,
+                                        stderr=subprocess.STDOUT, env=env, pass_fds=pass_fds)
+                # 改写自身输入的步骤（幂等）：运行前后输入一致才说明记录的哈希就是处理过的内容
+                if result.returncode != 0 or not step.rewrites_inputs or self.input_digest(step) == inputs:
+                    settled = True
+                    break
+                settled = False
+                if attempt < MAX_SETTLE_RUNS:
+                    log.write(f'\n# 输入在运行中发生变化，重新运行（第{attempt + 1}次）\n')
+        seconds = time.perf_counter() - start
+        if result.returncode == 0 and settled:
+            record = {
+                'inputs': inputs,
+                'outputs': self.output_digests(step),
+                'seconds': round(seconds, 3),
+                'finished': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            with self._lock:
+                self.state['steps'][step.name] = record
+                self._save_state()
+        return result.returncode == 0, seconds, log_file
+
+    def run(self, names, jobs=None, force=False, on_event=None):
+        """
+        执行选中的步骤：依赖完成后才开始，互不依赖的并行
+
+        参数:
+            on_event: on_event(步骤名, 状态, 详情)，状态为 start / built / fresh / skip / failed / blocked
+
+        返回:
+            dict: {步骤名: {'status': ..., 'reason': ..., 'seconds': ..., 'log': ...}}
+        """
+        on_event = on_event or (lambda *event: None)
+        results = {}
+        remaining = list(names)
+        running = {}
+
+        def finished(name):
+            return name in results or name not in names
+
+        with ThreadPoolExecutor(max_workers=jobs or min(4, os.cpu_count() or 1)) as executor:
+            while remaining or running:
+                for name in list(remaining):
+                    step = self.steps[name]
+                    if not all(finished(dep) for dep in step.deps):
+                        continue
+                    remaining.remove(name)
+                    failed = [dep for dep in step.deps if results.get(dep, {}).get('status') in ('failed', 'blocked')]
+                    if failed:
+                        results[name] = {'status': 'blocked', 'reason': f'上游失败（{", ".join(failed)}）'}
+                    elif not self.has_inputs(step):
+                        results[name] = {'status': 'skip', 'reason': '无输入'}
+                    else:
+                        reason = self.stale_reason(step, force)
+                        if reason is None:
+                            results[name] = {'status': 'fresh', 'reason': '已是最新'}
+                        else:
+                            on_event(name, 'start', reason)
+                            running[executor.submit(self._run_step, step, force)] = (name, reason)
+                            continue
+                    on_event(name, results[name]['status'], results[name]['reason'])
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, reason = running.pop(future)
+                    try:
+                        ok, seconds, log_file = future.result()
+                    except OSError as e:
+                        ok, seconds, log_file = False, 0.0, None
+                        reason = str(e)
+                    results[name] = {'status': 'built' if ok else 'failed', 'reason': reason,
+                                     'seconds': seconds, 'log': log_file}
+                    on_event(name, results[name]['status'], results[name])
+        return results
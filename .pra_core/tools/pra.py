@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+论文项目命令行入口
+
+子命令:
+    query   查询项目索引（查询前自动增量同步 paper/.cache/index.sqlite）
+    store   跨项目共享的内容寻址存储（asset_store.py）
+    build   按依赖图构建：ER图 → 图表渲染 → 样式标记 → DOCX导出 → 截图（pipeline.py）
+
+使用方法:
+    python3 pra.py query <查询名> [参数] [--project 项目根目录] [--json]
+    python3 pra.py query sql "SELECT ..."
+    python3 pra.py store dedupe <项目目录...> [--mode auto|reflink|hardlink] [--store 存储目录]
+    python3 pra.py store restore <项目目录...>
+    python3 pra.py store status
+    python3 pra.py build [步骤...] [--project 项目根目录] [--dry-run] [--force] [--jobs N] [--skip 步骤]
+                         [--events 目标] [--quiet]
+
+示例:
+    python3 tools/pra.py query uses Tab-users.json     # 哪些章节引用了这张表
+    python3 tools/pra.py query empty                   # 哪些章节还没有内容
+    python3 tools/pra.py query changed                 # 上次导出后哪些图表变了
+    python3 tools/pra.py query sql "SELECT id, title FROM chapters WHERE content_chars < 200"
+    python3 .pra_core/tools/pra.py store dedupe projects/* .pra_core
+    python3 tools/pra.py build --dry-run                  # 预演哪些步骤需要重建
+    python3 tools/pra.py build docx --skip plantuml       # 只构建到DOCX，跳过PlantUML
+    python3 tools/pra.py build --quiet --events build.jsonl  # 各步骤的进度事件写入同一文件
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+from asset_store import MODES, AssetStore, dedupe_project, restore_project
+from path_config import PathConfigError
+from pipeline import STEP_NAMES, BuildContext, Pipeline
+from pra_events import add_event_arguments, configure_events, events
+from project_index import QUERIES, run_query, update_index
+
+
+def display_width(text):
+    """终端显示宽度（中文占两格）"""
+    return sum(2 if unicodedata.east_asian_width(ch) in ('W', 'F') else 1 for ch in text)
+
+
+def print_rows(columns, rows):
+    """按列对齐输出查询结果"""
+    cells = [[('' if value is None else str(value)) for value in row] for row in rows]
+    widths = [
+        max([display_width(column)] + [display_width(row[i]) for row in cells])
+        for i, column in enumerate(columns)
+    ]
+
+    def line(values):
+        return '  '.join(value + ' ' * (width - display_width(value)) for value, width in zip(values, widths)).rstrip()
+
+    print(line(columns))
+    print('  '.join('-' * width for width in widths))
+    for row in cells:
+        print(line(row))
+
+
+def cmd_query(args):
+    project_root = Path(args.project) if args.project else Path(__file__).parent.parent
+    if not (project_root / 'paper').exists():
+        print(f"❌ paper目录不存在: {project_root / 'paper'}")
+        return 1
+    if args.name == 'list':
+        for name, (description, _) in QUERIES.items():
+            print(f"  {name:8} {description}")
+        print(f"  {'sql':8} 执行只读SQL（表: files, outline, chapters, items, refs）")
+        return 0
+    if args.name not in QUERIES and args.name != 'sql':
+        print(f"❌ 未知查询: {args.name}（可用: {', '.join(QUERIES)}, sql, list）")
+        return 1
+    if args.name in ('uses', 'sql') and not args.arg:
+        print(f"❌ 查询 {args.name} 需要参数")
+        return 1
+
+    try:
+        stats = update_index(project_root)
+    except PathConfigError as e:
+        print(f"❌ 路径配置错误: {e}")
+        return 1
+    if not args.json and (stats['added'] or stats['updated'] or stats['removed']):
+        print(f"🔄 索引已同步：新增 {stats['added']}，更新 {stats['updated']}，"
+              f"删除 {stats['removed']}（{stats['seconds']:.2f}秒）\n")
+
+    try:
+        columns, rows = run_query(project_root, args.name, args.arg)
+    except sqlite3.Error as e:
+        print(f"❌ 查询失败: {e}")
+        return 1
+
+    if args.json:
+        print(json.dumps([dict(zip(columns, row)) for row in rows], ensure_ascii=False, indent=2))
+    elif rows:
+        print_rows(columns, rows)
+        print(f"\n📊 共 {len(rows)} 条")
+    else:
+        print("（无结果）")
+    return 0
+
+
+def cmd_store(args):
+    store = AssetStore(args.store)
+    if args.action == 'status':
+        count, size = store.stats()
+        print(f"🗄️  存储目录: {store.root}")
+        print(f"📊 对象 {count} 个，共 {size / 1024 / 1024:.1f} MB")
+        return 0
+
+    if not args.projects:
+        print(f"❌ store {args.action} 需要项目目录")
+        return 1
+    status = 0
+    for project in args.projects:
+        project_root = Path(project)
+        if not project_root.is_dir():
+            print(f"❌ 目录不存在: {project_root}")
+            status = 1
+            continue
+        try:
+            if args.action == 'dedupe':
+                result = dedupe_project(store, project_root, args.mode, args.min_size)
+                modes = '，'.join(f'{mode} {n}' for mode, n in sorted(result['modes'].items())) or '无改动'
+                print(f"  ✅ {project_root}: {result['files']} 个文件，新对象 {result['added']}，"
+                      f"改为共享 {result['linked']}（{modes}），节省 {result['saved'] / 1024:.1f} KB")
+                if result['unlinked']:
+                    print(f"  🔓 {result['unlinked']} 个可写文件原为硬链接，已改回独立文件")
+            else:
+                restored, unavailable = restore_project(store, project_root, args.mode)
+                print(f"  ✅ {project_root}: 还原 {restored} 个文件")
+                for relative, digest in unavailable:
+                    print(f"  ⚠️  存储中没有 {relative}（{digest[:12]}）")
+                    status = 1
+        except OSError as e:
+            print(f"  ❌ {project_root}: {e}")
+            status = 1
+    count, size = store.stats()
+    print(f"\n🗄️  {store.root}: 对象 {count} 个，共 {size / 1024 / 1024:.1f} MB")
+    return status
+
+
+BUILD_ICONS = {'build': '🔨', 'fresh': '⏭️ ', 'skip': '➖', 'built': '✅', 'failed': '❌', 'blocked': '⛔'}
+
+
+def cmd_build(args):
+    project_root = Path(args.project) if args.project else Path(__file__).parent.parent
+    if not (project_root / 'paper').exists():
+        print(f"❌ paper目录不存在: {project_root / 'paper'}")
+        return 1
+    unknown = [name for name in args.targets + args.skip if name not in STEP_NAMES]
+    if unknown:
+        print(f"❌ 未知步骤: {', '.join(unknown)}（可用: {', '.join(STEP_NAMES)}）")
+        return 1
+
+    try:
+        pipeline = Pipeline(BuildContext(project_root, args.output, args.style))
+    except PathConfigError as e:
+        print(f"❌ 路径配置错误: {e}")
+        return 1
+    names = pipeline.select(args.targets, args.skip)
+
+    if args.dry_run:
+        print("🔍 构建预演（不执行）")
+        for name, action, reason in pipeline.plan(names, args.force):
+            description = pipeline.steps[name].description
+            print(f"  {BUILD_ICONS[action]} {name:12} {description}{' ' * (16 - display_width(description))}{reason}")
+        return 0
+
+    configure_events('pra-build', args.events, args.quiet)
+    print(f"🏗️  构建 {project_root}: {' → '.join(names)}")
+    build_start = time.perf_counter()
+
+    # 步骤并行执行，阶段事件按步骤各自写出（不用 events.stage 的嵌套）
+    def on_event(name, status, detail):
+        if status == 'start':
+            events.emit('stage_start', stage=name, reason=detail)
+            if not events.quiet:
+                print(f"  ▶️  {name}（{detail}）")
+        elif status in ('built', 'failed'):
+            events.emit('stage_end', stage=name, seconds=round(detail['seconds'], 3),
+                        status='ok' if status == 'built' else 'error', log=detail.get('log'))
+            if status == 'built':
+                events.item('step', name, f"  {BUILD_ICONS[status]} {name}（{detail['seconds']:.2f}秒）")
+            else:
+                events.warning(f"步骤失败: {name}", f"  {BUILD_ICONS[status]} {name}（{detail['seconds']:.2f}秒）")
+            if status == 'failed' and detail.get('log'):
+                lines = Path(detail['log']).read_text(encoding='utf-8', errors='replace').splitlines()
+                for line in lines[-10:]:
+                    print(f"      {line}")
+                print(f"      完整日志: {detail['log']}")
+        else:
+            events.item('step', name, f"  {BUILD_ICONS[status]} {name}（{detail}）", status=status, reason=detail)
+
+    results = pipeline.run(names, args.jobs, args.force, on_event)
+    events.timing('build', time.perf_counter() - build_start, failed=sum(
+        1 for result in results.values() if result['status'] in ('failed', 'blocked')))
+
+    print(f"\n📊 步骤耗时（总计 {time.perf_counter() - build_start:.2f}秒）")
+    for name in names:
+        result = results.get(name, {})
+        seconds = f"{result['seconds']:.2f}秒" if 'seconds' in result else '-'
+        print(f"  {BUILD_ICONS[result.get('status', 'skip')]} {name:12} {seconds:>9}  {result.get('reason', '')}")
+    failed = [name for name, result in results.items() if result['status'] in ('failed', 'blocked')]
+    return 1 if failed else 0
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='论文项目命令行入口')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    query_parser = subparsers.add_parser('query', help='查询项目索引（章节、资源引用、导出后的变化）')
+    query_parser.add_argument('name', help=f'查询名: {", ".join(QUERIES)}, sql, list')
+    query_parser.add_argument('arg', nargs='?', default=None, help='查询参数（uses的文件名、sql的语句）')
+    query_parser.add_argument('--project', default=None, help='项目根目录（默认为工具所在目录的上一级）')
+    query_parser.add_argument('--json', action='store_true', help='以JSON输出')
+    query_parser.set_defaults(handler=cmd_query)
+
+    store_parser = subparsers.add_parser('store', help='跨项目共享的内容寻址存储')
+    store_parser.add_argument('action', choices=['dedupe', 'restore', 'status'],
+                              help='dedupe: 存入并改为共享；restore: 按 .pra-store.json 还原缺失文件；status: 存储统计')
+    store_parser.add_argument('projects', nargs='*', help='项目目录')
+    store_parser.add_argument('--store', default=None, help='存储目录（默认 $PRA_STORE 或 ~/.cache/pra/store）')
+    store_parser.add_argument('--mode', choices=MODES, default='auto', help='落地方式（默认auto: reflink，不支持时保持原文件；hardlink 只用于原始文档）')
+    store_parser.add_argument('--min-size', type=int, default=1024, help='小于该字节数的文件只记录哈希（默认1024）')
+    store_parser.set_defaults(handler=cmd_store)
+
+    build_parser = subparsers.add_parser('build', help='按依赖图构建（内容哈希判断新鲜度，独立步骤并行）')
+    build_parser.add_argument('targets', nargs='*', default=[], help=f'目标步骤（默认全部）: {", ".join(STEP_NAMES)}')
+    build_parser.add_argument('--project', default=None, help='项目根目录（默认为工具所在目录的上一级）')
+    build_parser.add_argument('--dry-run', action='store_true', help='只列出需要重建的步骤及原因')
+    build_parser.add_argument('--force', action='store_true', help='忽略新鲜度，全部重建')
+    build_parser.add_argument('--jobs', type=int, default=None, help='并行步骤数（默认 min(4, CPU核数)）')
+    build_parser.add_argument('--skip', action='append', default=[], metavar='STEP', help='跳过的步骤（可多次指定）')
+    build_parser.add_argument('--output', default=None, help='DOCX输出文件（默认 paper/食堂评价系统论文-完整版.docx）')
+    build_parser.add_argument('--style', default=None, help='样式配置文件（默认 templates/docx-styles-yxnu.json）')
+    add_event_arguments(build_parser)
+    build_parser.set_defaults(handler=cmd_build)
+
+    args = parser.parse_args()
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结构化进度事件
+各工具在控制台输出的同时，可把进度写成JSON Lines事件流，供批量构建、门户等实时读取，
+不必解析带表情符号的日志；--quiet 时不再逐项输出到控制台（阶段汇总、警告照常输出）。
+
+事件（每行一个JSON对象，都带 ts、tool、pid、type）:
+    stage_start  {"stage": "build"}
+    stage_end    {"stage": "build", "seconds": 1.23}
+    item         {"kind": "image", "name": "er-overall.png", "bytes": 123456, "stage": "build", ...}
+    warning      {"message": "图片不存在: ..."}
+    timing       {"name": "save", "seconds": 0.05}
+
+目标（--events 或环境变量 PRA_EVENTS，子进程会继承环境变量）:
+    events.jsonl        追加写入文件
+    -                   标准输出（此时控制台输出改到标准错误，标准输出只有事件）
+    fd:3                已打开的文件描述符（如 3>events.jsonl、管道）
+    tcp:host:port       TCP连接
+    unix:/path/to.sock  Unix域套接字
+
+使用方法:
+    from pra_events import add_event_arguments, configure_events, events
+
+    add_event_arguments(parser)
+    args = parser.parse_args()
+    configure_events('tool-name', args.events, args.quiet)
+
+    with events.stage('build'):
+        events.item('image', 'a.png', f"    ✅ 插入图片: a.png", bytes=1024)
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+EVENTS_ENV = 'PRA_EVENTS'
+QUIET_ENV = 'PRA_QUIET'
+
+
+def open_target(spec):
+    """按目标说明打开可写的文本流"""
+    if spec == '-':
+        # 标准输出留给事件：先复制出事件用的描述符，再让fd 1指向标准错误，
+        # 工具自身和继承标准输出的子进程的控制台输出都不会混进事件流
+        sys.stdout.flush()
+        stream = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8', buffering=1)
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+        return stream
+    if spec.startswith('fd:'):
+        return os.fdopen(int(spec[3:]), 'w', encoding='utf-8', buffering=1, closefd=False)
+    if spec.startswith('tcp:'):
+        host, _, port = spec[4:].rpartition(':')
+        return socket.create_connection((host or 'localhost', int(port))).makefile('w', encoding='utf-8', buffering=1)
+    if spec.startswith('unix:'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(spec[5:])
+        return sock.makefile('w', encoding='utf-8', buffering=1)
+    # 追加写入：多个进程（pra build 的各步骤）可写同一文件，每行一次写出
+    return open(spec, 'a', encoding='utf-8', buffering=1)
+
+
+class EventStream:
+    """事件流；未指定目标时只负责控制台输出"""
+
+    def __init__(self, tool='pra', target=None, quiet=False):
+        self.tool = tool
+        self.target = target
+        self.quiet = quiet
+        self._stream = open_target(target) if target else None
+        self._lock = threading.Lock()
+        # 阶段按线程记录（批量截图等在多个线程中各自处理文档）
+        self._local = threading.local()
+
+    @property
+    def _stages(self):
+        if not hasattr(self._local, 'stages'):
+            self._local.stages = []
+        return self._local.stages
+
+    @property
+    def enabled(self):
+        return self._stream is not None
+
+    def emit(self, event_type, **fields):
+        """写出一个事件（未指定目标时忽略）"""
+        if self._stream is None:
+            return
+        event = {'ts': round(time.time(), 3), 'tool': self.tool, 'pid': os.getpid(), 'type': event_type}
+        event.update((key, str(value) if hasattr(value, '__fspath__') else value) for key, value in fields.items())
+        line = json.dumps(event, ensure_ascii=False) + '\n'
+        with self._lock:
+            try:
+                self._stream.write(line)
+                self._stream.flush()
+            except OSError:
+                # 读取端已关闭时不影响工具本身运行
+                self._stream = None
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """阶段开始/结束事件，结束事件带耗时"""
+        self.emit('stage_start', stage=name, **fields)
+        self._stages.append(name)
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            yield
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            self._stages.pop()
+            self.emit('stage_end', stage=name, seconds=round(time.perf_counter() - start, 3), status=status, **fields)
+
+    def item(self, kind, name, console=None, **fields):
+        """处理完一项：写出事件，非quiet时在控制台输出console"""
+        if self._stages:
+            fields.setdefault('stage', self._stages[-1])
+        self.emit('item', kind=kind, name=name, **fields)
+        if console is not None and not self.quiet:
+            print(console)
+
+    def warning(self, message, console=None, **fields):
+        """警告：写出事件，控制台照常输出（quiet也不屏蔽）"""
+        self.emit('warning', message=message, **fields)
+        if console is not None:
+            print(console)
+
+    def timing(self, name, seconds, **fields):
+        self.emit('timing', name=name, seconds=round(seconds, 3), **fields)
+
+    def child_environment(self, env=None):
+        """
+        子进程（pra build 的各步骤）写到同一事件目标所需的环境变量与文件描述符，quiet 时一并传递 PRA_QUIET
+
+        子进程的标准输出重定向到日志，'-' 改为传递事件所用的标准输出副本；文件路径改为绝对路径。
+
+        返回:
+            tuple: (环境变量dict, pass_fds)
+        """
+        env = dict(os.environ if env is None else env)
+        if self.quiet:
+            env[QUIET_ENV] = '1'
+        else:
+            env.pop(QUIET_ENV, None)
+        target = self.target if self._stream is not None else None
+        if not target:
+            env.pop(EVENTS_ENV, None)
+            return env, ()
+        pass_fds = ()
+        if target == '-':
+            target = f'fd:{self._stream.fileno()}'
+            pass_fds = (self._stream.fileno(),)
+        elif target.startswith('fd:'):
+            pass_fds = (int(target[3:]),)
+        elif not target.startswith(('tcp:', 'unix:')):
+            target = os.path.abspath(target)
+        env[EVENTS_ENV] = target
+        return env, pass_fds
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+        self._stream = None
+
+
+class _EventsProxy:
+    """模块级的 events，configure_events 之后指向实际的事件流"""
+
+    def __init__(self):
+        self._current = EventStream()
+
+    def __getattr__(self, name):
+        return getattr(self._current, name)
+
+
+events = _EventsProxy()
+
+
+def configure_events(tool, target=None, quiet=False):
+    """
+    配置本进程的事件流；未指定时取环境变量 PRA_EVENTS / PRA_QUIET（由 pra build 等父进程传入）
+
+    返回:
+        EventStream
+    """
+    target = target or os.environ.get(EVENTS_ENV) or None
+    quiet = quiet or os.environ.get(QUIET_ENV) == '1'
+    events._current.close()
+    events._current = EventStream(tool, target, quiet)
+    return events._current
+
+
+def add_event_arguments(parser):
+    """为命令行工具添加 --events / --quiet"""
+    parser.add_argument('--events', default=None, metavar='TARGET',
+                        help='JSON Lines事件输出：文件路径、-、fd:N、tcp:host:port、unix:/path')
+    parser.add_argument('--quiet', action='store_true', help='不逐项输出到控制台（阶段汇总和警告照常输出）')
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+项目索引
+在 paper/.cache/index.sqlite 中维护章节、子项、图表/表格引用以及各文件的哈希和修改时间，
+回答"哪些章节引用了某张表"、"哪些章节还没有内容"、"上次导出后哪些图变了"等问题，
+不必每次都遍历解析全部JSON。pra build 也用索引中的哈希判断 paper 目录下的步骤输入是否变化（current_hashes）。
+
+同步是增量的：大小和修改时间都未变的文件直接跳过，只重新解析变化的文件。
+
+数据表:
+    files    (path, kind, size, mtime_ns, sha256, exported_sha256)  paper目录下的文件
+    outline  (id, title, level, parent, position, is_leaf)
+    chapters (id, path, title, content_chars, word_limit)
+    items    (chapter_id, position, title, text_chars)
+    refs     (chapter_id, field, raw, target)  imagePath/tablePath 引用，target为相对paper的路径
+
+查询入口见 pra.py query。
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+from path_config import CONFIG_FILE as PATH_CONFIG_FILE, PathResolver, asset_refs
+
+INDEX_VERSION = 1
+INDEX_FILE = Path('.cache') / 'index.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, kind TEXT NOT NULL, size INTEGER, mtime_ns INTEGER,
+    sha256 TEXT, exported_sha256 TEXT
+);
+CREATE TABLE IF NOT EXISTS outline (
+    id TEXT PRIMARY KEY, title TEXT, level INTEGER, parent TEXT, position INTEGER, is_leaf INTEGER
+);
+CREATE TABLE IF NOT EXISTS chapters (
+    id TEXT PRIMARY KEY, path TEXT NOT NULL, title TEXT, content_chars INTEGER, word_limit INTEGER
+);
+CREATE TABLE IF NOT EXISTS items (
+    chapter_id TEXT, position INTEGER, title TEXT, text_chars INTEGER,
+    PRIMARY KEY (chapter_id, position)
+);
+CREATE TABLE IF NOT EXISTS refs (chapter_id TEXT, field TEXT, raw TEXT, target TEXT);
+CREATE INDEX IF NOT EXISTS refs_target ON refs(target);
+CREATE INDEX IF NOT EXISTS refs_chapter ON refs(chapter_id);
+CREATE INDEX IF NOT EXISTS chapters_path ON chapters(path);
+"""
+
+# 命名查询：pra.py query <名称> [参数]
+QUERIES = {
+    'uses': (
+        '引用了指定资源的章节（参数：文件名或路径片段）',
+        """SELECT r.chapter_id, c.title, r.field, r.raw
+           FROM refs r LEFT JOIN chapters c ON c.id = r.chapter_id
+           WHERE r.raw LIKE '%' || :arg || '%' OR r.target LIKE '%' || :arg || '%'
+           ORDER BY r.chapter_id""",
+    ),
+    'empty': (
+        '还没有内容的章节（大纲叶子节点：无章节文件或正文、子项均为空）',
+        """SELECT o.id, o.title, CASE WHEN c.id IS NULL THEN '无章节文件' ELSE '正文为空' END AS status
+           FROM outline o LEFT JOIN chapters c ON c.id = o.id
+           WHERE o.is_leaf AND (c.id IS NULL OR (c.content_chars = 0 AND NOT EXISTS (
+               SELECT 1 FROM items i WHERE i.chapter_id = c.id AND i.text_chars > 0)))
+           ORDER BY o.position""",
+    ),
+    'changed': (
+        '上次导出后新增或变化的图表和表格',
+        """SELECT path, kind, CASE WHEN exported_sha256 IS NULL THEN '新增' ELSE '已修改' END AS status
+           FROM files
+           WHERE kind IN ('diagram', 'table') AND (exported_sha256 IS NULL OR exported_sha256 != sha256)
+           ORDER BY path""",
+    ),
+    'missing': (
+        '引用了不存在文件或未知路径变量的章节',
+        """SELECT r.chapter_id, r.field, r.raw
+           FROM refs r LEFT JOIN files f ON f.path = r.target
+           WHERE f.path IS NULL
+           ORDER BY r.chapter_id""",
+    ),
+    'unused': (
+        '没有被任何章节引用的图表和表格',
+        """SELECT f.path, f.kind FROM files f
+           WHERE f.kind IN ('diagram', 'table') AND NOT EXISTS (SELECT 1 FROM refs r WHERE r.target = f.path)
+           ORDER BY f.path""",
+    ),
+}
+
+
+def index_path(paper_dir):
+    return Path(paper_dir) / INDEX_FILE
+
+
+def file_kind(relative):
+    """按相对paper目录的位置判断文件类型，不纳入索引的返回None"""
+    parts = relative.parts
+    if any(part.startswith('.') for part in parts):
+        return None
+    if parts == ('outline.json',):
+        return 'outline'
+    if parts[0] == 'chapters' and relative.name.startswith('chapter.') and relative.suffix == '.json':
+        return 'chapter'
+    if parts[:2] == ('assets', 'tables') and relative.suffix == '.json':
+        return 'table'
+    if parts[:2] == ('assets', 'diagrams'):
+        return 'diagram'
+    if parts[:2] == ('assets', 'plantuml'):
+        return 'plantuml'
+    if len(parts) == 1 and relative.suffix == '.json':
+        return 'config'
+    return None
+
+
+def scan_files(paper_dir, extra_dirs=()):
+    """
+    {相对路径: (类型, 绝对路径, stat)}
+
+    extra_dirs: paper目录下、assets之外由路径变量指向的资源目录，其中的文件按图表处理
+    """
+    paper_dir = Path(paper_dir)
+    found = {}
+    for directory in (paper_dir, paper_dir / 'chapters', paper_dir / 'assets', *extra_dirs):
+        if not directory.exists():
+            continue
+        extra = directory in extra_dirs
+        pattern = '*' if directory == paper_dir else '**/*'
+        for path in directory.glob(pattern):
+            if not path.is_file():
+                continue
+            relative = path.relative_to(paper_dir)
+            if extra:
+                kind = None if any(part.startswith('.') for part in relative.parts) else 'diagram'
+            else:
+                kind = file_kind(relative)
+            if kind:
+                found[relative.as_posix()] = (kind, path, path.stat())
+    return found
+
+
+def variable_dirs(resolver):
+    """路径变量指向的、位于paper目录下但不在已扫描目录中的目录"""
+    paper_dir = resolver.paper_dir.resolve()
+    covered = (paper_dir / 'assets', paper_dir / 'chapters', paper_dir / '.cache')
+    dirs = []
+    for path in resolver.path_vars.values():
+        path = path.resolve()
+        if path == paper_dir or paper_dir not in path.parents:
+            continue
+        if any(path == c or c in path.parents for c in covered):
+            continue
+        if not any(d == path or d in path.parents for d in dirs):
+            dirs.append(path)
+    return [resolver.paper_dir / d.relative_to(paper_dir) for d in dirs]
+
+
+def connect(paper_dir):
+    """打开（必要时创建）索引数据库，版本不符时重建"""
+    db_file = index_path(paper_dir)
+    db_file.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_file)
+    row = None
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    except sqlite3.OperationalError:
+        pass
+    if row is None or row[0] != str(INDEX_VERSION):
+        for table in ('meta', 'files', 'outline', 'chapters', 'items', 'refs'):
+            conn.execute(f'DROP TABLE IF EXISTS {table}')
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO meta VALUES ('version', ?)", (str(INDEX_VERSION),))
+        conn.commit()
+    return conn
+
+
+def _index_outline(conn, data):
+    conn.execute('DELETE FROM outline')
+    nodes = data.get('outline', []) if isinstance(data, dict) else []
+    conn.executemany(
+        'INSERT OR REPLACE INTO outline VALUES (?, ?, ?, ?, ?, ?)',
+        [
+            (node.get('id'), node.get('title'), node.get('level'), node.get('parent'),
+             position, int(not node.get('children')))
+            for position, node in enumerate(nodes) if isinstance(node, dict) and node.get('id')
+        ]
+    )
+
+
+def _remove_chapter(conn, relative):
+    for (chapter_id,) in conn.execute('SELECT id FROM chapters WHERE path = ?', (relative,)).fetchall():
+        conn.execute('DELETE FROM items WHERE chapter_id = ?', (chapter_id,))
+        conn.execute('DELETE FROM refs WHERE chapter_id = ?', (chapter_id,))
+        conn.execute('DELETE FROM chapters WHERE id = ?', (chapter_id,))
+
+
+def _index_chapter(conn, relative, data, resolver):
+    _remove_chapter(conn, relative)
+    if not isinstance(data, dict) or not data.get('id'):
+        return
+    chapter_id = data['id']
+    conn.execute(
+        'INSERT OR REPLACE INTO chapters VALUES (?, ?, ?, ?, ?)',
+        (chapter_id, relative, data.get('title'), len((data.get('content') or '').strip()), data.get('word_limit'))
+    )
+
+    for position, item in enumerate(data.get('items') or []):
+        if isinstance(item, dict):
+            conn.execute(
+                'INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)',
+                (chapter_id, position, item.get('title'), len((item.get('text') or '').strip()))
+            )
+
+    for field, raw in asset_refs(data):
+        resolved = resolver.resolve(raw)
+        target = None
+        if resolved is not None:
+            try:
+                target = resolved.relative_to(resolver.paper_dir).as_posix()
+            except ValueError:
+                target = resolved.as_posix()
+        conn.execute('INSERT INTO refs VALUES (?, ?, ?, ?)', (chapter_id, field, raw, target))
+
+
+def update_index(project_root):
+    """
+    增量同步索引
+
+    返回:
+        dict: {'added': n, 'updated': n, 'removed': n, 'unchanged': n, 'seconds': 耗时}
+    """
+    started = time.perf_counter()
+    paper_dir = Path(project_root) / 'paper'
+    stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    resolver = PathResolver(project_root)
+    conn = connect(paper_dir)
+    try:
+        known = {path: (size, mtime_ns) for path, size, mtime_ns in conn.execute('SELECT path, size, mtime_ns FROM files')}
+        found = scan_files(paper_dir, variable_dirs(resolver))
+
+        # 路径变量配置变化时，所有章节的引用目标都要重新解析
+        config_stat = found.get(PATH_CONFIG_FILE)
+        config_changed = known.get(PATH_CONFIG_FILE) != (
+            (config_stat[2].st_size, config_stat[2].st_mtime_ns) if config_stat else None
+        )
+
+        with conn:
+            for relative in set(known) - set(found):
+                conn.execute('DELETE FROM files WHERE path = ?', (relative,))
+                if relative.startswith('chapters/'):
+                    _remove_chapter(conn, relative)
+                elif relative == 'outline.json':
+                    conn.execute('DELETE FROM outline')
+                stats['removed'] += 1
+
+            for relative, (kind, path, stat) in sorted(found.items()):
+                if known.get(relative) == (stat.st_size, stat.st_mtime_ns) and not (config_changed and kind == 'chapter'):
+                    stats['unchanged'] += 1
+                    continue
+                data_bytes = path.read_bytes()
+                conn.execute(
+                    """INSERT INTO files (path, kind, size, mtime_ns, sha256) VALUES (?, ?, ?, ?, ?)
+                       ON CONFLICT(path) DO UPDATE SET kind = excluded.kind, size = excluded.size,
+                           mtime_ns = excluded.mtime_ns, sha256 = excluded.sha256""",
+                    (relative, kind, stat.st_size, stat.st_mtime_ns, hashlib.sha256(data_bytes).hexdigest())
+                )
+                if kind in ('outline', 'chapter'):
+                    try:
+                        data = json.loads(data_bytes)
+                    except ValueError:
+                        data = None
+                    if kind == 'outline':
+                        _index_outline(conn, data)
+                    else:
+                        _index_chapter(conn, relative, data, resolver)
+                stats['updated' if relative in known else 'added'] += 1
+    finally:
+        conn.close()
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def file_hashes(project_root):
+    """索引中各文件的sha256 {相对paper的路径: 哈希}（先调用 update_index 同步）"""
+    conn = connect(Path(project_root) / 'paper')
+    try:
+        return dict(conn.execute('SELECT path, sha256 FROM files'))
+    finally:
+        conn.close()
+
+
+def current_hashes(project_root):
+    """增量同步索引后返回各文件的sha256 {相对paper的路径: 哈希}，供其他工具做脏检查"""
+    update_index(project_root)
+    return file_hashes(project_root)
+
+
+def record_export(project_root, output_file=None, hashes=None):
+    """
+    导出完成后记下导出所用各文件的哈希，作为 query changed 的比较基准
+
+    参数:
+        hashes: 构建开始前取得的 {相对paper的路径: 哈希}（file_hashes，使用快照时为快照内容的哈希）；
+                为None时取索引中当前的哈希
+    """
+    paper_dir = Path(project_root) / 'paper'
+    conn = connect(paper_dir)
+    try:
+        with conn:
+            if hashes is None:
+                conn.execute('UPDATE files SET exported_sha256 = sha256')
+            else:
+                conn.executemany('UPDATE files SET exported_sha256 = ? WHERE path = ?',
+                                 [(digest, path) for path, digest in hashes.items()])
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('last_export', ?)", (time.strftime('%Y-%m-%d %H:%M:%S'),))
+            if output_file:
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('last_export_file', ?)", (str(output_file),))
+    finally:
+        conn.close()
+
+
+def run_query(project_root, name, arg=None):
+    """
+    执行命名查询或只读SQL（name == 'sql' 时arg为语句）
+
+    返回:
+        tuple: (列名列表, 行列表)
+    """
+    conn = connect(Path(project_root) / 'paper')
+    try:
+        if name == 'sql':
+            # 只读执行：任何写操作都会被回滚
+            conn.execute('PRAGMA query_only = ON')
+            cursor = conn.execute(arg)
+        else:
+            cursor = conn.execute(QUERIES[name][1], {'arg': arg or ''})
+        rows = cursor.fetchall()
+        columns = [description[0] for description in cursor.description or []]
+        return columns, rows
+    finally:
+        conn.close()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+项目快照打包工具
+把 paper/ 下分散的JSON文件（outline.json、chapter.*.json、tables/*.json、
+content-plan.json、source-truth.json 等）打包为单个带索引的快照文件，
+读取时通过mmap按需取出单条记录，不再逐个打开、解析几十个小文件；
+也便于整体归档和传输。
+
+文件格式（小端）:
+    头部   8s 魔数 PRAPACK\\0 | I 版本 | I 记录数 | Q 索引偏移 | Q 索引长度
+    记录区 各文件原始字节依次排列
+    索引   每条: H 键长 | 键（相对paper目录的路径，UTF-8）| Q 偏移 | I 长度 | I CRC32 | q 源文件mtime(ns)
+           （版本1的索引没有mtime，仍可读取，过期检查只按内容比较）
+
+使用方法:
+    python3 project_pack.py pack   [--project 项目根目录] [-o 快照文件]
+    python3 project_pack.py unpack <快照文件> [--project 项目根目录]
+    python3 project_pack.py list   <快照文件>
+    python3 project_pack.py status <快照文件> [--project 项目根目录]
+
+示例:
+    python3 tools/project_pack.py pack -o canteen-rating.pack
+    python3 tools/thesis-to-docx-enhanced.py --snapshot canteen-rating.pack
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+MAGIC = b'PRAPACK\0'
+FORMAT_VERSION = 2
+
+HEADER = struct.Struct('<8sIIQQ')
+INDEX_ENTRY = struct.Struct('<QIIq')
+# 各版本的索引项格式（旧版快照仍可读取）
+INDEX_ENTRIES = {1: struct.Struct('<QII'), 2: INDEX_ENTRY}
+KEY_LENGTH = struct.Struct('<H')
+
+DEFAULT_SNAPSHOT = Path('.cache') / 'project.pack'
+
+# stale_records 状态的显示名称
+STALE_LABELS = {'modified': '已修改', 'removed': '已删除', 'added': '新增'}
+
+# 不打包的目录（缓存、生成器清单等可再生内容）
+EXCLUDED_PARTS = {'.cache'}
+
+
+def collect_records(paper_dir):
+    """paper目录下需要打包的JSON文件，返回 [(键, 路径)]，按键排序"""
+    paper_dir = Path(paper_dir)
+    records = []
+    for path in paper_dir.rglob('*.json'):
+        relative = path.relative_to(paper_dir)
+        if EXCLUDED_PARTS.intersection(relative.parts) or path.name.startswith('.'):
+            continue
+        records.append((relative.as_posix(), path))
+    return sorted(records)
+
+
+def write_pack(records, pack_file):
+    """
+    写出快照文件（临时文件 + 重命名）
+
+    参数:
+        records: [(键, bytes, 源文件mtime_ns)]
+        pack_file: 输出路径
+
+    返回:
+        int: 文件大小（字节）
+    """
+    pack_file = Path(pack_file)
+    pack_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = pack_file.with_name(f'.{pack_file.name}.tmp')
+
+    index = []
+    with open(temp_file, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+        for key, data, mtime_ns in records:
+            index.append((key, f.tell(), len(data), zlib.crc32(data), mtime_ns))
+            f.write(data)
+
+        index_offset = f.tell()
+        for key, offset, length, crc, mtime_ns in index:
+            encoded = key.encode('utf-8')
+            f.write(KEY_LENGTH.pack(len(encoded)) + encoded + INDEX_ENTRY.pack(offset, length, crc, mtime_ns))
+        index_length = f.tell() - index_offset
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(index), index_offset, index_length))
+
+    os.replace(temp_file, pack_file)
+    return pack_file.stat().st_size
+
+
+def pack_project(project_root, pack_file=None):
+    """
+    打包项目的paper目录
+
+    返回:
+        tuple: (快照路径, 记录数, 文件大小)
+    """
+    paper_dir = Path(project_root) / 'paper'
+    pack_file = Path(pack_file) if pack_file else paper_dir / DEFAULT_SNAPSHOT
+    records = []
+    for key, path in collect_records(paper_dir):
+        # 先取mtime再读内容：读取之后的修改一定比记录的mtime新
+        mtime_ns = path.stat().st_mtime_ns
+        records.append((key, path.read_bytes(), mtime_ns))
+    size = write_pack(records, pack_file)
+    return pack_file, len(records), size
+
+
+class PackReader:
+    """
+    快照读取器
+
+    打开时只解析头部和索引，记录内容在首次访问时才从mmap中切出并解析，
+    解析结果缓存到关闭为止。index 为 {键: (偏移, 长度, CRC32)}，
+    mtimes 为打包时各源文件的mtime（版本1的快照为None）。
+    """
+
+    def __init__(self, pack_file):
+        self.pack_file = Path(pack_file)
+        self._file = open(self.pack_file, 'rb')
+        self._mmap = None
+        self.mtimes = {}
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.index = self._read_index()
+        except (ValueError, struct.error, UnicodeDecodeError) as e:
+            self.close()
+            raise ValueError(f'不是有效的项目快照: {self.pack_file}（{e}）')
+        self._parsed = {}
+
+    def _read_index(self):
+        magic, version, count, index_offset, index_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError('文件头不匹配')
+        entry = INDEX_ENTRIES.get(version)
+        if entry is None:
+            raise ValueError(f'快照格式版本 {version} 不受支持（当前 {FORMAT_VERSION}）')
+
+        index = {}
+        position = index_offset
+        for _ in range(count):
+            (key_length,) = KEY_LENGTH.unpack_from(self._mmap, position)
+            position += KEY_LENGTH.size
+            key = self._mmap[position:position + key_length].decode('utf-8')
+            position += key_length
+            fields = entry.unpack_from(self._mmap, position)
+            index[key] = fields[:3]
+            self.mtimes[key] = fields[3] if len(fields) > 3 else None
+            position += entry.size
+        if position != index_offset + index_length:
+            raise ValueError('索引长度不一致')
+        return index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return list(self.index)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def read_bytes(self, key):
+        """取出记录原始字节，校验CRC"""
+        offset, length, crc = self.index[key]
+        data = self._mmap[offset:offset + length]
+        if zlib.crc32(data) != crc:
+            raise ValueError(f'快照记录已损坏: {key}')
+        return data
+
+    def load(self, key, default=None):
+        """按键读取并解析JSON记录，不存在时返回default"""
+        if key not in self.index:
+            return default
+        if key not in self._parsed:
+            self._parsed[key] = json.loads(self.read_bytes(key))
+        return self._parsed[key]
+
+    def stale_records(self, paper_dir):
+        """
+        对比paper目录的当前文件，列出快照打包后有变化的记录
+
+        大小不同或mtime比打包时新的文件再按CRC比较内容，只改了mtime的不算；
+        版本1的快照没有mtime，全部按内容比较。
+
+        返回:
+            dict: {键: 'modified' | 'removed' | 'added'}，按键排序
+        """
+        paper_dir = Path(paper_dir)
+        stale = {}
+        for key, (_, length, crc) in self.index.items():
+            path = paper_dir / key
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                stale[key] = 'removed'
+                continue
+            recorded = self.mtimes.get(key)
+            if stat.st_size == length and recorded is not None and stat.st_mtime_ns <= recorded:
+                continue
+            if stat.st_size != length or zlib.crc32(path.read_bytes()) != crc:
+                stale[key] = 'modified'
+        for key, _ in collect_records(paper_dir):
+            if key not in self.index:
+                stale[key] = 'added'
+        return dict(sorted(stale.items()))
+
+    def outline(self):
+        return self.load('outline.json')
+
+    def chapter(self, chapter_id):
+        return self.load(f'chapters/chapter.{chapter_id}.json')
+
+    def table(self, name):
+        return self.load(f'assets/tables/{name}.json')
+
+
+def unpack_project(pack_file, project_root):
+    """
+    把快照还原到项目的paper目录，内容相同的文件不改写
+
+    返回:
+        tuple: (写出数, 未变化数)
+    """
+    paper_dir = Path(project_root) / 'paper'
+    written = unchanged = 0
+    with PackReader(pack_file) as reader:
+        for key in reader.keys():
+            # 快照可能来自他处，拒绝写到paper目录之外的键
+            if key.startswith('/') or '..' in key.split('/'):
+                raise ValueError(f'快照中包含非法路径: {key}')
+            target = paper_dir / key
+            data = reader.read_bytes(key)
+            if target.exists() and target.read_bytes() == data:
+                unchanged += 1
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = target.with_name(f'.{target.name}.tmp')
+            temp_file.write_bytes(data)
+            os.replace(temp_file, target)
+            written += 1
+    return written, unchanged
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='项目快照打包（单文件 + 偏移索引 + mmap按需读取）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    pack_parser = subparsers.add_parser('pack', help='打包paper目录下的JSON文件')
+    pack_parser.add_argument('--project', default=None, help='项目根目录（默认为工具所在目录的上一级）')
+    pack_parser.add_argument('-o', '--output', default=None, help='快照文件（默认 paper/.cache/project.pack）')
+
+    unpack_parser = subparsers.add_parser('unpack', help='把快照还原到paper目录')
+    unpack_parser.add_argument('snapshot', help='快照文件')
+    unpack_parser.add_argument('--project', default=None, help='项目根目录（默认为工具所在目录的上一级）')
+
+    list_parser = subparsers.add_parser('list', help='列出快照中的记录')
+    list_parser.add_argument('snapshot', help='快照文件')
+
+    status_parser = subparsers.add_parser('status', help='列出打包后paper目录中有变化的文件')
+    status_parser.add_argument('snapshot', help='快照文件')
+    status_parser.add_argument('--project', default=None, help='项目根目录（默认为工具所在目录的上一级）')
+
+    args = parser.parse_args()
+    default_root = Path(__file__).parent.parent
+
+    if args.command == 'pack':
+        project_root = Path(args.project) if args.project else default_root
+        if not (project_root / 'paper').exists():
+            print(f"❌ paper目录不存在: {project_root / 'paper'}")
+            return 1
+        pack_file, count, size = pack_project(project_root, args.output)
+        print(f"📦 已打包 {count} 个文件 → {pack_file}（{size / 1024:.1f} KB）")
+        return 0
+
+    try:
+        if args.command == 'unpack':
+            project_root = Path(args.project) if args.project else default_root
+            written, unchanged = unpack_project(args.snapshot, project_root)
+            print(f"📂 已还原到 {project_root / 'paper'}：写出 {written} 个，未变化 {unchanged} 个")
+        elif args.command == 'status':
+            project_root = Path(args.project) if args.project else default_root
+            with PackReader(args.snapshot) as reader:
+                stale = reader.stale_records(project_root / 'paper')
+            for key, status in stale.items():
+                print(f"  {STALE_LABELS[status]}  {key}")
+            if stale:
+                print(f"\n⚠️  快照已过期：{len(stale)} 个文件在打包后有变化，需重新 pack")
+                return 1
+            print("✅ 快照与paper目录一致")
+        else:
+            with PackReader(args.snapshot) as reader:
+                for key in reader.keys():
+                    offset, length, _ = reader.index[key]
+                    print(f"  {length / 1024:7.1f} KB  {key}")
+                print(f"\n📦 共 {len(reader)} 条记录")
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图表栅格化缓存
+SVG按内容哈希 + DPI + 目标像素宽度缓存为PNG，存放在 paper/.cache/rasters/
+（设置 PRA_STORE 时为所有项目共用的 $PRA_STORE/cache/rasters/，见 asset_store.py）。
+生成器（--png）在生成时批量写入缓存，导出工具插图时直接命中，
+同一张图只栅格化一次，不再在每次导出时逐个调用 rsvg-convert。
+
+栅格化后端:
+    - cairosvg（已安装时优先，进程内渲染）: pip install cairosvg
+    - rsvg-convert（命令行）: brew install librsvg / apt install librsvg2-bin
+
+使用方法（批量预热缓存）:
+    python3 raster_cache.py <paper目录> <SVG文件或目录...> [--dpi 300] [--width-cm 14] [--jobs N]
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from asset_store import shared_cache_dir
+
+try:
+    import cairosvg
+    CAIROSVG_SUPPORT = True
+except (ImportError, OSError):
+    CAIROSVG_SUPPORT = False
+
+RSVG_SUPPORT = bool(shutil.which('rsvg-convert'))
+RASTER_SUPPORT = CAIROSVG_SUPPORT or RSVG_SUPPORT
+
+# 与导出工具插图参数一致：300 DPI、版心内14cm宽
+DEFAULT_DPI = 300
+DEFAULT_WIDTH_CM = 14
+
+CACHE_SUBDIR = Path('.cache') / 'rasters'
+
+
+def cache_dir_for(paper_dir):
+    """项目的栅格缓存目录 paper/.cache/rasters（设置 PRA_STORE 时为共享目录）"""
+    return shared_cache_dir('rasters', Path(paper_dir) / CACHE_SUBDIR)
+
+
+def target_width_px(width_cm, dpi):
+    """插图宽度（cm）在指定DPI下对应的像素宽度"""
+    return round(width_cm / 2.54 * dpi)
+
+
+def cache_key(svg_bytes, dpi, width_px):
+    """缓存键 = SVG内容哈希 + 渲染参数"""
+    digest = hashlib.sha256(svg_bytes).hexdigest()
+    return f'{digest}-{dpi}dpi-{width_px}w'
+
+
+def _render(svg_bytes, output_file, dpi, width_px):
+    """调用可用的后端把SVG渲染为白底PNG"""
+    if CAIROSVG_SUPPORT:
+        cairosvg.svg2png(
+            bytestring=svg_bytes, write_to=str(output_file),
+            dpi=dpi, output_width=width_px, background_color='white'
+        )
+    elif RSVG_SUPPORT:
+        subprocess.run([
+            'rsvg-convert',
+            '-d', str(dpi), '-p', str(dpi),
+            '-w', str(width_px), '-a',
+            '-b', 'white',
+            '-o', str(output_file),
+        ], input=svg_bytes, check=True, capture_output=True)
+    else:
+        raise RuntimeError('未找到SVG栅格化工具（cairosvg 或 rsvg-convert）')
+
+
+def cached_raster(svg_path, cache_dir, dpi=DEFAULT_DPI, width_cm=DEFAULT_WIDTH_CM):
+    """SVG已缓存的PNG路径，未缓存时返回None"""
+    png_file = Path(cache_dir) / f'{cache_key(Path(svg_path).read_bytes(), dpi, target_width_px(width_cm, dpi))}.png'
+    return png_file if png_file.exists() else None
+
+
+def rasterize(svg_path, cache_dir, dpi=DEFAULT_DPI, width_cm=DEFAULT_WIDTH_CM):
+    """
+    获取SVG对应的PNG（命中缓存时直接返回）
+
+    参数:
+        svg_path: SVG文件
+        cache_dir: 缓存目录（cache_dir_for(paper目录)）
+        dpi: 渲染DPI
+        width_cm: 插图宽度（cm），决定输出像素宽度
+
+    返回:
+        tuple: (PNG路径, 是否命中缓存)
+    """
+    svg_bytes = Path(svg_path).read_bytes()
+    width_px = target_width_px(width_cm, dpi)
+    cache_dir = Path(cache_dir)
+    png_file = cache_dir / f'{cache_key(svg_bytes, dpi, width_px)}.png'
+    if png_file.exists():
+        return png_file, True
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    temp_file = png_file.with_name(f'{png_file.stem}.{os.getpid()}.tmp.png')
+    try:
+        _render(svg_bytes, temp_file, dpi, width_px)
+        os.replace(temp_file, png_file)
+    finally:
+        if temp_file.exists():
+            temp_file.unlink()
+    return png_file, False
+
+
+def _rasterize_job(svg_path, cache_dir, dpi, width_cm):
+    """进程池任务，返回 (PNG路径, 是否命中缓存, 错误信息)"""
+    try:
+        png_file, hit = rasterize(svg_path, cache_dir, dpi, width_cm)
+        return str(png_file), hit, None
+    except Exception as e:
+        return None, False, str(e)
+
+
+def rasterize_batch(svg_paths, cache_dir, dpi=DEFAULT_DPI, width_cm=DEFAULT_WIDTH_CM, jobs=None):
+    """
+    批量栅格化（进程池），已缓存的跳过
+
+    返回:
+        dict: {'rendered': n, 'cached': n, 'failed': [(SVG, 错误)]}
+    """
+    svg_paths = [str(p) for p in svg_paths]
+    stats = {'rendered': 0, 'cached': 0, 'failed': []}
+    if not svg_paths:
+        return stats
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        results = executor.map(
+            _rasterize_job, svg_paths,
+            [str(cache_dir)] * len(svg_paths), [dpi] * len(svg_paths), [width_cm] * len(svg_paths)
+        )
+        for svg_path, (png_file, hit, error) in zip(svg_paths, results):
+            if error:
+                stats['failed'].append((svg_path, error))
+            elif hit:
+                stats['cached'] += 1
+            else:
+                stats['rendered'] += 1
+    return stats
+
+
+def print_batch_stats(stats):
+    """输出批量栅格化结果"""
+    print(f"🖼️  栅格化: 新渲染 {stats['rendered']} 个，命中缓存 {stats['cached']} 个")
+    for svg_path, error in stats['failed']:
+        print(f"  ❌ {Path(svg_path).name}: {error}")
+
+
+def main():
+    """命令行入口：预热栅格缓存"""
+    parser = argparse.ArgumentParser(description='SVG图表批量栅格化（内容哈希缓存）')
+    parser.add_argument('paper_dir', help='paper目录（缓存写入 paper/.cache/rasters）')
+    parser.add_argument('paths', nargs='+', help='SVG文件或目录')
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI, help='渲染DPI（默认300）')
+    parser.add_argument('--width-cm', type=float, default=DEFAULT_WIDTH_CM, help='插图宽度cm（默认14）')
+    parser.add_argument('--jobs', type=int, default=None, help='并行进程数（默认CPU核数）')
+    args = parser.parse_args()
+
+    if not RASTER_SUPPORT:
+        print("❌ 未找到SVG栅格化工具")
+        print("   安装命令: pip install cairosvg  或  brew install librsvg")
+        return 1
+
+    svg_files = []
+    for path in map(Path, args.paths):
+        svg_files.extend(sorted(path.rglob('*.svg')) if path.is_dir() else [path])
+
+    stats = rasterize_batch(svg_files, cache_dir_for(args.paper_dir), args.dpi, args.width_cm, args.jobs)
+    print_batch_stats(stats)
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
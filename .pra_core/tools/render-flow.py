@@ -0,0 +1,799 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流程图 / 数据流图本地渲染工具
+读取JSON流程描述（*.flow.json）或Graphviz DOT子集（*.dot），
+做Sugiyama分层布局（消环、分层、虚拟节点、重心法减少交叉），输出同名SVG。
+批量渲染，输入未变化的图直接跳过。
+
+JSON格式:
+    {
+      "direction": "TB",               // TB 自上而下（默认）| LR 自左向右
+      "nodes": [
+        {"id": "start", "label": "开始", "kind": "terminal"},
+        {"id": "check", "label": "用户名是否存在?", "kind": "decision"}
+      ],
+      "edges": [
+        {"from": "start", "to": "check"},
+        {"from": "check", "to": "fail", "label": "否"}
+      ]
+    }
+
+节点类型(kind):
+    process 处理（矩形，默认） | terminal 开始/结束（圆角端） | decision 判断（菱形）
+    io 输入输出（平行四边形）  | entity 外部实体（圆角矩形）  | ellipse 加工（椭圆）
+    store 数据存储（开口矩形）
+
+DOT支持: digraph/graph、节点与边语句、链式边 a -> b -> c、[属性]、
+graph/node/edge 默认属性、rankdir、label/xlabel、shape、style=rounded，子图展开处理
+
+使用方法:
+    python3 render-flow.py <目录或文件...> [--force] [--jobs N] [--png] [--events 目标] [--quiet]
+
+示例:
+    python3 tools/render-flow.py paper/assets/diagrams
+    python3 tools/render-flow.py paper/assets/diagrams/dfd/dfd-top-level.dot --force
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from pra_events import add_event_arguments, configure_events, events
+from raster_cache import RASTER_SUPPORT, cache_dir_for, print_batch_stats, rasterize_batch
+from svg_optimize import optimize_svg
+from text_metrics import measure_text
+
+# 渲染器版本：布局或绘制方式变化时递增，使清单中的旧记录全部失效
+RENDERER_VERSION = 1
+
+MANIFEST_NAME = '.flow-manifest.json'
+SPEC_SUFFIXES = ('.flow.json', '.dot')
+
+FONT_SIZE = 14
+LABEL_FONT_SIZE = 12
+LABEL_HEIGHT = 20
+LINE_HEIGHT = 20
+PAD_X = 16
+PAD_Y = 10
+MIN_WIDTH = 80
+MIN_HEIGHT = 40
+NODE_SEP = 40           # 同层节点间距
+RANK_SEP = 60           # 相邻层间距
+DUMMY_SIZE = 12         # 跨层边虚拟节点占位宽度
+PARALLEL_GAP = 14       # 同一对节点之间多条边的错开距离
+MARGIN = 20
+ORDER_SWEEPS = 12       # 重心法排序迭代次数
+COORD_PASSES = 8        # 坐标对齐迭代次数
+
+FONT_FAMILY = 'Microsoft YaHei, SimHei, Arial'
+
+KINDS = ('process', 'terminal', 'decision', 'io', 'entity', 'ellipse', 'store')
+KIND_ALIASES = {'start': 'terminal', 'end': 'terminal', 'stop': 'terminal'}
+
+# DOT shape → 节点类型
+DOT_SHAPES = {
+    'box': 'process', 'rect': 'process', 'rectangle': 'process', 'square': 'process',
+    'ellipse': 'ellipse', 'oval': 'ellipse', 'circle': 'ellipse',
+    'diamond': 'decision', 'parallelogram': 'io',
+    'cylinder': 'store', 'record': 'store', 'note': 'store',
+}
+
+
+# ---------------------------------------------------------------------------
+# 输入解析
+# ---------------------------------------------------------------------------
+
+DOT_TOKEN_RE = re.compile(r'''
+    (?P<ws>\s+|//[^\n]*|/\*.*?\*/|\#[^\n]*)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<arrow>->|--)
+  | (?P<punct>[\[\]{};,=])
+  | (?P<id>[^\s\[\]{};,="]+?(?=->|--|[\s\[\]{};,="]|$))
+''', re.VERBOSE | re.DOTALL)
+
+
+def tokenize_dot(text):
+    """DOT词法分析，返回 [(类型, 值)]，字符串去掉引号并处理转义"""
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = DOT_TOKEN_RE.match(text, pos)
+        if not match:
+            raise ValueError(f'DOT语法错误（位置{pos}）: {text[pos:pos + 20]!r}')
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == 'ws':
+            continue
+        value = match.group()
+        if kind == 'string':
+            value = re.sub(r'\\(.)', lambda m: '\n' if m.group(1) in 'nlr' else m.group(1), value[1:-1])
+            kind = 'id'
+        tokens.append((kind, value))
+    return tokens
+
+
+def parse_dot(text):
+    """解析DOT子集，返回与JSON规格相同的结构"""
+    tokens = tokenize_dot(text)
+    pos = 0
+    graph_attrs = {}
+    node_defaults = {}
+    edge_defaults = {}
+    nodes = {}
+    edges = []
+
+    def peek(offset=0):
+        return tokens[pos + offset] if pos + offset < len(tokens) else (None, None)
+
+    def take():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1]
+
+    def attr_list():
+        attrs = {}
+        while peek()[1] == '[':
+            take()
+            while peek()[1] != ']':
+                key = take()[1]
+                value = 'true'
+                if peek()[1] == '=':
+                    take()
+                    value = take()[1]
+                attrs[key] = value
+                if peek()[1] in (',', ';'):
+                    take()
+            take()
+        return attrs
+
+    def add_node(node_id, attrs=None):
+        node = nodes.setdefault(node_id, dict(node_defaults))
+        node.update(attrs or {})
+
+    # 头部: [strict] (di)graph [名称] {
+    while peek()[0] and peek()[1] != '{':
+        take()
+    take()
+
+    while pos < len(tokens):
+        kind, value = peek()
+        if value in ('}', ';', '{'):
+            take()
+        elif value == 'subgraph':
+            take()
+            if peek()[1] != '{':
+                take()
+        elif value in ('graph', 'node', 'edge') and peek(1)[1] == '[':
+            take()
+            target = {'graph': graph_attrs, 'node': node_defaults, 'edge': edge_defaults}[value]
+            target.update(attr_list())
+        elif kind == 'id' and peek(1)[1] == '=':
+            take()
+            take()
+            graph_attrs[value] = take()[1]
+        elif kind == 'id':
+            chain = [take()[1]]
+            while peek()[0] == 'arrow':
+                take()
+                chain.append(take()[1])
+            attrs = attr_list()
+            if len(chain) == 1:
+                add_node(chain[0], attrs)
+            else:
+                for node_id in chain:
+                    add_node(node_id)
+                for source, target in zip(chain, chain[1:]):
+                    edges.append({'from': source, 'to': target, **edge_defaults, **attrs})
+        else:
+            raise ValueError(f'DOT语法错误: 意外的 {value!r}')
+
+    spec_nodes = []
+    for node_id, attrs in nodes.items():
+        node_kind = DOT_SHAPES.get(attrs.get('shape', 'ellipse'), 'process')
+        if node_kind == 'process' and 'rounded' in attrs.get('style', ''):
+            node_kind = 'entity'
+        spec_nodes.append({'id': node_id, 'label': attrs.get('label', node_id), 'kind': node_kind})
+
+    spec_edges = [
+        {'from': e['from'], 'to': e['to'], 'label': e.get('label') or e.get('xlabel') or ''}
+        for e in edges
+    ]
+    direction = 'LR' if graph_attrs.get('rankdir', 'TB').upper() in ('LR', 'RL') else 'TB'
+    return {'direction': direction, 'nodes': spec_nodes, 'edges': spec_edges}
+
+
+def load_spec(spec_file):
+    """读取JSON或DOT规格，补全默认值并校验节点引用"""
+    text = Path(spec_file).read_text(encoding='utf-8')
+    spec = parse_dot(text) if str(spec_file).endswith('.dot') else json.loads(text)
+
+    nodes = {}
+    for node in spec.get('nodes', []):
+        node_kind = KIND_ALIASES.get(node.get('kind', 'process'), node.get('kind', 'process'))
+        if node_kind not in KINDS:
+            raise ValueError(f'未知节点类型: {node_kind}（节点 {node["id"]}）')
+        nodes[str(node['id'])] = {'label': str(node.get('label', node['id'])), 'kind': node_kind}
+
+    edges = []
+    for edge in spec.get('edges', []):
+        source, target = str(edge['from']), str(edge['to'])
+        for node_id in (source, target):
+            if node_id not in nodes:
+                raise ValueError(f'边引用了不存在的节点: {node_id}')
+        edges.append((source, target, str(edge.get('label', ''))))
+
+    direction = str(spec.get('direction', 'TB')).upper()
+    return {'direction': 'LR' if direction == 'LR' else 'TB', 'nodes': nodes, 'edges': edges}
+
+
+# ---------------------------------------------------------------------------
+# 分层布局
+# ---------------------------------------------------------------------------
+
+def node_size(label, kind):
+    """按文字估算节点宽高"""
+    lines = label.split('\n')
+    text_w = max(measure_text(line, FONT_SIZE) for line in lines)
+    text_h = len(lines) * LINE_HEIGHT
+    if kind == 'decision':
+        # 文字框四角落在菱形边上： tw/w + th/h <= 1
+        return max(MIN_WIDTH, 2 * text_w + PAD_X), max(MIN_HEIGHT, 2 * text_h + PAD_Y)
+    if kind == 'ellipse':
+        return max(MIN_WIDTH, math.sqrt(2) * text_w + PAD_X), max(MIN_HEIGHT, math.sqrt(2) * text_h + PAD_Y)
+    if kind == 'io':
+        return max(MIN_WIDTH, text_w + 2 * PAD_X + 24), max(MIN_HEIGHT, text_h + 2 * PAD_Y)
+    return max(MIN_WIDTH, text_w + 2 * PAD_X), max(MIN_HEIGHT, text_h + 2 * PAD_Y)
+
+
+def label_width(label):
+    """边标签白底宽度"""
+    return measure_text(label, LABEL_FONT_SIZE) + 8
+
+
+def remove_cycles(node_ids, edges):
+    """深度优先找回边并反向，返回 (有向无环边列表, 被反向的边下标集合)"""
+    adjacency = defaultdict(list)
+    for index, (source, target, _) in enumerate(edges):
+        adjacency[source].append((target, index))
+
+    state = {}
+    reversed_edges = set()
+
+    for root in node_ids:
+        if root in state:
+            continue
+        state[root] = 'active'
+        stack = [(root, iter(adjacency[root]))]
+        while stack:
+            node, children = stack[-1]
+            for target, index in children:
+                if state.get(target) == 'active':
+                    reversed_edges.add(index)
+                elif target not in state:
+                    state[target] = 'active'
+                    stack.append((target, iter(adjacency[target])))
+                    break
+            else:
+                state[node] = 'done'
+                stack.pop()
+
+    dag = []
+    for index, (source, target, _) in enumerate(edges):
+        if source == target:
+            continue
+        dag.append((target, source) if index in reversed_edges else (source, target))
+    return dag, reversed_edges
+
+
+def assign_layers(node_ids, dag):
+    """最长路径分层：每个节点位于其所有前驱之下"""
+    predecessors = defaultdict(list)
+    for source, target in dag:
+        predecessors[target].append(source)
+
+    layers = {}
+
+    def visit(node):
+        if node not in layers:
+            layers[node] = 0  # 占位，DAG中不会形成递归回路
+            layers[node] = max((visit(p) + 1 for p in predecessors[node]), default=0)
+        return layers[node]
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * len(node_ids) + 100))
+    for node in node_ids:
+        visit(node)
+    return layers
+
+
+def count_layer_crossings(upper_row, lower_row, links):
+    """相邻两层之间的交叉数：按上层位置排序后统计下层位置的逆序对"""
+    upper = {node: i for i, node in enumerate(upper_row)}
+    lower = {node: i for i, node in enumerate(lower_row)}
+    pairs = sorted((upper[a], lower[b]) for a, b in links)
+    return sum(
+        1
+        for i in range(len(pairs))
+        for j in range(i + 1, len(pairs))
+        if pairs[i][0] < pairs[j][0] and pairs[i][1] > pairs[j][1]
+    )
+
+
+def total_crossings(order, links_between):
+    return sum(
+        count_layer_crossings(order[k], order[k + 1], links_between[k])
+        for k in range(len(order) - 1)
+    )
+
+
+class LayeredLayout:
+    """Sugiyama分层布局"""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.direction = spec['direction']
+        node_ids = list(spec['nodes'])
+
+        # 尺寸：breadth 为层内方向，depth 为层间方向
+        self.sizes = {}
+        for node_id, node in spec['nodes'].items():
+            w, h = node_size(node['label'], node['kind'])
+            self.sizes[node_id] = (w, h) if self.direction == 'TB' else (h, w)
+
+        dag, self.reversed_edges = remove_cycles(node_ids, spec['edges'])
+        layers = assign_layers(node_ids, dag)
+
+        # 跨层边拆分为经过虚拟节点的单层边
+        self.chains = {}
+        self.links = []
+        dummy_count = 0
+        for source, target in dag:
+            chain = [source]
+            for layer in range(layers[source] + 1, layers[target]):
+                dummy = f'\0dummy{dummy_count}'
+                dummy_count += 1
+                layers[dummy] = layer
+                self.sizes[dummy] = (DUMMY_SIZE, 0)
+                chain.append(dummy)
+            chain.append(target)
+            self.chains.setdefault((source, target), []).append(chain)
+            self.links.extend(zip(chain, chain[1:]))
+
+        self.layers = layers
+        self.order = [[] for _ in range(max(layers.values(), default=0) + 1)]
+        for node in layers:
+            self.order[layers[node]].append(node)
+
+        # 边标签放在第一段中点，所在层间距至少容纳标签
+        self.rank_gaps = {}
+        for source, target, label in spec['edges']:
+            if not label or source == target:
+                continue
+            k = layers[source] if layers[target] > layers[source] else layers[source] - 1
+            extent = LABEL_HEIGHT if self.direction == 'TB' else label_width(label)
+            self.rank_gaps[k] = max(self.rank_gaps.get(k, RANK_SEP), extent + 2 * PAD_X)
+
+        self.up = defaultdict(list)
+        self.down = defaultdict(list)
+        for a, b in self.links:
+            self.down[a].append(b)
+            self.up[b].append(a)
+
+    def minimize_crossings(self):
+        """重心法上下交替扫描，保留交叉最少的排列"""
+        links_between = defaultdict(list)
+        for a, b in self.links:
+            links_between[self.layers[a]].append((a, b))
+
+        best_order = [list(row) for row in self.order]
+        best = total_crossings(self.order, links_between)
+        for sweep in range(ORDER_SWEEPS):
+            if best == 0:
+                break
+            downward = sweep % 2 == 0
+            layer_range = range(1, len(self.order)) if downward else range(len(self.order) - 2, -1, -1)
+            for k in layer_range:
+                reference = self.order[k - 1] if downward else self.order[k + 1]
+                index = {node: i for i, node in enumerate(reference)}
+                neighbors = self.up if downward else self.down
+                current = {node: i for i, node in enumerate(self.order[k])}
+
+                def barycenter(node):
+                    positions = [index[n] for n in neighbors[node] if n in index]
+                    return sum(positions) / len(positions) if positions else current[node]
+
+                self.order[k].sort(key=barycenter)
+            crossings = total_crossings(self.order, links_between)
+            if crossings < best:
+                best, best_order = crossings, [list(row) for row in self.order]
+        self.order = best_order
+        return best
+
+    def assign_coordinates(self):
+        """层内坐标：向相邻节点的平均位置靠拢，同时保持顺序与最小间距"""
+        breadth = {}
+        for row in self.order:
+            x = 0
+            for node in row:
+                breadth[node] = x + self.sizes[node][0] / 2
+                x += self.sizes[node][0] + NODE_SEP
+            shift = x / 2
+            for node in row:
+                breadth[node] -= shift
+
+        for iteration in range(COORD_PASSES):
+            rows = self.order if iteration % 2 == 0 else reversed(self.order)
+            for row in rows:
+                desired = []
+                for node in row:
+                    neighbors = self.up[node] + self.down[node]
+                    desired.append(sum(breadth[n] for n in neighbors) / len(neighbors) if neighbors else breadth[node])
+                placed = list(desired)
+                for i in range(1, len(row)):
+                    min_gap = (self.sizes[row[i - 1]][0] + self.sizes[row[i]][0]) / 2 + NODE_SEP
+                    placed[i] = max(placed[i], placed[i - 1] + min_gap)
+                # 整体平移，使偏离期望位置的总量最小
+                shift = sum(d - p for d, p in zip(desired, placed)) / len(row)
+                for node, value in zip(row, placed):
+                    breadth[node] = value + shift
+
+        depth = {}
+        offset = 0
+        for k, row in enumerate(self.order):
+            layer_depth = max(self.sizes[n][1] for n in row)
+            for node in row:
+                depth[node] = offset + layer_depth / 2
+            offset += layer_depth + self.rank_gaps.get(k, RANK_SEP)
+
+        if self.direction == 'TB':
+            return {n: (breadth[n], depth[n]) for n in self.layers}
+        return {n: (depth[n], breadth[n]) for n in self.layers}
+
+    def route_edges(self, positions):
+        """每条原始边的折线（经过虚拟节点），同一对节点间的多条边错开"""
+        used = defaultdict(int)
+        slots = defaultdict(int)
+        parallel = defaultdict(int)
+        for source, target, _ in self.spec['edges']:
+            parallel[frozenset((source, target))] += 1
+
+        routes = []
+        for index, (source, target, label) in enumerate(self.spec['edges']):
+            if source == target:
+                continue
+            key = (target, source) if index in self.reversed_edges else (source, target)
+            chain = self.chains[key][used[key] % len(self.chains[key])]
+            used[key] += 1
+            points = [positions[n] for n in chain]
+            if index in self.reversed_edges:
+                points.reverse()
+
+            pair = frozenset((source, target))
+            count = parallel[pair]
+            delta = 0
+            if count > 1:
+                delta = (slots[pair] - (count - 1) / 2) * PARALLEL_GAP
+                slots[pair] += 1
+                if self.direction == 'TB':
+                    points = [(x + delta, y) for x, y in points]
+                else:
+                    points = [(x, y + delta) for x, y in points]
+            routes.append((source, target, label, points, delta))
+        return routes
+
+
+# ---------------------------------------------------------------------------
+# SVG绘制
+# ---------------------------------------------------------------------------
+
+def inside_shape(center, size, kind, point):
+    """点是否落在节点图形内"""
+    dx = abs(point[0] - center[0]) / (size[0] / 2)
+    dy = abs(point[1] - center[1]) / (size[1] / 2)
+    if kind == 'decision':
+        return dx + dy <= 1
+    if kind == 'ellipse':
+        return dx * dx + dy * dy <= 1
+    return dx <= 1 and dy <= 1
+
+
+def clip_to_shape(center, size, kind, start, toward):
+    """
+    从 start（节点内部，错开的平行边不在中心）指向 toward 的射线与节点轮廓的交点
+
+    轮廓由分段二分求得，对各种图形通用
+    """
+    if not inside_shape(center, size, kind, start):
+        return start
+    low, high = 0.0, 1.0
+    if inside_shape(center, size, kind, toward):
+        return toward
+    for _ in range(24):
+        mid = (low + high) / 2
+        point = (start[0] + (toward[0] - start[0]) * mid, start[1] + (toward[1] - start[1]) * mid)
+        if inside_shape(center, size, kind, point):
+            low = mid
+        else:
+            high = mid
+    return start[0] + (toward[0] - start[0]) * high, start[1] + (toward[1] - start[1]) * high
+
+
+def num(value):
+    """坐标输出保留两位小数"""
+    return round(value, 2)
+
+
+def shape_svg(kind, cx, cy, w, h):
+    """节点图形"""
+    x, y = cx - w / 2, cy - h / 2
+    style = 'fill="#fff" stroke="#333" stroke-width="2"'
+    if kind == 'decision':
+        points = f'{num(cx)},{num(y)} {num(x + w)},{num(cy)} {num(cx)},{num(y + h)} {num(x)},{num(cy)}'
+        return f'<polygon points="{points}" {style}/>'
+    if kind == 'io':
+        skew = 12
+        points = f'{num(x + skew)},{num(y)} {num(x + w)},{num(y)} {num(x + w - skew)},{num(y + h)} {num(x)},{num(y + h)}'
+        return f'<polygon points="{points}" {style}/>'
+    if kind == 'ellipse':
+        return f'<ellipse cx="{num(cx)}" cy="{num(cy)}" rx="{num(w / 2)}" ry="{num(h / 2)}" {style}/>'
+    if kind == 'store':
+        d = f'M{num(x + w)},{num(y)} H{num(x)} V{num(y + h)} H{num(x + w)}'
+        return f'<path d="{d}" fill="none" stroke="#333" stroke-width="2"/>'
+    radius = {'terminal': h / 2, 'entity': 8}.get(kind, 0)
+    rounded = f' rx="{num(radius)}"' if radius else ''
+    return f'<rect x="{num(x)}" y="{num(y)}" width="{num(w)}" height="{num(h)}"{rounded} {style}/>'
+
+
+def text_svg(label, cx, cy):
+    """多行居中文字"""
+    lines = label.split('\n')
+    first_y = cy - (len(lines) - 1) * LINE_HEIGHT / 2 + FONT_SIZE * 0.35
+    spans = ''.join(
+        f'<tspan x="{num(cx)}" y="{num(first_y + i * LINE_HEIGHT)}">{escape(line)}</tspan>'
+        for i, line in enumerate(lines)
+    )
+    return (f'<text text-anchor="middle" font-family="{FONT_FAMILY}" '
+            f'font-size="{FONT_SIZE}" fill="#333">{spans}</text>')
+
+
+def render_spec(spec):
+    """布局并生成SVG文本，返回 (SVG, 交叉数)"""
+    layout = LayeredLayout(spec)
+    crossings = layout.minimize_crossings()
+    positions = layout.assign_coordinates()
+    real_sizes = {n: node_size(node['label'], node['kind']) for n, node in spec['nodes'].items()}
+
+    # 连线端点裁剪到节点轮廓（错开的平行边从偏移后的位置出发），标签放在第一段中点
+    edges = []
+    labels = []
+    for source, target, label, points, delta in layout.route_edges(positions):
+        points[0] = clip_to_shape(positions[source], real_sizes[source], spec['nodes'][source]['kind'], points[0], points[1])
+        points[-1] = clip_to_shape(positions[target], real_sizes[target], spec['nodes'][target]['kind'], points[-1], points[-2])
+        edges.append(points)
+        if label:
+            lx = (points[0][0] + points[1][0]) / 2
+            ly = (points[0][1] + points[1][1]) / 2
+            lw = label_width(label)
+            # 错开的平行边把标签推到各自外侧，避免互相遮挡
+            if delta and spec['direction'] == 'TB':
+                lx += math.copysign(lw / 2 + 3, delta)
+            elif delta:
+                ly += math.copysign(LABEL_HEIGHT / 2 + 3, delta)
+            labels.append((label, lx, ly, lw))
+
+    # 画布收缩到实际内容范围
+    xs, ys = [], []
+    for node_id, (w, h) in real_sizes.items():
+        cx, cy = positions[node_id]
+        xs += [cx - w / 2, cx + w / 2]
+        ys += [cy - h / 2, cy + h / 2]
+    for points in edges:
+        xs += [p[0] for p in points]
+        ys += [p[1] for p in points]
+    for _, lx, ly, lw in labels:
+        xs += [lx - lw / 2, lx + lw / 2]
+        ys += [ly - LABEL_HEIGHT / 2, ly + LABEL_HEIGHT / 2]
+    min_x, min_y = min(xs), min(ys)
+    width = math.ceil(max(xs) - min_x + 2 * MARGIN)
+    height = math.ceil(max(ys) - min_y + 2 * MARGIN)
+    ox, oy = MARGIN - min_x, MARGIN - min_y
+
+    svg_lines = []
+    svg_lines.append('<?xml version="1.0" encoding="UTF-8"?>')
+    svg_lines.append(f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}" xmlns="http://www.w3.org/2000/svg">')
+    svg_lines.append('  <defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="8" markerHeight="8" orient="auto-start-reverse"><path d="M0,0 L10,5 L0,10 z" fill="#333"/></marker></defs>')
+
+    for points in edges:
+        path = ' '.join(f'{num(x + ox)},{num(y + oy)}' for x, y in points)
+        svg_lines.append(f'  <polyline points="{path}" fill="none" stroke="#333" stroke-width="1.5" marker-end="url(#arrow)"/>')
+
+    for node_id, node in spec['nodes'].items():
+        cx, cy = positions[node_id][0] + ox, positions[node_id][1] + oy
+        w, h = real_sizes[node_id]
+        svg_lines.append('  ' + shape_svg(node['kind'], cx, cy, w, h))
+        svg_lines.append('  ' + text_svg(node['label'], cx, cy))
+
+    # 标签最后绘制，白底压在连线上
+    for label, lx, ly, lw in labels:
+        lx, ly = lx + ox, ly + oy
+        svg_lines.append(f'  <rect x="{num(lx - lw / 2)}" y="{num(ly - LABEL_HEIGHT / 2)}" width="{num(lw)}" height="{LABEL_HEIGHT}" fill="#fff"/>')
+        svg_lines.append(f'  <text x="{num(lx)}" y="{num(ly + 4)}" text-anchor="middle" font-family="{FONT_FAMILY}" font-size="{LABEL_FONT_SIZE}" fill="#333">{escape(label)}</text>')
+
+    svg_lines.append('</svg>')
+    return optimize_svg('\n'.join(svg_lines)), crossings
+
+
+# ---------------------------------------------------------------------------
+# 批量渲染
+# ---------------------------------------------------------------------------
+
+def output_path(spec_file):
+    """规格文件对应的SVG：flow-auth.flow.json → flow-auth.svg，dfd-top-level.dot → dfd-top-level.svg"""
+    spec_file = Path(spec_file)
+    stem = spec_file.name[:-len('.flow.json')] if spec_file.name.endswith('.flow.json') else spec_file.stem
+    return spec_file.with_name(f'{stem}.svg')
+
+
+def render_file(spec_file):
+    """渲染单个规格文件，返回 (输出文件, 交叉数)"""
+    svg, crossings = render_spec(load_spec(spec_file))
+    output_file = output_path(spec_file)
+    temp_file = output_file.with_name(output_file.name + '.tmp')
+    temp_file.write_text(svg, encoding='utf-8')
+    os.replace(temp_file, output_file)
+    return str(output_file), crossings
+
+
+def _render_job(spec_file):
+    """进程池任务，返回 (输出文件, 交叉数, 错误信息)"""
+    try:
+        output_file, crossings = render_file(spec_file)
+        return output_file, crossings, None
+    except Exception as e:
+        return None, 0, str(e)
+
+
+def file_sha256(path):
+    """计算文件内容哈希"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def input_hash(spec_file):
+    """输入哈希 = 规格内容 + 渲染器版本"""
+    digest = hashlib.sha256(Path(spec_file).read_bytes())
+    digest.update(str(RENDERER_VERSION).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_manifest(directory):
+    """读取目录清单 {规格文件名: {input, output, outputHash}}"""
+    manifest_file = Path(directory) / MANIFEST_NAME
+    if manifest_file.exists():
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get('specs', {})
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def save_manifest(directory, entries):
+    """原子写入目录清单"""
+    manifest_file = Path(directory) / MANIFEST_NAME
+    temp_file = manifest_file.with_suffix('.tmp')
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'renderer': RENDERER_VERSION, 'specs': entries}, f, ensure_ascii=False, indent=2)
+    os.replace(temp_file, manifest_file)
+
+
+def is_up_to_date(entry, digest, directory):
+    """清单记录与当前输入一致，且输出文件未被改动"""
+    if not entry or entry.get('input') != digest:
+        return False
+    output_file = Path(directory) / entry.get('output', '')
+    return output_file.is_file() and file_sha256(output_file) == entry.get('outputHash')
+
+
+def collect_specs(paths):
+    """展开命令行参数中的目录，返回全部规格文件"""
+    specs = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            specs.extend(sorted(p for p in path.rglob('*') if p.name.endswith(SPEC_SUFFIXES)))
+        elif path.name.endswith(SPEC_SUFFIXES):
+            specs.append(path)
+    return specs
+
+
+def find_paper_dir(path):
+    """向上查找 paper 目录（栅格缓存位置）"""
+    for parent in [Path(path).resolve()] + list(Path(path).resolve().parents):
+        if parent.name == 'paper':
+            return parent
+    return None
+
+
+def main():
+    """批量渲染流程图 / 数据流图"""
+    parser = argparse.ArgumentParser(description='流程图/数据流图本地渲染（分层布局 + 增量 + 并行）')
+    parser.add_argument('paths', nargs='+', help='规格文件（*.flow.json / *.dot）或目录')
+    parser.add_argument('--force', action='store_true', help='忽略清单，全部重新渲染')
+    parser.add_argument('--jobs', type=int, default=None, help='并行进程数（默认CPU核数）')
+    parser.add_argument('--png', action='store_true', help='同时按导出参数栅格化为PNG，写入 paper/.cache/rasters')
+    add_event_arguments(parser)
+    args = parser.parse_args()
+    configure_events('render-flow', args.events, args.quiet)
+
+    specs = collect_specs(args.paths)
+    if not specs:
+        print("❌ 未找到规格文件（*.flow.json / *.dot）")
+        return 1
+
+    by_directory = defaultdict(list)
+    for spec_file in specs:
+        by_directory[spec_file.parent].append(spec_file)
+
+    entries = {}
+    pending = []
+    skipped = 0
+    for directory, files in by_directory.items():
+        old_entries = {} if args.force else load_manifest(directory)
+        entries[directory] = dict(old_entries)
+        for spec_file in files:
+            digest = input_hash(spec_file)
+            if is_up_to_date(old_entries.get(spec_file.name), digest, directory):
+                skipped += 1
+            else:
+                pending.append((spec_file, digest))
+
+    print(f"📊 规格文件: {len(specs)} 个，需渲染 {len(pending)} 个，跳过未变化 {skipped} 个")
+
+    failed = 0
+    with events.stage('render', pending=len(pending), skipped=skipped):
+        if pending:
+            with ProcessPoolExecutor(max_workers=args.jobs or os.cpu_count()) as executor:
+                results = executor.map(_render_job, [str(spec_file) for spec_file, _ in pending])
+                for (spec_file, digest), (output_file, crossings, error) in zip(pending, results):
+                    if error:
+                        events.warning(f"{spec_file.name}: {error}", f"  ❌ {spec_file.name}: {error}")
+                        failed += 1
+                        continue
+                    output_name = os.path.basename(output_file)
+                    entries[spec_file.parent][spec_file.name] = {
+                        'input': digest,
+                        'output': output_name,
+                        'outputHash': file_sha256(output_file),
+                    }
+                    events.item('flow', output_name, f"  ✅ {spec_file.name} → {output_name}（{crossings}处交叉）",
+                                source=spec_file.name, crossings=crossings, bytes=os.path.getsize(output_file))
+
+    for directory, directory_entries in entries.items():
+        save_manifest(directory, directory_entries)
+
+    if args.png:
+        if not RASTER_SUPPORT:
+            print("⚠️  未找到SVG栅格化工具（cairosvg 或 rsvg-convert），跳过PNG")
+        else:
+            by_paper = defaultdict(list)
+            for spec_file in specs:
+                paper_dir = find_paper_dir(spec_file)
+                if paper_dir and output_path(spec_file).exists():
+                    by_paper[paper_dir].append(output_path(spec_file))
+            for paper_dir, svg_files in by_paper.items():
+                print_batch_stats(rasterize_batch(svg_files, cache_dir_for(paper_dir), jobs=args.jobs))
+
+    print(f"\n✅ 完成: 渲染 {len(pending) - failed} 个，跳过 {skipped} 个，失败 {failed} 个")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PlantUML批量渲染工具
+通过常驻的本地PlantUML进程（-pipe 管道模式）批量渲染 paper/assets/plantuml/*.puml，
+每个进程只付出一次JVM启动开销；源码（含 !include 的文件）哈希已有缓存图片的直接复用。
+
+输出位置（与章节中的路径变量对应）:
+    dfd-*.puml   → paper/assets/diagrams/dfd/   (${dfd})
+    flow-*.puml  → paper/assets/diagrams/flow/  (${flow})
+    其他         → paper/assets/diagrams/uml/   (${uml})
+
+渲染器:
+    - 默认: java -jar $PLANTUML_JAR（或 --jar 指定），未设置时使用PATH中的 plantuml 命令
+    - --renderer CMD: 替换为任意遵循相同管道协议的命令（测试用替身）
+
+使用方法:
+    python3 render-plantuml.py [plantuml目录] [--format png|svg] [--jobs N] [--force]
+                               [--events 目标] [--quiet]
+
+示例:
+    python3 tools/render-plantuml.py paper/assets/plantuml
+    PLANTUML_JAR=~/lib/plantuml.jar python3 tools/render-plantuml.py paper/assets/plantuml --jobs 4
+"""
+
+import argparse
+import filecmp
+import hashlib
+import os
+import queue
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import uuid
+from pathlib import Path
+
+from asset_store import shared_cache_dir
+from pra_events import add_event_arguments, configure_events, events
+
+CACHE_SUBDIR = Path('.cache') / 'plantuml'
+
+# 文件名前缀 → 输出子目录
+OUTPUT_DIRS = (('dfd-', 'dfd'), ('flow-', 'flow'))
+DEFAULT_OUTPUT_DIR = 'uml'
+
+
+def output_dir_for(puml_file, diagrams_dir):
+    """按文件名前缀决定输出目录"""
+    for prefix, subdir in OUTPUT_DIRS:
+        if puml_file.name.startswith(prefix):
+            return diagrams_dir / subdir
+    return diagrams_dir / DEFAULT_OUTPUT_DIR
+
+
+# !include / !include_many / !include_once / !includesub 引用的本地文件
+INCLUDE_PATTERN = re.compile(rb'^[ \t]*!(?:include|include_many|include_once|includesub)[ \t]+(.+?)[ \t]*$', re.MULTILINE)
+
+# stderr在分隔行之后这么久没有新输出，才认为本张图的错误信息已经读完（秒）
+STDERR_SETTLE = 0.05
+
+
+def included_files(puml_file, source_bytes, seen=None):
+    """源码（递归）引用的本地文件；标准库 <...> 和URL不计入"""
+    seen = set() if seen is None else seen
+    included = []
+    for match in INCLUDE_PATTERN.finditer(source_bytes):
+        target = match.group(1).decode('utf-8', 'replace').strip().strip('"')
+        if target.startswith('<') or '://' in target:
+            continue
+        # !includesub file.puml!SUB、!include file.puml!2 只取文件部分
+        path = (puml_file.parent / target.split('!', 1)[0]).resolve()
+        if path in seen:
+            continue
+        seen.add(path)
+        included.append(path)
+        if path.is_file():
+            included.extend(included_files(path, path.read_bytes(), seen))
+    return included
+
+
+def source_key(puml_file, source_bytes, image_format):
+    """缓存键 = 源码及其 !include 文件内容的哈希 + 输出格式"""
+    digest = hashlib.sha256(source_bytes)
+    for path in included_files(puml_file, source_bytes):
+        digest.update(b'\0' + str(path).encode('utf-8') + b'\0')
+        digest.update(path.read_bytes() if path.is_file() else b'<missing>')
+    return f'{digest.hexdigest()}.{image_format}'
+
+
+def default_renderer(jar=None):
+    """默认渲染命令：优先 java -jar，其次PATH中的 plantuml"""
+    jar = jar or os.environ.get('PLANTUML_JAR')
+    if jar:
+        return ['java', '-Djava.awt.headless=true', '-jar', str(Path(jar).expanduser())]
+    if shutil.which('plantuml'):
+        return ['plantuml']
+    return None
+
+
+class PlantUMLProcess:
+    """常驻PlantUML管道进程
+
+    源码逐个写入stdin，进程每读到一个 @enduml 就输出一张图片并紧跟分隔行，
+    据此从stdout切分出每张图片。stderr与stdout是两条管道，错误信息可能晚于分隔行到达，
+    因此读到分隔行后要等stderr静默 STDERR_SETTLE 秒，再把这段时间内的错误归到本张图。
+    """
+
+    def __init__(self, command, image_format, timeout=60):
+        self.command = command
+        self.image_format = image_format
+        self.timeout = timeout
+        self.delimiter = f'__PRA_PLANTUML_{uuid.uuid4().hex}__'.encode('ascii')
+        self.process = None
+        self.buffer = b''
+        self.errors = []
+        self.error_arrived = threading.Condition()
+        self.timed_out = False
+
+    def start(self):
+        self.process = subprocess.Popen(
+            self.command + ['-pipe', f'-t{self.image_format}', '-charset', 'UTF-8',
+                            '-pipedelimitor', self.delimiter.decode('ascii')],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        self.buffer = b''
+        self.errors = []
+        self.timed_out = False
+        # 持续读取stderr，避免管道写满阻塞渲染进程，同时收集语法错误信息
+        threading.Thread(target=self._drain_stderr, args=(self.process,), daemon=True).start()
+
+    def _drain_stderr(self, process):
+        for line in process.stderr:
+            with self.error_arrived:
+                self.errors.append(line.decode('utf-8', 'replace').rstrip())
+                self.error_arrived.notify_all()
+
+    def _wait_stderr_quiet(self):
+        """等到stderr在 STDERR_SETTLE 秒内没有新输出"""
+        with self.error_arrived:
+            count = len(self.errors)
+            while True:
+                self.error_arrived.wait(STDERR_SETTLE)
+                if len(self.errors) == count:
+                    return
+                count = len(self.errors)
+
+    def _in_band_error(self, image):
+        """图片本身表明渲染失败（空输出，或PlantUML生成的语法错误图）"""
+        if not image.strip():
+            return '渲染器没有输出图片'
+        if self.image_format == 'svg' and b'Syntax Error?' in image:
+            return 'PlantUML语法错误'
+        return None
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        """关闭stdin让进程自然退出"""
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def restart(self):
+        """进程崩溃或超时后重启"""
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+        self.start()
+
+    def render(self, source):
+        """
+        渲染一段PlantUML源码
+
+        返回:
+            bytes: 图片内容
+
+        异常:
+            RuntimeError: 进程退出、超时或源码有语法错误
+        """
+        errors_before = len(self.errors)
+        text = source.decode('utf-8').strip()
+        self.process.stdin.write(text.encode('utf-8') + b'\n')
+        self.process.stdin.flush()
+
+        # 超时看门狗：到时直接结束进程，阻塞的读取随之返回
+        def expire():
+            self.timed_out = True
+            self.process.kill()
+
+        watchdog = threading.Timer(self.timeout, expire)
+        watchdog.start()
+        try:
+            marker = self.delimiter + b'\n'
+            while marker not in self.buffer:
+                chunk = os.read(self.process.stdout.fileno(), 65536)
+                if not chunk:
+                    raise RuntimeError(f'渲染超时（{self.timeout}秒）' if self.timed_out else 'PlantUML进程意外退出')
+                self.buffer += chunk
+        finally:
+            watchdog.cancel()
+
+        image, self.buffer = self.buffer.split(marker, 1)
+        self._wait_stderr_quiet()
+        with self.error_arrived:
+            new_errors = [line for line in self.errors[errors_before:] if line]
+        if new_errors:
+            raise RuntimeError('; '.join(new_errors))
+        error = self._in_band_error(image)
+        if error:
+            raise RuntimeError(error)
+        return image
+
+
+def worker(command, image_format, tasks, results, timeout):
+    """工作线程：独占一个常驻进程，依次取任务渲染，进程崩溃时重启重试一次"""
+    renderer = PlantUMLProcess(command, image_format, timeout)
+    try:
+        renderer.start()
+    except OSError as e:
+        results.put((None, None, f'无法启动渲染器: {e}'))
+        return
+    try:
+        while True:
+            try:
+                puml_file, source = tasks.get_nowait()
+            except queue.Empty:
+                break
+            for attempt in (1, 2):
+                try:
+                    results.put((puml_file, renderer.render(source), None))
+                    break
+                except RuntimeError as e:
+                    crashed = not renderer.alive()
+                    # 超时通常与源码有关，重启进程后不再重试同一张图
+                    retry = crashed and not renderer.timed_out
+                    if crashed:
+                        renderer.restart()
+                    if attempt == 2 or not retry:
+                        results.put((puml_file, None, str(e)))
+                        break
+    finally:
+        renderer.stop()
+
+
+def render_all(puml_files, diagrams_dir, cache_dir, command, image_format='png', jobs=None, force=False, timeout=60):
+    """
+    批量渲染
+
+    返回:
+        dict: {'rendered': [...], 'cached': [...], 'failed': [(文件, 错误)]}
+    """
+    stats = {'rendered': [], 'cached': [], 'failed': []}
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def publish(puml_file, cached_image):
+        output_dir = output_dir_for(puml_file, diagrams_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        output_file = output_dir / f'{puml_file.stem}.{image_format}'
+        # 内容相同则不改写，保持下游基于修改时间的增量判断有效
+        if not output_file.exists() or not filecmp.cmp(cached_image, output_file, shallow=False):
+            temp_file = output_file.with_name(f'{output_file.name}.{os.getpid()}.tmp')
+            shutil.copyfile(cached_image, temp_file)
+            os.replace(temp_file, output_file)
+        return output_file
+
+    tasks = queue.Queue()
+    keys = {}
+    for puml_file in puml_files:
+        source = puml_file.read_bytes()
+        keys[puml_file] = source_key(puml_file, source, image_format)
+        cached_image = cache_dir / keys[puml_file]
+        if not force and cached_image.exists():
+            publish(puml_file, cached_image)
+            stats['cached'].append(puml_file.name)
+        else:
+            tasks.put((puml_file, source))
+
+    pending = tasks.qsize()
+    if pending:
+        if command is None:
+            stats['failed'].extend((f.name, '未找到PlantUML渲染器') for f, _ in list(tasks.queue))
+            return stats
+
+        results = queue.Queue()
+        threads = [
+            threading.Thread(target=worker, args=(command, image_format, tasks, results, timeout))
+            for _ in range(min(pending, jobs or min(4, os.cpu_count() or 1)))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        while not results.empty():
+            puml_file, image, error = results.get()
+            if error:
+                stats['failed'].append((puml_file.name if puml_file else '-', error))
+                continue
+            cached_image = cache_dir / keys[puml_file]
+            temp_file = cached_image.with_name(f'{cached_image.name}.{os.getpid()}.tmp')
+            temp_file.write_bytes(image)
+            os.replace(temp_file, cached_image)
+            publish(puml_file, cached_image)
+            stats['rendered'].append(puml_file.name)
+
+        # 渲染器无法启动时队列中会有剩余任务
+        while not tasks.empty():
+            puml_file, _ = tasks.get()
+            stats['failed'].append((puml_file.name, '渲染器不可用'))
+
+    return stats
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='PlantUML批量渲染（常驻进程 + 源码哈希缓存 + 并行）')
+    parser.add_argument('plantuml_dir', nargs='?', default='paper/assets/plantuml', help='PlantUML源码目录')
+    parser.add_argument('--format', choices=['png', 'svg'], default='png', help='输出格式（默认png）')
+    parser.add_argument('--jobs', type=int, default=None, help='常驻渲染进程数（默认 min(4, CPU核数)）')
+    parser.add_argument('--force', action='store_true', help='忽略缓存，全部重新渲染')
+    parser.add_argument('--jar', default=None, help='plantuml.jar路径（默认读取环境变量PLANTUML_JAR）')
+    parser.add_argument('--renderer', default=None, help='自定义渲染命令（遵循 -pipe 协议，可用于测试替身）')
+    parser.add_argument('--timeout', type=int, default=60, help='单张图渲染超时（秒）')
+    add_event_arguments(parser)
+    args = parser.parse_args()
+    configure_events('render-plantuml', args.events, args.quiet)
+
+    plantuml_dir = Path(args.plantuml_dir)
+    puml_files = sorted(plantuml_dir.glob('*.puml'))
+    if not puml_files:
+        print(f"❌ 未找到PlantUML源码: {plantuml_dir}")
+        return 1
+
+    # paper/assets/plantuml → paper/assets/diagrams，缓存放在 paper/.cache/plantuml（设置 PRA_STORE 时共享）
+    diagrams_dir = plantuml_dir.parent / 'diagrams'
+    cache_dir = shared_cache_dir('plantuml', plantuml_dir.parent.parent / CACHE_SUBDIR)
+
+    command = shlex.split(args.renderer) if args.renderer else default_renderer(args.jar)
+
+    print(f"🔍 发现PlantUML源码: {len(puml_files)} 个")
+    with events.stage('render', sources=len(puml_files)):
+        stats = render_all(puml_files, diagrams_dir, cache_dir, command,
+                           args.format, args.jobs, args.force, args.timeout)
+
+        for name in stats['rendered']:
+            events.item('plantuml', name, f"  ✅ 渲染: {name}", cached=False)
+        for name in stats['cached']:
+            events.item('plantuml', name, cached=True)
+        for name, error in stats['failed']:
+            events.warning(f"{name}: {error}", f"  ❌ 失败: {name} - {error}")
+    print(f"\n📊 渲染 {len(stats['rendered'])} 个，缓存命中 {len(stats['cached'])} 个，失败 {len(stats['failed'])} 个")
+    if command is None and stats['failed']:
+        print("   请设置 PLANTUML_JAR 或安装 plantuml 命令（brew install plantuml）")
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+截图版面质检工具
+对 word-to-screenshots.py 生成的 page-NNN.png 做自动版面检查，标出可疑页面
+
+检查项:
+    - 空白页：正文区几乎没有内容
+    - 越界：内容伸入左右页边距（图片、表格过宽）
+    - 大段留白：页面底部或中间出现大片空白（如章节分页前的半页空白、图片被挤到下一页）
+
+依赖:
+    - numpy, Pillow: pip install numpy pillow
+
+使用方法:
+    python3 screenshots-qa.py <截图目录> [--dpi DPI] [--style 样式配置] [--jobs N] [--events 目标] [--quiet]
+
+示例:
+    python3 screenshots-qa.py paper/论文_screenshots
+    python3 screenshots-qa.py paper/论文_screenshots --dpi 150
+
+输出:
+    <截图目录>/layout-qa.json   机器可读报告
+    <截图目录>/layout-qa.html   可视化报告（缩略图 + 指标，可疑页高亮）
+"""
+
+import argparse
+import html
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from pra_events import add_event_arguments, configure_events, events
+
+try:
+    import numpy as np
+    from PIL import Image
+    QA_SUPPORT = True
+except ImportError:
+    QA_SUPPORT = False
+
+# 默认页边距（twips，与 docx-styles-yxnu.json 的 yxnu_thesis 预设一致）
+DEFAULT_MARGINS = {'top': 1800, 'bottom': 1440, 'left': 1800, 'right': 1440}
+
+# 灰度低于该值视为墨迹
+INK_THRESHOLD = 200
+
+# 判定阈值
+BLANK_COVERAGE = 0.0005     # 正文区墨迹占比低于此值视为空白页
+INTRUSION_TOLERANCE_MM = 2  # 伸入页边距超过该距离视为越界
+TRAILING_BLANK_RATIO = 0.5  # 页面底部空白超过正文区高度的一半
+GAP_BLANK_RATIO = 0.25      # 页面中间连续空白超过正文区高度的1/4
+
+IMAGE_SUFFIXES = ('.png', '.webp')
+FALLBACK_DPI = 300
+
+
+def load_margins(style_file):
+    """从样式配置读取页边距（twips），读取失败时使用默认值"""
+    if not style_file or not Path(style_file).exists():
+        return dict(DEFAULT_MARGINS)
+    with open(style_file, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    margins = config.get('presets', {}).get('yxnu_thesis', {}).get('page', {}).get('margin', {})
+    return {side: margins.get(side, DEFAULT_MARGINS[side]) for side in DEFAULT_MARGINS}
+
+
+def longest_false_run(mask):
+    """一维布尔数组中最长的连续False段长度（向量化）"""
+    if mask.size == 0:
+        return 0
+    padded = np.concatenate(([True], mask, [True]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    if edges.size == 0:
+        return 0
+    return int((edges[1::2] - edges[::2]).max())
+
+
+def analyze_page(image_path, dpi, margins):
+    """
+    计算单页版面指标
+
+    返回:
+        dict: 指标与问题列表
+    """
+    with Image.open(image_path) as img:
+        gray = np.asarray(img.convert('L'))
+        if dpi is None:
+            dpi = round(img.info.get('dpi', (FALLBACK_DPI,))[0]) or FALLBACK_DPI
+    ink = gray < INK_THRESHOLD
+    height, width = ink.shape
+
+    px = {side: int(round(twips / 1440 * dpi)) for side, twips in margins.items()}
+    top, bottom = px['top'], height - px['bottom']
+    left, right = px['left'], width - px['right']
+
+    body = ink[top:bottom, left:right]
+    body_rows = body.any(axis=1)
+    body_height = max(1, body.shape[0])
+    coverage = float(body.mean()) if body.size else 0.0
+
+    # 越界：正文行范围内左右页边距中的墨迹，距正文边界的最大深度
+    cols_with_ink = ink[top:bottom].any(axis=0)
+    left_ink = np.flatnonzero(cols_with_ink[:left])
+    right_ink = np.flatnonzero(cols_with_ink[right:])
+    left_depth = int(left - left_ink.min()) if left_ink.size else 0
+    right_depth = int(right_ink.max() + 1) if right_ink.size else 0
+    intrusion_mm = max(left_depth, right_depth) / dpi * 25.4
+
+    # 留白：底部空白（最后一行内容之后）与中间最长连续空白
+    ink_rows = np.flatnonzero(body_rows)
+    if ink_rows.size:
+        trailing_ratio = (body_height - 1 - ink_rows[-1]) / body_height
+        gap_ratio = longest_false_run(body_rows[ink_rows[0]:ink_rows[-1] + 1]) / body_height
+    else:
+        trailing_ratio = 1.0
+        gap_ratio = 0.0
+
+    issues = []
+    if coverage < BLANK_COVERAGE:
+        issues.append('blank')
+    else:
+        if trailing_ratio > TRAILING_BLANK_RATIO:
+            issues.append('trailing-whitespace')
+        if gap_ratio > GAP_BLANK_RATIO:
+            issues.append('whitespace-gap')
+    if intrusion_mm > INTRUSION_TOLERANCE_MM:
+        issues.append('margin-intrusion')
+
+    return {
+        'file': Path(image_path).name,
+        'dpi': dpi,
+        'inkCoverage': round(coverage, 5),
+        'marginIntrusionMm': round(intrusion_mm, 1),
+        'trailingWhitespace': round(float(trailing_ratio), 3),
+        'largestGap': round(float(gap_ratio), 3),
+        'issues': issues,
+    }
+
+
+def write_html_report(report, output_file):
+    """生成HTML可视化报告"""
+    issue_names = {
+        'blank': '空白页',
+        'trailing-whitespace': '底部大段留白',
+        'whitespace-gap': '中间大段留白',
+        'margin-intrusion': '内容越界',
+    }
+    rows = []
+    for page in report['pages']:
+        flagged = ' class="flagged"' if page['issues'] else ''
+        issues = '、'.join(issue_names.get(i, i) for i in page['issues']) or '✓'
+        rows.append(
+            f'<tr{flagged}><td><a href="{html.escape(page["file"])}">'
+            f'<img src="{html.escape(page["file"])}" loading="lazy"></a></td>'
+            f'<td>{html.escape(page["file"])}</td><td>{page["inkCoverage"]:.4f}</td>'
+            f'<td>{page["marginIntrusionMm"]}</td><td>{page["trailingWhitespace"]:.0%}</td>'
+            f'<td>{page["largestGap"]:.0%}</td><td>{issues}</td></tr>'
+        )
+    summary = report['summary']
+    temp_file = Path(output_file).with_name(Path(output_file).name + '.tmp')
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        f.write(f'''<!DOCTYPE html>
+<html lang="zh-CN"><head><meta charset="utf-8"><title>版面质检报告</title>
+<style>
+body{{font-family:sans-serif;margin:24px}}
+table{{border-collapse:collapse}}
+td,th{{border:1px solid #ccc;padding:4px 8px;text-align:center}}
+img{{width:120px;border:1px solid #999}}
+tr.flagged{{background:#fde8e8}}
+</style></head><body>
+<h1>版面质检报告</h1>
+<p>共 {summary["pages"]} 页，可疑页面 {summary["flagged"]} 页</p>
+<table><tr><th>预览</th><th>文件</th><th>墨迹占比</th><th>越界(mm)</th><th>底部留白</th><th>最大空白</th><th>问题</th></tr>
+{chr(10).join(rows)}
+</table></body></html>
+''')
+    os.replace(temp_file, output_file)
+
+
+def run_qa(screenshots_dir, dpi=None, style_file=None, jobs=None):
+    """
+    对截图目录做版面质检
+
+    返回:
+        dict: 报告（同时写出 layout-qa.json / layout-qa.html）
+    """
+    screenshots_dir = Path(screenshots_dir)
+    pages = sorted(
+        f for f in screenshots_dir.glob('page-*')
+        if f.suffix.lower() in IMAGE_SUFFIXES
+    )
+    if not pages:
+        print(f"❌ 未找到截图: {screenshots_dir}")
+        return None
+
+    # DPI优先取参数，其次取增量截图清单中的记录，再次取图片自带的DPI信息
+    if dpi is None:
+        manifest_file = screenshots_dir / '.screenshots-manifest.json'
+        if manifest_file.exists():
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                dpi = json.load(f).get('dpi')
+
+    margins = load_margins(style_file)
+
+    print(f"🔍 质检 {len(pages)} 页...")
+    with events.stage('qa', pages=len(pages)):
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+            results = list(executor.map(
+                analyze_page, pages, [dpi] * len(pages), [margins] * len(pages)
+            ))
+        for r in results:
+            events.item('qa-page', r['file'], issues=r['issues'], inkCoverage=r['inkCoverage'])
+
+    flagged = [r for r in results if r['issues']]
+    report = {
+        'summary': {'pages': len(results), 'flagged': len(flagged)},
+        'pages': results,
+    }
+
+    temp_file = screenshots_dir / 'layout-qa.json.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(temp_file, screenshots_dir / 'layout-qa.json')
+    write_html_report(report, screenshots_dir / 'layout-qa.html')
+
+    for r in flagged:
+        events.warning(f"{r['file']}: {', '.join(r['issues'])}", f"  ⚠️  {r['file']}: {', '.join(r['issues'])}")
+    print(f"\n📊 可疑页面: {len(flagged)}/{len(results)}")
+    print(f"📄 报告: {screenshots_dir / 'layout-qa.html'}")
+    return report
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='截图版面质检')
+    parser.add_argument('screenshots_dir', help='截图目录（包含page-NNN.png）')
+    parser.add_argument('--dpi', type=int, default=None, help='截图分辨率（默认读取截图清单或图片DPI信息，否则300）')
+    parser.add_argument('--style', default=None, help='样式配置文件（读取页边距）')
+    parser.add_argument('--jobs', type=int, default=None, help='并行进程数（默认CPU核数）')
+    add_event_arguments(parser)
+    args = parser.parse_args()
+    configure_events('screenshots-qa', args.events, args.quiet)
+
+    if not QA_SUPPORT:
+        print("❌ 缺少依赖: numpy / Pillow")
+        print("   安装命令: pip install numpy pillow")
+        return 1
+
+    style_file = args.style
+    if style_file is None:
+        default_style = Path(__file__).parent.parent / 'templates' / 'docx-styles-yxnu.json'
+        style_file = default_style if default_style.exists() else None
+
+    report = run_qa(args.screenshots_dir, args.dpi, style_file, args.jobs)
+    return 0 if report is not None else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+章节样式解析
+根据大纲层级按规则计算章节的标题样式（docx_type）和正文样式（docx_type_text），
+导出时即时求值，不再需要预先把样式标记写进每个章节文件。
+
+规则（按顺序匹配，先命中者生效）:
+    - 0.x（摘要/Abstract，大纲层级0）→ abstract_title / abstract_content
+    - 一级（第X章）                 → chapter_title / body_text
+    - 二级（X.X）                   → section_title / body_text
+    - 三级及以下（X.X.X...）        → subsection_title / body_text
+
+个别章节需要不同样式时，在 paper/style-overrides.json 中按章节ID覆盖:
+    {
+      "8": {"docx_type": "references_title", "docx_type_text": "reference_item"}
+    }
+"""
+
+import json
+from pathlib import Path
+
+OVERRIDES_FILE = 'style-overrides.json'
+
+# (条件, 标题样式, 正文样式)，条件参数为大纲层级
+STYLE_RULES = (
+    (lambda level: level == 0, 'abstract_title', 'abstract_content'),
+    (lambda level: level == 1, 'chapter_title', 'body_text'),
+    (lambda level: level == 2, 'section_title', 'body_text'),
+    (lambda level: level >= 3, 'subsection_title', 'body_text'),
+)
+
+DEFAULT_STYLE = ('body_text', 'body_text')
+
+
+def level_from_id(chapter_id):
+    """大纲中没有该节点时，按章节ID推断层级：0.x 为0级，其余按段数"""
+    parts = chapter_id.split('.')
+    if parts[0] == '0':
+        return 0
+    return len(parts)
+
+
+class StyleResolver:
+    """按大纲层级和覆盖配置解析章节样式"""
+
+    def __init__(self, outline_nodes=None, overrides=None):
+        self.levels = {
+            node['id']: node['level']
+            for node in outline_nodes or []
+            if 'id' in node and isinstance(node.get('level'), int)
+        }
+        self.overrides = overrides or {}
+        self._cache = {}
+
+    @classmethod
+    def from_paper_dir(cls, paper_dir, outline_nodes=None):
+        """读取 paper/style-overrides.json（不存在时无覆盖）"""
+        overrides_file = Path(paper_dir) / OVERRIDES_FILE
+        overrides = {}
+        if overrides_file.exists():
+            with open(overrides_file, 'r', encoding='utf-8') as f:
+                overrides = json.load(f)
+        return cls(outline_nodes, overrides)
+
+    def level(self, chapter_id):
+        """章节层级：优先取大纲中的level"""
+        if chapter_id in self.levels:
+            return self.levels[chapter_id]
+        return level_from_id(chapter_id)
+
+    def resolve(self, chapter_id):
+        """
+        解析章节样式
+
+        返回:
+            dict: {'level': 层级, 'docx_type': 标题样式, 'docx_type_text': 正文样式}，
+                  chapter_id为空时返回None
+        """
+        if not chapter_id:
+            return None
+        if chapter_id in self._cache:
+            return self._cache[chapter_id]
+
+        level = self.level(chapter_id)
+        title_style, text_style = next(
+            ((title, text) for matches, title, text in STYLE_RULES if matches(level)),
+            DEFAULT_STYLE
+        )
+        style = {'level': level, 'docx_type': title_style, 'docx_type_text': text_style}
+
+        override = self.overrides.get(chapter_id, {})
+        for key in ('docx_type', 'docx_type_text'):
+            if override.get(key):
+                style[key] = override[key]
+
+        self._cache[chapter_id] = style
+        return style
+
+    def unknown_styles(self, style_names):
+        """覆盖配置中引用了样式表里不存在的样式，返回 [(章节ID, 样式名)]"""
+        return [
+            (chapter_id, override[key])
+            for chapter_id, override in sorted(self.overrides.items())
+            for key in ('docx_type', 'docx_type_text')
+            if override.get(key) and override[key] not in style_names
+        ]
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SVG优化工具
+生成器写出的图表SVG中坐标精度过高、每个元素重复携带字体/描边属性，
+文件偏大且栅格化更慢。本工具做无损的结构优化：
+
+    - 坐标四舍五入到指定小数位（默认1位，去掉多余的0）
+    - 重复出现的样式属性组合提取为 <style> 中的类
+    - 删除与画布等大的白色背景矩形、空的 <g> 分组
+
+既可作为模块供生成器写出前调用（optimize_svg），也可对已有文件做后处理。
+
+使用方法:
+    python3 svg_optimize.py <SVG文件或目录...> [--precision N] [--dry-run]
+
+示例:
+    python3 tools/svg_optimize.py paper/assets/diagrams
+    python3 tools/svg_optimize.py paper/assets/diagrams/er/Tab-users.svg --precision 2
+"""
+
+import argparse
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+from collections import Counter
+from pathlib import Path
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+ET.register_namespace('', SVG_NS)
+ET.register_namespace('xlink', 'http://www.w3.org/1999/xlink')
+
+# 坐标类属性：其中的小数统一按精度取整
+NUMERIC_ATTRS = {
+    'x', 'y', 'x1', 'y1', 'x2', 'y2', 'cx', 'cy', 'r', 'rx', 'ry',
+    'width', 'height', 'points', 'd', 'transform', 'stroke-width', 'font-size',
+}
+
+# 可提取到 <style> 的样式属性
+PRESENTATION_ATTRS = (
+    'fill', 'stroke', 'stroke-width', 'stroke-dasharray',
+    'font-family', 'font-size', 'font-weight', 'font-style', 'text-anchor',
+)
+
+LENGTH_ATTRS = {'stroke-width', 'font-size'}
+
+WHITE = {'#fff', '#ffffff', 'white'}
+
+NUMBER_RE = re.compile(r'-?\d*\.\d+(?:[eE][-+]?\d+)?')
+
+DEFAULT_PRECISION = 1
+
+
+def _tag(element):
+    return element.tag.rsplit('}', 1)[-1]
+
+
+def _round_numbers(value, precision):
+    def repl(match):
+        text = f'{round(float(match.group()), precision):.{precision}f}'.rstrip('0').rstrip('.')
+        return '0' if text in ('-0', '') else text
+    return NUMBER_RE.sub(repl, value)
+
+
+def _css_value(attr, value):
+    """属性值写入样式表时，长度类的纯数字需补单位（属性中可省略，CSS中不可省略）"""
+    if attr in LENGTH_ATTRS and re.fullmatch(r'-?[\d.]+', value):
+        return f'{value}px'
+    return value
+
+
+def _is_background(element, width, height):
+    """与画布等大、白色填充、无描边的矩形"""
+    if _tag(element) != 'rect' or element.get('fill', '').lower() not in WHITE:
+        return False
+    if element.get('stroke') not in (None, 'none') or element.get('class'):
+        return False
+    if float(element.get('x', 0) or 0) != 0 or float(element.get('y', 0) or 0) != 0:
+        return False
+    return (element.get('width') in (width, '100%')
+            and element.get('height') in (height, '100%'))
+
+
+def _remove_empty_groups(parent):
+    for child in list(parent):
+        _remove_empty_groups(child)
+        if _tag(child) == 'g' and len(child) == 0 and not (child.text or '').strip():
+            parent.remove(child)
+
+
+def optimize_svg(svg_text, precision=DEFAULT_PRECISION):
+    """
+    优化SVG文本
+
+    参数:
+        svg_text: 原始SVG
+        precision: 坐标保留的小数位数
+
+    返回:
+        str: 优化后的SVG（带XML声明）
+    """
+    root = ET.fromstring(svg_text)
+    width, height = root.get('width'), root.get('height')
+
+    # 删除背景矩形（只检查最前面的直接子元素，之后的矩形可能覆盖其他图形）
+    for child in list(root):
+        if _tag(child) in ('style', 'defs', 'title', 'desc'):
+            continue
+        if _is_background(child, width, height):
+            root.remove(child)
+        break
+
+    _remove_empty_groups(root)
+
+    elements = [el for el in root.iter() if el is not root and _tag(el) != 'style']
+
+    for el in elements:
+        for name in NUMERIC_ATTRS.intersection(el.keys()):
+            el.set(name, _round_numbers(el.get(name), precision))
+
+    # 统计样式属性组合，出现两次以上的提取为类
+    def style_key(el):
+        return tuple((name, el.get(name)) for name in PRESENTATION_ATTRS if el.get(name) is not None)
+
+    usage = Counter(style_key(el) for el in elements)
+    existing_css = ''.join(el.text or '' for el in root.iter(f'{{{SVG_NS}}}style'))
+    classes = {}
+    counter = 0
+    for key, count in usage.most_common():
+        if not key or count < 2:
+            continue
+        while f'.s{counter}' in existing_css:
+            counter += 1
+        classes[key] = f's{counter}'
+        counter += 1
+
+    if classes:
+        for el in elements:
+            name = classes.get(style_key(el))
+            if name is None:
+                continue
+            for attr, _ in style_key(el):
+                del el.attrib[attr]
+            el.set('class', f'{el.get("class")} {name}' if el.get('class') else name)
+
+        rules = [
+            f'.{name}{{' + ';'.join(f'{attr}:{_css_value(attr, value)}' for attr, value in key) + '}'
+            for key, name in sorted(classes.items(), key=lambda item: item[1])
+        ]
+        style = ET.Element(f'{{{SVG_NS}}}style')
+        style.text = ''.join(rules)
+        root.insert(0, style)
+
+    return '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(root, encoding='unicode')
+
+
+def collect_svgs(paths):
+    """展开命令行参数中的目录，返回全部SVG文件"""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(path.rglob('*.svg')))
+        elif path.suffix.lower() == '.svg':
+            files.append(path)
+    return files
+
+
+def main():
+    """命令行入口：优化SVG文件并报告体积变化"""
+    parser = argparse.ArgumentParser(description='SVG结构优化（取整坐标、提取公共样式、删除冗余元素）')
+    parser.add_argument('paths', nargs='+', help='SVG文件或目录（递归处理目录下的 *.svg）')
+    parser.add_argument('--precision', type=int, default=DEFAULT_PRECISION, help='坐标小数位数（默认1）')
+    parser.add_argument('--dry-run', action='store_true', help='只报告体积变化，不写回文件')
+    args = parser.parse_args()
+
+    files = collect_svgs(args.paths)
+    if not files:
+        print("❌ 未找到SVG文件")
+        return 1
+
+    total_before = total_after = 0
+    failed = 0
+    for svg_file in files:
+        original = svg_file.read_text(encoding='utf-8')
+        try:
+            optimized = optimize_svg(original, args.precision)
+        except ET.ParseError as e:
+            print(f"❌ 解析失败: {svg_file} - {e}")
+            failed += 1
+            continue
+        before = len(original.encode('utf-8'))
+        after = len(optimized.encode('utf-8'))
+        total_before += before
+        total_after += after
+        if optimized != original and not args.dry_run:
+            temp_file = svg_file.with_name(svg_file.name + '.tmp')
+            temp_file.write_text(optimized, encoding='utf-8')
+            os.replace(temp_file, svg_file)
+        print(f"  {svg_file.name}: {before / 1024:.1f}KB → {after / 1024:.1f}KB")
+
+    saved = 1 - total_after / total_before if total_before else 0
+    print(f"\n📊 {len(files) - failed} 个文件: {total_before / 1024:.1f}KB → {total_after / 1024:.1f}KB（减少 {saved:.0%}）")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图表文字宽度估算
+供 generate-er-optimized.py、generate-er-overall.py 等SVG生成工具共用，
+不依赖字体文件即可按字号估算中英文混排文本的渲染宽度
+"""
+
+import unicodedata
+from functools import lru_cache
+
+# 拉丁字符宽度表（字号的倍数，近似 Arial / Microsoft YaHei 西文字形）
+LATIN_GLYPH_WIDTHS = {
+    **dict.fromkeys("il.,:;|!'`", 0.28),
+    **dict.fromkeys('fjrtI()[]{}/\\-" ', 0.34),
+    **dict.fromkeys('abcdeghknopqsuvxyz0123456789_$#?*+=<>^~', 0.56),
+    **dict.fromkeys('ABCDEFGHJKLNOPQRSTUVXYZ&', 0.68),
+    **dict.fromkeys('mwMW%@', 0.86),
+}
+DEFAULT_GLYPH_WIDTH = 0.6
+
+
+@lru_cache(maxsize=4096)
+def glyph_width(char):
+    """单个字符宽度（字号的倍数）：中日韩全角字符占满一个字号，其余查拉丁字宽表"""
+    if unicodedata.east_asian_width(char) in ('W', 'F'):
+        return 1.0
+    return LATIN_GLYPH_WIDTHS.get(char, DEFAULT_GLYPH_WIDTH)
+
+
+def measure_text(text, font_size):
+    """估算文本渲染宽度（像素）"""
+    return sum(glyph_width(ch) for ch in text) * font_size
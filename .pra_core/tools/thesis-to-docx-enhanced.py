@@ -5,22 +5,39 @@
 特性:
 - 支持自定义样式配置
 - 自动从outline.json读取章节结构
-- 支持路径变量解析（${er}, ${uml}, ${dfd}, ${flow}, ${tables}）
+- 支持路径变量解析（${er}, ${uml}, ${dfd}, ${flow}, ${tables}, ${impl} 等，可在 paper/path-config.json 中扩展）
+- 构建前生成资源清单（缺失、过大、未被引用），并由后台线程预读图表到有界内存缓冲池
 - 支持图片插入（PNG, SVG）
 - 支持表格生成（从JSON）
 - 处理items数组
+- 章节样式按大纲层级即时解析（paper/style-overrides.json 可按章节覆盖）
+- 输出可复现（相同内容逐字节相同），内容未变化时不改写输出文件，并写出哈希清单 .<文件名>.manifest.json
 
 使用方法:
-    python3 thesis-to-docx-enhanced.py [--style STYLE_FILE] [--output OUTPUT_FILE]
+    python3 thesis-to-docx-enhanced.py [--style STYLE_FILE] [--output OUTPUT_FILE] [--validate] [--snapshot PACK [--allow-stale]]
+                                       [--prefetch-mb 256] [--max-asset-mb 10] [--no-prefetch] [--max-memory MB]
+                                       [--zip-level 6] [--zip-jobs N] [--events TARGET] [--quiet]
+
+    --validate  构建前先校验整个项目（validate_project.py，fail-fast），有错误时不开始导出
+    --snapshot  从项目快照（project_pack.py pack）按需读取大纲、章节和表格，不再逐个打开JSON文件
+                打包后paper目录有修改时中止导出（--allow-stale 仍按快照内容导出）
+    --prefetch-mb   预读缓冲池上限（MB），构建线程用完的资源随即释放
+    --max-asset-mb  超过该大小的图表在资源清单中提示
+    --no-prefetch   不预读，插图时再读取（排查问题用）
+    --max-memory    内存上限（MB）；预计插图总量超过上限的一半时，图片改为保存时从磁盘读取
+    --zip-level     XML部件的压缩级别0-9（默认6）；PNG/JPEG直接存储，大部件并行压缩
+    --events        JSON Lines进度事件（文件、-、fd:N、tcp:host:port、unix:/path，见 pra_events.py）
+    --quiet         不逐项输出章节和图表（阶段汇总和警告照常输出）
 """
 
+import hashlib
+import io
 import json
 import os
+import sqlite3
 import sys
+import time
 import argparse
-import tempfile
-import subprocess
-import shutil
 from pathlib import Path
 from docx import Document
 from docx.shared import Pt, Cm, RGBColor, Inches
@@ -28,38 +45,18 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
 
-# Check for SVG conversion tool
-SVG_SUPPORT = bool(shutil.which('rsvg-convert'))
+from asset_prefetch import DEFAULT_BUFFER_MB, DEFAULT_MAX_ASSET_MB, AssetInventory, AssetPool
+from docx_package import DEFAULT_LEVEL, enable_spilled_images, publish_docx, spilled_image_bytes
+from raster_cache import RASTER_SUPPORT, DEFAULT_DPI, DEFAULT_WIDTH_CM, cache_dir_for, cached_raster, rasterize
+from path_config import PathConfigError, PathResolver
+from pra_events import add_event_arguments, configure_events, events
+from project_index import current_hashes, record_export
+from project_pack import STALE_LABELS, PackReader
+from style_resolver import OVERRIDES_FILE, StyleResolver
+from validate_project import validate_project, print_report
 
-
-class PathResolver:
-    """路径变量解析器"""
-
-    def __init__(self, project_root):
-        self.project_root = Path(project_root)
-        self.path_vars = {
-            'er': self.project_root / 'paper' / 'assets' / 'diagrams' / 'er',
-            'uml': self.project_root / 'paper' / 'assets' / 'diagrams' / 'uml',
-            'dfd': self.project_root / 'paper' / 'assets' / 'diagrams' / 'dfd',
-            'flow': self.project_root / 'paper' / 'assets' / 'diagrams' / 'flow',
-            'tables': self.project_root / 'paper' / 'assets' / 'tables',
-        }
-
-    def resolve(self, path_str):
-        """解析路径变量"""
-        if not path_str or not isinstance(path_str, str):
-            return None
-
-        # 处理 ${var}/file.ext 格式
-        if '${' in path_str:
-            for var_name, var_path in self.path_vars.items():
-                pattern = f'${{{var_name}}}'
-                if pattern in path_str:
-                    resolved = path_str.replace(pattern, str(var_path))
-                    return Path(resolved)
-
-        # 已经是完整路径
-        return Path(path_str)
+# 尚未栅格化的SVG按该大小估算（14cm宽、300 DPI的PNG通常在1MB以内）
+SVG_RASTER_ESTIMATE = 1024 * 1024
 
 
 class StyleManager:
@@ -139,10 +136,13 @@ class StyleManager:
 class ThesisBuilder:
     """论文构建器"""
 
-    def __init__(self, project_root, style_manager):
+    def __init__(self, project_root, style_manager, snapshot=None):
         self.project_root = Path(project_root)
         self.style_manager = style_manager
+        self.snapshot = snapshot
         self.path_resolver = PathResolver(project_root)
+        self.raster_cache_dir = cache_dir_for(self.project_root / 'paper')
+        self.style_resolver = StyleResolver()
         self.doc = Document()
         self._setup_page()
 
@@ -150,6 +150,33 @@ class ThesisBuilder:
         self.figure_counters = {}
         self.table_counters = {}
 
+        # 章节数据缓存（构建前的资源清单和构建共用）
+        self._chapters = {}
+
+        # 预读缓冲池（start_prefetch 之后可用）及预读时新转换的SVG
+        self.asset_pool = None
+        self._converted = set()
+
+        # 图片是否改为保存时从磁盘读取（spill_images 之后为True）
+        self.spilled = False
+
+    def spill_images(self):
+        """此后插入的图片只保存路径和哈希，保存时再从磁盘读取"""
+        enable_spilled_images(self.doc)
+        self.spilled = True
+
+    def estimate_image_bytes(self, inventory):
+        """估算嵌入全部图片所需的内存（相同文件只计一次）"""
+        total = 0
+        for path in {ref.path for ref in inventory.refs if ref.kind == 'image'}:
+            if path.suffix.lower() == '.svg':
+                png_path = cached_raster(path, self.raster_cache_dir, DEFAULT_DPI, DEFAULT_WIDTH_CM)
+                total += png_path.stat().st_size if png_path else SVG_RASTER_ESTIMATE
+            else:
+                stat = self.path_resolver.stat(path)
+                total += stat.st_size if stat is not None else 0
+        return total
+
     def _setup_page(self):
         """设置页面格式"""
         preset = self.style_manager.preset
@@ -189,29 +216,11 @@ class ThesisBuilder:
         return None
 
     def get_title_level_and_style(self, chapter_id):
-        """根据章节ID判断标题层级和样式"""
-        if not chapter_id:
+        """根据章节ID判断标题层级和样式（四级及以下按三级标题处理）"""
+        style = self.style_resolver.resolve(chapter_id)
+        if not style:
             return None, None
-
-        # 特殊处理摘要和Abstract
-        if chapter_id in ['0.1', '0.2']:
-            return 0, 'abstract_title'
-
-        # 统计点号数量来判断层级
-        dot_count = chapter_id.count('.')
-
-        if dot_count == 0:
-            # 一级标题：1, 2, 3
-            return 1, 'chapter_title'
-        elif dot_count == 1:
-            # 二级标题：1.1, 2.1, 4.1
-            return 2, 'section_title'
-        elif dot_count == 2:
-            # 三级标题：1.1.1, 4.1.2
-            return 3, 'subsection_title'
-        else:
-            # 更深层级，默认使用三级标题样式
-            return 3, 'subsection_title'
+        return min(style['level'], 3), style['docx_type']
 
     def get_next_figure_number(self, chapter_num):
         """获取下一个图编号"""
@@ -228,49 +237,140 @@ class ThesisBuilder:
         return f"{chapter_num}-{self.table_counters[chapter_num]}"
 
     def load_outline(self):
-        """加载论文大纲"""
+        """加载论文大纲，并据此初始化章节样式解析"""
+        if self.snapshot is not None:
+            outline_nodes = (self.snapshot.outline() or {}).get('outline', [])
+            self.style_resolver = StyleResolver(outline_nodes, self.snapshot.load(OVERRIDES_FILE, {}))
+            return outline_nodes
+
         outline_file = self.project_root / 'paper' / 'outline.json'
         with open(outline_file, 'r', encoding='utf-8') as f:
             outline = json.load(f)
-        return outline.get('outline', [])
+        outline_nodes = outline.get('outline', [])
+        self.style_resolver = StyleResolver.from_paper_dir(self.project_root / 'paper', outline_nodes)
+        return outline_nodes
 
     def load_chapter(self, chapter_id):
         """加载章节内容"""
-        chapter_file = self.project_root / 'paper' / 'chapters' / f'chapter.{chapter_id}.json'
-        if not chapter_file.exists():
+        if chapter_id in self._chapters:
+            return self._chapters[chapter_id]
+
+        if self.snapshot is not None:
+            chapter_data = self.snapshot.chapter(chapter_id)
+        else:
+            chapter_file = self.project_root / 'paper' / 'chapters' / f'chapter.{chapter_id}.json'
+            chapter_data = None
+            if self.path_resolver.exists(chapter_file):
+                with open(chapter_file, 'r', encoding='utf-8') as f:
+                    chapter_data = json.load(f)
+
+        self._chapters[chapter_id] = chapter_data
+        return chapter_data
+
+    def chapter_order(self, outline_nodes):
+        """按构建顺序（大纲先序遍历）列出章节 [(章节ID, 章节数据)]"""
+        node_map = {node['id']: node for node in outline_nodes}
+        chapters = []
+
+        def visit(node):
+            chapter_data = self.load_chapter(node.get('id', ''))
+            if chapter_data:
+                chapters.append((node.get('id', ''), chapter_data))
+            for child_id in node.get('children', []):
+                if child_id in node_map:
+                    visit(node_map[child_id])
+
+        for node in outline_nodes:
+            if node.get('parent') is None:
+                visit(node)
+        return chapters
+
+    def build_inventory(self, outline_nodes, max_asset_mb=DEFAULT_MAX_ASSET_MB):
+        """构建前收集并检查大纲中各章节引用的图片和表格"""
+        inventory = AssetInventory(self.path_resolver, self.has_table, max_asset_mb)
+        return inventory.collect(self.chapter_order(outline_nodes))
+
+    def start_prefetch(self, inventory, budget_mb=DEFAULT_BUFFER_MB):
+        """按构建顺序在后台预读清单中的图表"""
+        def size_hint(path):
+            stat = self.path_resolver.stat(path)
+            return stat.st_size if stat is not None else 0
+
+        keys = [ref.path for ref in inventory.refs
+                if ref.kind == 'table' or ref.path.suffix.lower() != '.svg' or RASTER_SUPPORT]
+        self.asset_pool = AssetPool(keys, self._prefetch_asset, size_hint, budget_mb)
+
+    def _prefetch_asset(self, path):
+        """预读线程中读取一个资源，返回 (数据, 占用字节数)；图片磁盘回读时只预先栅格化，返回路径"""
+        if path.suffix.lower() == '.json':
+            stat = self.path_resolver.stat(path)
+            return self.load_table(path), stat.st_size if stat is not None else 0
+        source = path
+        if path.suffix.lower() == '.svg':
+            path, cached = rasterize(path, self.raster_cache_dir, DEFAULT_DPI, DEFAULT_WIDTH_CM)
+            if not cached:
+                self._converted.add(source)
+        if self.spilled:
+            return path, 0
+        data = path.read_bytes()
+        return data, len(data)
+
+    def _take_asset(self, path):
+        """从预读缓冲池取出资源，不在池中时返回None"""
+        if self.asset_pool is None or path not in self.asset_pool:
             return None
+        return self.asset_pool.get(path)
+
+    def stop_prefetch(self):
+        if self.asset_pool is not None:
+            self.asset_pool.close()
 
-        with open(chapter_file, 'r', encoding='utf-8') as f:
+    def _snapshot_key(self, path):
+        """paper目录下的文件在快照中的键，未使用快照或快照中没有时返回None"""
+        if self.snapshot is None:
+            return None
+        try:
+            key = Path(path).relative_to(self.project_root / 'paper').as_posix()
+        except ValueError:
+            return None
+        return key if key in self.snapshot else None
+
+    def has_table(self, table_path):
+        """表格数据是否可用（快照中或磁盘上）"""
+        return self._snapshot_key(table_path) is not None or self.path_resolver.exists(table_path)
+
+    def load_table(self, table_path):
+        """读取表格数据，优先从快照中取"""
+        key = self._snapshot_key(table_path)
+        if key is not None:
+            return self.snapshot.load(key)
+        with open(table_path, 'r', encoding='utf-8') as f:
             return json.load(f)
 
     def insert_image(self, image_path, caption=None, width_cm=14):
         """插入图片"""
-        if not image_path or not image_path.exists():
-            print(f"  ⚠️  图片不存在: {image_path}")
+        if not image_path or not self.path_resolver.exists(image_path):
+            events.warning(f'图片不存在: {image_path}', f"  ⚠️  图片不存在: {image_path}")
             return
 
         try:
-            # 检查是否是SVG文件
-            temp_png_path = None
-            if image_path.suffix.lower() == '.svg':
-                if not SVG_SUPPORT:
-                    print(f"    ⚠️  SVG支持未安装，跳过: {image_path.name}")
+            # 预读过的图片直接从内存插入（SVG已在预读时取得栅格缓存）
+            data = self._take_asset(image_path) if width_cm == DEFAULT_WIDTH_CM else None
+            if data is not None:
+                actual_image_path = str(data) if isinstance(data, Path) else io.BytesIO(data)
+                if image_path in self._converted:
+                    events.item('raster', image_path.name, f"    🔄 转换SVG: {image_path.name} → PNG")
+            # SVG按内容哈希取栅格缓存（生成器 --png 已预先渲染的直接命中）
+            elif image_path.suffix.lower() == '.svg':
+                if not RASTER_SUPPORT:
+                    events.warning(f'SVG支持未安装，跳过: {image_path.name}',
+                                   f"    ⚠️  SVG支持未安装，跳过: {image_path.name}")
                     return
 
-                # 转换SVG到临时PNG文件 (使用rsvg-convert)
-                temp_png_fd, temp_png_path = tempfile.mkstemp(suffix='.png')
-                os.close(temp_png_fd)
-
-                subprocess.run([
-                    'rsvg-convert',
-                    '-d', '300',  # DPI
-                    '-p', '300',  # DPI
-                    '-o', temp_png_path,
-                    str(image_path)
-                ], check=True, capture_output=True)
-
-                actual_image_path = temp_png_path
-                print(f"    🔄 转换SVG: {image_path.name} → PNG")
+                png_path, cached = rasterize(image_path, self.raster_cache_dir, DEFAULT_DPI, width_cm)
+                actual_image_path = str(png_path)
+                if not cached:
+                    events.item('raster', image_path.name, f"    🔄 转换SVG: {image_path.name} → PNG")
             else:
                 actual_image_path = str(image_path)
 
@@ -278,33 +378,30 @@ class ThesisBuilder:
             paragraph = self.doc.add_paragraph()
             paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
             run = paragraph.add_run()
-            run.add_picture(actual_image_path, width=Cm(width_cm))
-
-            # 清理临时文件
-            if temp_png_path:
-                try:
-                    os.unlink(temp_png_path)
-                except:
-                    pass
+            picture = run.add_picture(actual_image_path, width=Cm(width_cm))
+            # 图片名统一取源文件名，与读取方式（内存、磁盘回读、栅格缓存）无关，保证输出可复现
+            picture._inline.graphic.graphicData.pic.nvPicPr.cNvPr.name = image_path.name
 
             # 添加图题
             if caption:
                 p = self.doc.add_paragraph(caption)
                 self.style_manager.apply_style_to_paragraph(p, 'figure_caption')
 
-            print(f"    ✅ 插入图片: {image_path.name}")
+            size = len(data) if isinstance(data, bytes) else os.path.getsize(actual_image_path)
+            events.item('image', image_path.name, f"    ✅ 插入图片: {image_path.name}", bytes=size)
         except Exception as e:
-            print(f"    ❌ 插入图片失败 {image_path.name}: {e}")
+            events.warning(f'插入图片失败 {image_path.name}: {e}', f"    ❌ 插入图片失败 {image_path.name}: {e}")
 
     def insert_table(self, table_path, caption=None):
         """插入表格"""
-        if not table_path or not table_path.exists():
-            print(f"  ⚠️  表格数据不存在: {table_path}")
+        if not table_path or not self.has_table(table_path):
+            events.warning(f'表格数据不存在: {table_path}', f"  ⚠️  表格数据不存在: {table_path}")
             return
 
         try:
-            with open(table_path, 'r', encoding='utf-8') as f:
-                table_data = json.load(f)
+            table_data = self._take_asset(table_path)
+            if table_data is None:
+                table_data = self.load_table(table_path)
 
             # 添加表题
             if caption:
@@ -314,7 +411,7 @@ class ThesisBuilder:
             # 获取列数据
             columns = table_data.get('columns', [])
             if not columns:
-                print(f"    ⚠️  表格数据为空")
+                events.warning(f'表格数据为空: {table_path.name}', f"    ⚠️  表格数据为空")
                 return
 
             # 创建表格
@@ -336,10 +433,12 @@ class ThesisBuilder:
                         for paragraph in cell.paragraphs:
                             self.style_manager.apply_style_to_paragraph(paragraph, 'table_cell')
 
-            print(f"    ✅ 插入表格: {table_path.name} ({len(columns)}行 × {len(columns[0])}列)")
+            events.item('table', table_path.name,
+                        f"    ✅ 插入表格: {table_path.name} ({len(columns)}行 × {len(columns[0])}列)",
+                        rows=len(columns), cols=len(columns[0]))
 
         except Exception as e:
-            print(f"    ❌ 插入表格失败 {table_path.name}: {e}")
+            events.warning(f'插入表格失败 {table_path.name}: {e}', f"    ❌ 插入表格失败 {table_path.name}: {e}")
 
     def add_chapter_content(self, chapter_data):
         """添加章节内容"""
@@ -353,9 +452,10 @@ class ThesisBuilder:
         # 获取章节号（用于图表编号）
         chapter_num = self.get_chapter_number(chapter_id)
 
-        # 获取样式类型
-        title_style = chapter_data.get('docx_type', 'body_text')
-        text_style = chapter_data.get('docx_type_text', 'body_text')
+        # 获取样式类型（按大纲层级解析，章节文件中残留的docx_type不再参与）
+        style = self.style_resolver.resolve(chapter_id)
+        title_style = style['docx_type'] if style else 'body_text'
+        text_style = style['docx_type_text'] if style else 'body_text'
 
         # 添加标题
         if title:
@@ -410,7 +510,7 @@ class ThesisBuilder:
             # 处理子项图片
             if 'imagePath' in item:
                 image_path = self.path_resolver.resolve(item['imagePath'])
-                if image_path and image_path.exists():
+                if image_path and self.path_resolver.exists(image_path):
                     # 生成图编号和标题
                     if chapter_num:
                         fig_num = self.get_next_figure_number(chapter_num)
@@ -422,7 +522,7 @@ class ThesisBuilder:
             # 处理子项表格
             if 'tablePath' in item:
                 table_path = self.path_resolver.resolve(item['tablePath'])
-                if table_path and table_path.exists():
+                if table_path and self.has_table(table_path):
                     # 生成表编号和标题
                     if chapter_num:
                         tab_num = self.get_next_table_number(chapter_num)
@@ -434,7 +534,7 @@ class ThesisBuilder:
         # 处理章节级别的图片
         if 'imagePath' in chapter_data:
             image_path = self.path_resolver.resolve(chapter_data['imagePath'])
-            if image_path and image_path.exists():
+            if image_path and self.path_resolver.exists(image_path):
                 # 生成图编号和标题
                 if chapter_num:
                     fig_num = self.get_next_figure_number(chapter_num)
@@ -446,7 +546,7 @@ class ThesisBuilder:
         # 处理章节级别的表格
         if 'tablePath' in chapter_data:
             table_path = self.path_resolver.resolve(chapter_data['tablePath'])
-            if table_path and table_path.exists():
+            if table_path and self.has_table(table_path):
                 # 生成表编号和标题
                 if chapter_num:
                     tab_num = self.get_next_table_number(chapter_num)
@@ -468,7 +568,7 @@ class ThesisBuilder:
             chapter_data = self.load_chapter(node_id)
             if chapter_data:
                 self.add_chapter_content(chapter_data)
-                print(f"  ✅ {node_id} {node_title}")
+                events.item('chapter', node_id, f"  ✅ {node_id} {node_title}", title=node_title)
             else:
                 # 章节文件不存在时，根据层级添加对应的标题
                 level, style_name = self.get_title_level_and_style(node_id)
@@ -490,9 +590,11 @@ class ThesisBuilder:
                     # 添加标题段落
                     p = self.doc.add_paragraph(formatted_title)
                     self.style_manager.apply_style_to_paragraph(p, style_name)
-                    print(f"  ✅ {formatted_title} (使用大纲标题)")
+                    events.item('chapter', node_id, f"  ✅ {formatted_title} (使用大纲标题)",
+                                title=node_title, outline_only=True)
                 else:
-                    print(f"  ⚠️  {node_id} {node_title} - 未找到章节文件")
+                    events.warning(f'{node_id} {node_title} - 未找到章节文件',
+                                   f"  ⚠️  {node_id} {node_title} - 未找到章节文件")
 
             # 处理子节点（children是ID字符串数组）
             children = node.get('children', [])
@@ -509,9 +611,14 @@ class ThesisBuilder:
         for node in top_nodes:
             process_node(node)
 
-    def save(self, output_path):
-        """保存文档"""
-        self.doc.save(output_path)
+    def save(self, output_path, level=DEFAULT_LEVEL, jobs=None):
+        """
+        保存文档（已压缩的图片直接存储，XML按级别压缩，大部件并行压缩）
+
+        返回:
+            tuple: (是否写出了新文件, 哈希清单)，内容与现有文件相同时不改写
+        """
+        return publish_docx(self.doc, output_path, level, jobs)
 
 
 def main():
@@ -520,7 +627,23 @@ def main():
     parser.add_argument('--style', default=None, help='样式配置文件路径')
     parser.add_argument('--output', default=None, help='输出文件路径')
     parser.add_argument('--project', default=None, help='项目根目录')
+    parser.add_argument('--validate', action='store_true', help='构建前校验整个项目，有错误时中止')
+    parser.add_argument('--snapshot', default=None, help='项目快照文件（project_pack.py pack 生成）')
+    parser.add_argument('--allow-stale', action='store_true',
+                        help='快照打包后paper目录有修改时仍使用快照导出（默认中止）')
+    parser.add_argument('--prefetch-mb', type=float, default=DEFAULT_BUFFER_MB,
+                        help=f'预读缓冲池上限MB（默认{DEFAULT_BUFFER_MB}）')
+    parser.add_argument('--max-asset-mb', type=float, default=DEFAULT_MAX_ASSET_MB,
+                        help=f'超过该大小的图表在资源清单中提示（默认{DEFAULT_MAX_ASSET_MB}）')
+    parser.add_argument('--no-prefetch', action='store_true', help='不预读图表，插入时再读取')
+    parser.add_argument('--max-memory', type=float, default=None,
+                        help='内存上限MB，插图预计超过一半时改为保存时从磁盘读取图片')
+    parser.add_argument('--zip-level', type=int, choices=range(10), default=DEFAULT_LEVEL, metavar='0-9',
+                        help=f'XML部件的压缩级别（默认{DEFAULT_LEVEL}，0为不压缩）')
+    parser.add_argument('--zip-jobs', type=int, default=None, help='并行压缩线程数（默认CPU核数）')
+    add_event_arguments(parser)
     args = parser.parse_args()
+    configure_events('thesis-to-docx', args.events, args.quiet)
 
     # 确定项目根目录
     if args.project:
@@ -551,6 +674,16 @@ def main():
     print(f"📄 输出文件: {output_file}")
     print()
 
+    # 构建前校验：全部问题一次列出，有错误时不开始导出
+    if args.validate:
+        print("🔍 校验项目...")
+        report = validate_project(project_root, style_file, fail_fast=True)
+        print_report(report, project_root)
+        print()
+        if report['errors']:
+            print("❌ 项目校验未通过，已中止导出")
+            return 1
+
     # 加载样式管理器
     print("⚙️  加载样式配置...")
     style_manager = StyleManager(style_file)
@@ -559,22 +692,111 @@ def main():
 
     # 创建论文构建器
     print("🏗️  构建论文...")
-    builder = ThesisBuilder(project_root, style_manager)
+    snapshot = None
+    if args.snapshot:
+        try:
+            snapshot = PackReader(args.snapshot)
+        except (OSError, ValueError) as e:
+            print(f"❌ 无法读取项目快照: {e}")
+            return 1
+        print(f"  📦 使用项目快照: {args.snapshot}（{len(snapshot)} 条记录）")
+        # 快照打包后改过的章节、表格不会出现在导出结果中，默认中止
+        stale = snapshot.stale_records(project_root / 'paper')
+        if stale:
+            for key, status in list(stale.items())[:10]:
+                print(f"    {STALE_LABELS[status]}  {key}")
+            if len(stale) > 10:
+                print(f"    ... 另有 {len(stale) - 10} 个")
+            if not args.allow_stale:
+                print(f"❌ 快照已过期：{len(stale)} 个文件在打包后有变化，"
+                      f"请重新运行 project_pack.py pack，或加 --allow-stale 按快照内容导出")
+                snapshot.close()
+                return 1
+            events.warning(f'快照已过期：{len(stale)} 个文件在打包后有变化',
+                           f"  ⚠️  快照已过期：{len(stale)} 个文件在打包后有变化，按快照内容导出")
+    try:
+        builder = ThesisBuilder(project_root, style_manager, snapshot)
+    except PathConfigError as e:
+        print(f"❌ 路径配置错误: {e}")
+        return 1
 
     # 加载大纲
     outline_nodes = builder.load_outline()
     print(f"  ✅ 已加载大纲，共 {len(outline_nodes)} 个顶层章节")
+    if builder.style_resolver.overrides:
+        print(f"  🎨 样式覆盖: {len(builder.style_resolver.overrides)} 个章节")
+    for chapter_id, style_name in builder.style_resolver.unknown_styles(style_manager.styles):
+        print(f"  ⚠️  样式覆盖 {chapter_id}: 样式表中不存在 {style_name}，将使用默认样式")
+
+    # 构建前取本次所用源文件的哈希（快照中的文件取快照内容），导出成功后作为 query changed 的基准；
+    # 导出期间被修改的文件不会被误记为已导出
+    try:
+        export_hashes = current_hashes(project_root)
+        if snapshot is not None:
+            export_hashes.update(
+                (key, hashlib.sha256(snapshot.read_bytes(key)).hexdigest())
+                for key in snapshot.keys() if key in export_hashes
+            )
+    except sqlite3.Error as e:
+        export_hashes = None
+        events.warning(f'项目索引更新失败: {e}', f"  ⚠️  项目索引更新失败: {e}")
+
+    # 资源清单：缺失的图表在构建前一次列出（构建时对应位置会跳过）
+    with events.stage('inventory'):
+        inventory = builder.build_inventory(outline_nodes, args.max_asset_mb)
+    inventory.print_report()
+    for ref, problem in inventory.missing:
+        events.emit('warning', message=f'{ref.chapter_id} {ref.field}: {ref.raw}（{problem}）')
+    prefetch_mb = args.prefetch_mb
+    if args.max_memory:
+        # 插图驻留内存直到保存，预计超过上限的一半时改为磁盘回读，并收紧预读缓冲
+        image_bytes = builder.estimate_image_bytes(inventory)
+        if image_bytes > args.max_memory * 1024 * 1024 / 2:
+            builder.spill_images()
+            print(f"  💾 预计插图 {image_bytes / 1024 / 1024:.1f} MB，超过内存上限的一半，图片改为保存时从磁盘读取")
+        prefetch_mb = min(prefetch_mb, args.max_memory / 4)
+    if not args.no_prefetch:
+        builder.start_prefetch(inventory, prefetch_mb)
     print()
 
     # 根据大纲构建论文
     print("✍️  生成章节内容（包含图片和表格）...")
-    builder.build_from_outline(outline_nodes)
+    try:
+        with events.stage('build'):
+            builder.build_from_outline(outline_nodes)
+    finally:
+        builder.stop_prefetch()
+    if builder.asset_pool is not None:
+        pool = builder.asset_pool
+        print(f"  📦 预读缓冲峰值 {pool.peak / 1024 / 1024:.1f} MB，构建线程等待 {pool.waits} 次")
+    if builder.spilled:
+        print(f"  💾 磁盘回读图片 {spilled_image_bytes(builder.doc) / 1024 / 1024:.1f} MB（未驻留内存）")
     print()
 
     # 保存文档
     print("💾 保存文档...")
     output_file.parent.mkdir(parents=True, exist_ok=True)
-    builder.save(output_file)
+    save_start = time.perf_counter()
+    with events.stage('save'):
+        changed, manifest = builder.save(output_file, args.zip_level, args.zip_jobs)
+    save_stats = manifest['stats']
+    events.timing('save', time.perf_counter() - save_start, bytes=manifest['size'],
+                  changed=changed, sha256=manifest['sha256'])
+    print(f"  ✅ {save_stats['members']} 个部件：压缩 {save_stats['deflated']}（并行 {save_stats['parallel']}），"
+          f"直接存储 {save_stats['stored']}（{time.perf_counter() - save_start:.2f}秒）")
+    if changed:
+        print(f"  🔑 内容哈希 {manifest['sha256'][:16]}（已更新输出文件）")
+    else:
+        print(f"  ⏭️  内容哈希 {manifest['sha256'][:16]} 与现有文件相同，保留原文件")
+    if snapshot is not None:
+        snapshot.close()
+
+    # 记下本次导出所用各文件的哈希，供 pra.py query changed 比较
+    if export_hashes is not None:
+        try:
+            record_export(project_root, output_file, export_hashes)
+        except sqlite3.Error as e:
+            events.warning(f'项目索引更新失败: {e}', f"  ⚠️  项目索引更新失败: {e}")
 
     print()
     print("=" * 60)
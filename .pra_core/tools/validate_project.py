@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+项目结构校验工具
+导出前一次性检查整个项目的 outline.json、章节文件、表格数据和样式配置，
+把格式错误、不齐的表格行、未知路径变量等问题在构建开始前逐条报告出来，
+而不是在导出到一半时才暴露或被静默跳过。
+
+路径变量取自 path_config（默认变量 + paper/path-config.json）。
+校验规则用精简的JSON Schema子集描述（type/required/properties/items/
+additionalProperties/pattern/enum/minimum/format），启动时编译为校验函数，
+各文件在进程池中并行校验。
+
+使用方法:
+    python3 validate_project.py [--project 项目根目录] [--style 样式文件] [--jobs N] [--fail-fast]
+
+示例:
+    python3 tools/validate_project.py
+    python3 tools/validate_project.py --project projects/canteen-rating --fail-fast
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from path_config import CONFIG_FILE as PATH_CONFIG_FILE, VAR_RE, PathConfigError, PathResolver, asset_refs
+from style_resolver import OVERRIDES_FILE
+
+CHAPTER_ID_PATTERN = r'^\d+(\.\d+)*$'
+
+# ---------------------------------------------------------------------------
+# Schema定义
+# ---------------------------------------------------------------------------
+
+STRING = {'type': 'string'}
+STYLE_NAME = {'type': 'string', 'pattern': r'^[a-z][a-z0-9_]*$'}
+
+ITEM_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'title': STRING,
+        'text': STRING,
+        'word_limit': {'type': 'integer', 'minimum': 0},
+        'imagePath': {'type': 'string', 'format': 'asset-path'},
+        'tablePath': {'type': 'string', 'format': 'asset-path'},
+    },
+    # 子项字段名拼错（如 imagepath）会被导出工具静默忽略，这里直接报错
+    'additionalProperties': False,
+}
+
+CHAPTER_SCHEMA = {
+    'type': 'object',
+    'required': ['id', 'title'],
+    'properties': {
+        'id': {'type': 'string', 'pattern': CHAPTER_ID_PATTERN},
+        'title': STRING,
+        'text': STRING,
+        'content': STRING,
+        'keywords': STRING,
+        'word_limit': {'type': 'integer', 'minimum': 0},
+        'docx_type': STYLE_NAME,
+        'docx_type_text': STYLE_NAME,
+        'docx_type_desc': STYLE_NAME,
+        'imagePath': {'type': 'string', 'format': 'asset-path'},
+        'tablePath': {'type': 'string', 'format': 'asset-path'},
+        'items': {'type': 'array', 'items': ITEM_SCHEMA},
+    },
+}
+
+OUTLINE_SCHEMA = {
+    'type': 'object',
+    'required': ['outline'],
+    'properties': {
+        'metadata': {'type': 'object'},
+        'outline': {
+            'type': 'array',
+            'minItems': 1,
+            'items': {
+                'type': 'object',
+                'required': ['id', 'title'],
+                'properties': {
+                    'id': {'type': 'string', 'pattern': CHAPTER_ID_PATTERN},
+                    'title': STRING,
+                    'level': {'type': 'integer', 'minimum': 0},
+                    'parent': {'type': ['string', 'null']},
+                    'children': {'type': 'array', 'items': STRING},
+                },
+            },
+        },
+    },
+}
+
+TABLE_SCHEMA = {
+    'type': 'object',
+    'required': ['columns'],
+    'properties': {
+        'tableName': STRING,
+        'tableCnName': STRING,
+        'title': STRING,
+        'columns': {
+            'type': 'array',
+            'minItems': 1,
+            'items': {
+                'type': 'array',
+                'minItems': 1,
+                'items': {'type': ['string', 'number', 'null']},
+            },
+        },
+    },
+}
+
+STYLE_ENTRY_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'font': {
+            'type': 'object',
+            'properties': {
+                'name': STRING,
+                'name_cn': STRING,
+                'size': {'type': 'integer', 'minimum': 1},
+                'color': {'type': 'string', 'pattern': r'^[0-9A-Fa-f]{6}$'},
+                'bold': {'type': 'boolean'},
+                'italic': {'type': 'boolean'},
+            },
+            'additionalProperties': False,
+        },
+        'alignment': {'enum': ['left', 'center', 'right', 'justified', 'justify']},
+        'spacing': {
+            'type': 'object',
+            'properties': {
+                'before': {'type': 'number', 'minimum': 0},
+                'after': {'type': 'number', 'minimum': 0},
+                'line': {'type': 'number', 'minimum': 0},
+            },
+            'additionalProperties': False,
+        },
+        'indent': {
+            'type': 'object',
+            'properties': {
+                'firstLine': {'type': 'number'},
+                'left': {'type': 'number'},
+                'right': {'type': 'number'},
+            },
+            'additionalProperties': False,
+        },
+        'headingLevel': {'type': 'integer', 'minimum': 1, 'maximum': 9},
+        'description': STRING,
+        'background': STRING,
+    },
+}
+
+STYLE_SCHEMA = {
+    'type': 'object',
+    'required': ['styles'],
+    'properties': {
+        'styles': {'type': 'object', 'additionalProperties': STYLE_ENTRY_SCHEMA},
+        'presets': {'type': 'object'},
+    },
+}
+
+OVERRIDES_SCHEMA = {
+    'type': 'object',
+    'additionalProperties': {
+        'type': 'object',
+        'properties': {
+            'docx_type': STYLE_NAME,
+            'docx_type_text': STYLE_NAME,
+        },
+        'additionalProperties': False,
+    },
+}
+
+PATH_CONFIG_SCHEMA = {
+    'type': 'object',
+    'required': ['variables'],
+    'properties': {
+        'variables': {'type': 'object', 'additionalProperties': {'type': 'string'}},
+    },
+}
+
+SCHEMAS = {
+    'outline': OUTLINE_SCHEMA,
+    'chapter': CHAPTER_SCHEMA,
+    'table': TABLE_SCHEMA,
+    'style': STYLE_SCHEMA,
+    'overrides': OVERRIDES_SCHEMA,
+    'path-config': PATH_CONFIG_SCHEMA,
+}
+
+# ---------------------------------------------------------------------------
+# Schema编译
+# ---------------------------------------------------------------------------
+
+TYPE_CHECKS = {
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list),
+    'string': lambda v: isinstance(v, str),
+    'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    'boolean': lambda v: isinstance(v, bool),
+    'null': lambda v: v is None,
+}
+
+TYPE_NAMES = {
+    dict: 'object', list: 'array', str: 'string', int: 'integer',
+    float: 'number', bool: 'boolean', type(None): 'null',
+}
+
+
+def _child(path, key):
+    if isinstance(key, int):
+        return f'{path}[{key}]'
+    return f'{path}.{key}' if path else key
+
+
+def compile_schema(schema, formats):
+    """
+    把schema编译为校验函数 validate(value, path, errors)
+
+    参数:
+        schema: JSON Schema子集
+        formats: {格式名: 校验函数(value, path, errors)}
+
+    返回:
+        callable: 错误以 (字段路径, 说明) 追加到errors
+    """
+    checks = []
+
+    if 'type' in schema:
+        types = schema['type'] if isinstance(schema['type'], list) else [schema['type']]
+        type_fns = [TYPE_CHECKS[t] for t in types]
+        expected = ' 或 '.join(types)
+
+        def check_type(value, path, errors):
+            if any(fn(value) for fn in type_fns):
+                return True
+            errors.append((path, f'类型应为 {expected}，实际为 {TYPE_NAMES.get(type(value), type(value).__name__)}'))
+            return False
+    else:
+        def check_type(value, path, errors):
+            return True
+
+    if 'enum' in schema:
+        allowed = schema['enum']
+
+        def check_enum(value, path, errors):
+            if value not in allowed:
+                errors.append((path, f'取值 {value!r} 无效，可选: {", ".join(map(str, allowed))}'))
+        checks.append(check_enum)
+
+    if 'pattern' in schema:
+        pattern = re.compile(schema['pattern'])
+
+        def check_pattern(value, path, errors):
+            if isinstance(value, str) and not pattern.search(value):
+                errors.append((path, f'格式不正确: {value!r}'))
+        checks.append(check_pattern)
+
+    if 'minimum' in schema or 'maximum' in schema:
+        low, high = schema.get('minimum'), schema.get('maximum')
+
+        def check_range(value, path, errors):
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                return
+            if low is not None and value < low:
+                errors.append((path, f'不能小于 {low}，实际为 {value}'))
+            if high is not None and value > high:
+                errors.append((path, f'不能大于 {high}，实际为 {value}'))
+        checks.append(check_range)
+
+    if 'format' in schema:
+        checks.append(formats[schema['format']])
+
+    if 'required' in schema:
+        required = schema['required']
+
+        def check_required(value, path, errors):
+            for key in required:
+                if key not in value:
+                    errors.append((_child(path, key), '缺少必填字段'))
+        checks.append(check_required)
+
+    if 'properties' in schema or 'additionalProperties' in schema:
+        properties = {
+            key: compile_schema(sub, formats) for key, sub in schema.get('properties', {}).items()
+        }
+        additional = schema.get('additionalProperties', True)
+        extra = compile_schema(additional, formats) if isinstance(additional, dict) else None
+
+        def check_properties(value, path, errors):
+            for key, item in value.items():
+                validator = properties.get(key, extra)
+                if validator:
+                    validator(item, _child(path, key), errors)
+                elif additional is False:
+                    errors.append((_child(path, key), '未知字段'))
+        checks.append(check_properties)
+
+    if 'minItems' in schema:
+        min_items = schema['minItems']
+
+        def check_min_items(value, path, errors):
+            if len(value) < min_items:
+                errors.append((path, f'至少需要 {min_items} 项'))
+        checks.append(check_min_items)
+
+    if 'items' in schema:
+        item_validator = compile_schema(schema['items'], formats)
+
+        def check_items(value, path, errors):
+            for index, item in enumerate(value):
+                item_validator(item, _child(path, index), errors)
+        checks.append(check_items)
+
+    def validate(value, path, errors):
+        if check_type(value, path, errors):
+            for check in checks:
+                check(value, path, errors)
+
+    return validate
+
+
+# 当前项目的路径变量解析器（每个工作进程按项目创建一次）
+_resolvers = {}
+
+
+def resolver_for(project_root):
+    key = str(project_root)
+    if key not in _resolvers:
+        _resolvers[key] = PathResolver(project_root)
+    return _resolvers[key]
+
+
+_active_resolver = None
+
+
+def check_asset_path(value, path, errors):
+    """路径字段中的 ${变量} 必须是已定义的变量（默认变量 + path-config.json）"""
+    if value.count('${') != len(VAR_RE.findall(value)):
+        errors.append((path, f'路径变量缺少右括号: {value}'))
+    for name in _active_resolver.unknown_variables(value):
+        errors.append((path, f'未知路径变量 ${{{name}}}（可用: {", ".join(_active_resolver.variables)}）'))
+
+
+FORMATS = {'asset-path': check_asset_path}
+
+# 导入时编译一次；进程池工作进程由fork继承，不再重复编译
+VALIDATORS = {kind: compile_schema(schema, FORMATS) for kind, schema in SCHEMAS.items()}
+
+# ---------------------------------------------------------------------------
+# 单文件校验（进程池任务）
+# ---------------------------------------------------------------------------
+
+
+def _check_chapter(file_path, data, resolver, errors, warnings):
+    expected_id = file_path.name[len('chapter.'):-len('.json')]
+    if isinstance(data.get('id'), str) and data['id'] != expected_id:
+        errors.append(('id', f'与文件名不一致（文件名对应 {expected_id}，实际为 {data["id"]}）'))
+    for field, value in asset_refs(data):
+        resolved = resolver.resolve(value)
+        if resolved is not None and not resolver.exists(resolved):
+            warnings.append((field, f'引用的文件不存在: {value}'))
+
+
+def _check_table(file_path, data, resolver, errors, warnings):
+    columns = data.get('columns')
+    if not isinstance(columns, list) or not columns or not isinstance(columns[0], list):
+        return
+    # 导出时按表头列数建表，行长度不一致会越界或丢列
+    width = len(columns[0])
+    for index, row in enumerate(columns[1:], start=1):
+        if isinstance(row, list) and len(row) != width:
+            errors.append((f'columns[{index}]', f'列数为 {len(row)}，与表头的 {width} 列不一致'))
+
+
+def _check_outline(file_path, data, resolver, errors, warnings):
+    nodes = data.get('outline')
+    if not isinstance(nodes, list):
+        return
+    ids = {}
+    for index, node in enumerate(nodes):
+        if isinstance(node, dict) and isinstance(node.get('id'), str):
+            if node['id'] in ids:
+                errors.append((f'outline[{index}].id', f'ID重复: {node["id"]}（与 outline[{ids[node["id"]]}] 相同）'))
+            ids.setdefault(node['id'], index)
+
+    for index, node in enumerate(nodes):
+        if not isinstance(node, dict):
+            continue
+        node_id = node.get('id')
+        parent = node.get('parent')
+        if isinstance(parent, str) and parent not in ids:
+            errors.append((f'outline[{index}].parent', f'父节点不存在: {parent}'))
+        for child_index, child in enumerate(node.get('children') or []):
+            if not isinstance(child, str):
+                continue
+            if child not in ids:
+                errors.append((f'outline[{index}].children[{child_index}]', f'子节点不存在: {child}'))
+            elif nodes[ids[child]].get('parent') != node_id:
+                warnings.append((f'outline[{index}].children[{child_index}]',
+                                 f'子节点 {child} 的parent不是 {node_id}'))
+
+
+SEMANTIC_CHECKS = {
+    'chapter': _check_chapter,
+    'table': _check_table,
+    'outline': _check_outline,
+}
+
+
+def validate_file(kind, file_path, project_root):
+    """
+    校验单个文件
+
+    返回:
+        dict: {'file', 'kind', 'errors': [(字段, 说明)], 'warnings': [...], 'summary'}，
+              summary中是跨文件检查需要的信息（章节ID、大纲ID、样式名、覆盖项）
+    """
+    file_path = Path(file_path)
+    result = {'file': str(file_path), 'kind': kind, 'errors': [], 'warnings': [], 'summary': None}
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        result['errors'].append(('', f'JSON解析失败: 第{e.lineno}行第{e.colno}列 {e.msg}'))
+        return result
+    except (OSError, UnicodeDecodeError) as e:
+        result['errors'].append(('', f'无法读取: {e}'))
+        return result
+
+    global _active_resolver
+    _active_resolver = resolver_for(project_root)
+    VALIDATORS[kind](data, '', result['errors'])
+    if kind in SEMANTIC_CHECKS and isinstance(data, dict):
+        SEMANTIC_CHECKS[kind](file_path, data, _active_resolver, result['errors'], result['warnings'])
+
+    if isinstance(data, dict):
+        if kind == 'chapter':
+            result['summary'] = data.get('id')
+        elif kind == 'outline' and isinstance(data.get('outline'), list):
+            result['summary'] = [n.get('id') for n in data['outline'] if isinstance(n, dict)]
+        elif kind == 'style' and isinstance(data.get('styles'), dict):
+            result['summary'] = sorted(data['styles'])
+        elif kind == 'overrides':
+            result['summary'] = {
+                chapter_id: override for chapter_id, override in data.items() if isinstance(override, dict)
+            }
+    return result
+
+
+def _validate_job(args):
+    return validate_file(*args)
+
+# ---------------------------------------------------------------------------
+# 整个项目
+# ---------------------------------------------------------------------------
+
+
+def collect_files(project_root, style_file=None):
+    """待校验文件 [(类型, 路径)]"""
+    paper_dir = Path(project_root) / 'paper'
+    style_file = Path(style_file) if style_file else Path(project_root) / 'templates' / 'docx-styles-yxnu.json'
+    files = [('outline', paper_dir / 'outline.json'), ('style', style_file)]
+    files.extend(('chapter', f) for f in sorted((paper_dir / 'chapters').glob('chapter.*.json')))
+    files.extend(('table', f) for f in sorted((paper_dir / 'assets' / 'tables').glob('*.json')))
+    for kind, name in (('overrides', OVERRIDES_FILE), ('path-config', PATH_CONFIG_FILE)):
+        if (paper_dir / name).exists():
+            files.append((kind, paper_dir / name))
+    return files
+
+
+def _cross_check(results, report):
+    """跨文件检查：章节是否在大纲中、样式覆盖引用的样式是否存在"""
+    by_kind = {}
+    for result in results:
+        by_kind.setdefault(result['kind'], []).append(result)
+
+    outline = next((r['summary'] for r in by_kind.get('outline', []) if r['summary']), None)
+    if outline is not None:
+        outline_ids = set(outline)
+        for result in by_kind.get('chapter', []):
+            if isinstance(result['summary'], str) and result['summary'] not in outline_ids:
+                report['warnings'].append((result['file'], 'id', f'章节 {result["summary"]} 不在大纲中，导出时不会出现'))
+
+    styles = next((r['summary'] for r in by_kind.get('style', []) if r['summary']), None)
+    if styles is not None:
+        style_names = set(styles)
+        for result in by_kind.get('overrides', []):
+            for chapter_id, override in sorted((result['summary'] or {}).items()):
+                for key, name in override.items():
+                    if isinstance(name, str) and name not in style_names:
+                        report['errors'].append((result['file'], f'{chapter_id}.{key}', f'样式表中不存在样式 {name}'))
+                if outline is not None and chapter_id not in outline_ids:
+                    report['warnings'].append((result['file'], chapter_id, '大纲中不存在该章节'))
+
+
+def validate_project(project_root, style_file=None, jobs=None, fail_fast=False):
+    """
+    并行校验整个项目
+
+    参数:
+        project_root: 项目根目录
+        style_file: 样式配置（默认 templates/docx-styles-yxnu.json）
+        jobs: 并行进程数
+        fail_fast: 遇到第一个有错误的文件即停止
+
+    返回:
+        dict: {'files': 校验文件数, 'errors': [(文件, 字段, 说明)], 'warnings': [...], 'seconds': 耗时}
+    """
+    started = time.perf_counter()
+    report = {'files': 0, 'errors': [], 'warnings': [], 'seconds': 0.0}
+
+    # 路径变量配置有误时无法检查资源引用，直接报告
+    try:
+        resolver_for(project_root)
+    except PathConfigError as e:
+        report['errors'].append((str(Path(project_root) / 'paper' / PATH_CONFIG_FILE), '', str(e)))
+        report['seconds'] = time.perf_counter() - started
+        return report
+
+    tasks = []
+    for kind, file_path in collect_files(project_root, style_file):
+        if file_path.exists():
+            tasks.append((kind, str(file_path), str(project_root)))
+        else:
+            report['errors'].append((str(file_path), '', '文件不存在'))
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        for result in executor.map(_validate_job, tasks, chunksize=8):
+            results.append(result)
+            report['files'] += 1
+            report['errors'].extend((result['file'], field, message) for field, message in result['errors'])
+            report['warnings'].extend((result['file'], field, message) for field, message in result['warnings'])
+            if fail_fast and result['errors']:
+                executor.shutdown(wait=False, cancel_futures=True)
+                break
+
+    if not (fail_fast and report['errors']):
+        _cross_check(results, report)
+    report['seconds'] = time.perf_counter() - started
+    return report
+
+
+def print_report(report, project_root=None):
+    """输出校验结果，文件路径相对项目根目录显示"""
+    def display(file_path):
+        try:
+            return str(Path(file_path).relative_to(project_root)) if project_root else file_path
+        except ValueError:
+            return file_path
+
+    for file_path, field, message in report['errors']:
+        location = f'{display(file_path)}: {field}' if field else display(file_path)
+        print(f"  ❌ {location}: {message}")
+    for file_path, field, message in report['warnings']:
+        location = f'{display(file_path)}: {field}' if field else display(file_path)
+        print(f"  ⚠️  {location}: {message}")
+    status = '✅' if not report['errors'] else '❌'
+    print(f"{status} 校验 {report['files']} 个文件：错误 {len(report['errors'])} 个，"
+          f"警告 {len(report['warnings'])} 个（{report['seconds']:.2f}秒）")
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='导出前校验整个项目（大纲、章节、表格、样式）')
+    parser.add_argument('--project', default=None, help='项目根目录（默认为工具所在目录的上一级）')
+    parser.add_argument('--style', default=None, help='样式配置文件（默认 templates/docx-styles-yxnu.json）')
+    parser.add_argument('--jobs', type=int, default=None, help='并行进程数（默认CPU核数）')
+    parser.add_argument('--fail-fast', action='store_true', help='遇到第一个有错误的文件即停止')
+    args = parser.parse_args()
+
+    project_root = Path(args.project) if args.project else Path(__file__).parent.parent
+    print(f"🔍 校验项目: {project_root}")
+    report = validate_project(project_root, args.style, args.jobs, args.fail_fast)
+    print_report(report, project_root)
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
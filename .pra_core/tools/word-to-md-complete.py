@@ -246,8 +246,10 @@ def word_to_markdown_complete(word_file, output_dir=None):
 
         # 5. 保存Markdown文件
         md_file = output_dir / f"{base_name}.md"
-        with open(md_file, 'w', encoding='utf-8') as f:
+        temp_file = md_file.with_name(md_file.name + '.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
             f.write(markdown)
+        os.replace(temp_file, md_file)
 
         print(f"✅ Markdown生成成功")
         print(f"📄 文件: {md_file}")
@@ -8,19 +8,72 @@ Word to Screenshots 简化版
     - Poppler: brew install poppler
 
 使用方法:
-    python3 word-to-screenshots.py <word文件路径> [输出目录] [DPI]
+    python3 word-to-screenshots.py <word文件路径|目录> [输出目录] [DPI] [--pool N] [--pages 3-7] [--jobs N]
+                                   [--events 目标] [--quiet]
 
 示例:
     python3 word-to-screenshots.py paper.docx
     python3 word-to-screenshots.py paper.docx reference-papers/ 300
+    python3 word-to-screenshots.py lunwen/ reference-papers/ --pool 2   # 批量模式
+    python3 word-to-screenshots.py paper.docx --pages 3-7                # 只渲染第3~7页
+    python3 word-to-screenshots.py paper.docx --incremental              # 只重新渲染变化的页面
+    python3 word-to-screenshots.py paper.docx --incremental --force      # 全部重新渲染并刷新指纹清单
+    python3 word-to-screenshots.py paper.docx --qa                       # 渲染后版面质检
+    python3 word-to-screenshots.py paper.docx --format webp --contact-sheet
 """
 
+import argparse
+import hashlib
+import json
+import queue
+import re
 import subprocess
 import os
 import sys
 import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
+from pra_events import add_event_arguments, configure_events, events
+
+# LibreOffice自带的Python-UNO桥（可选）：有则常驻实例通过管道接收转换请求
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    UNO_SUPPORT = True
+except ImportError:
+    UNO_SUPPORT = False
+
+# 配置目录加锁（Windows没有fcntl，退化为按进程号区分的配置目录）
+try:
+    import fcntl
+    FLOCK_SUPPORT = True
+except ImportError:
+    FLOCK_SUPPORT = False
+
+# 输出格式转换与缩略图总览（可选）
+try:
+    from PIL import Image, ImageDraw
+    PIL_SUPPORT = True
+except ImportError:
+    PIL_SUPPORT = False
+
+# 输出格式 → 文件扩展名
+IMAGE_FORMATS = {'png': 'png', 'png8': 'png', 'webp': 'webp'}
+
+# 增量截图：页面指纹清单与变更页列表
+MANIFEST_NAME = '.screenshots-manifest.json'
+CHANGED_PAGES_NAME = 'changed-pages.json'
+FINGERPRINT_DPI = 36
+
+# 常驻实例的用户配置目录（跨运行保留，避免每次重新初始化配置）；
+# 每个目录同一时间只由一个实例使用（profile-N.lock 加排他锁），并发运行时取下一个空闲目录
+PROFILE_ROOT = Path(os.environ.get('PRA_SOFFICE_PROFILES',
+                                   Path.home() / '.cache' / 'pra' / 'soffice-profiles'))
+
 
 def check_dependencies():
     """检查必要的依赖是否已安装"""
@@ -56,7 +109,501 @@ def check_dependencies():
     return True, soffice, pdftoppm
 
 
-def word_to_screenshots(word_file, output_dir=None, dpi=300):
+def _uno_props(**kwargs):
+    """构造UNO PropertyValue元组"""
+    props = []
+    for name, value in kwargs.items():
+        prop = PropertyValue()
+        prop.Name = name
+        prop.Value = value
+        props.append(prop)
+    return tuple(props)
+
+
+class SofficeInstance:
+    """单个LibreOffice实例（独立用户配置目录，可与其他实例并发运行）
+
+    有UNO桥时实例常驻后台，通过本地管道接收转换请求，只在启动时付出一次启动开销；
+    没有UNO桥时退化为使用已预热配置目录的单次转换。
+    """
+
+    def __init__(self, soffice, index, timeout=60):
+        self.soffice = soffice
+        self.index = index
+        self.timeout = timeout
+        self.profile_dir = None
+        self.pipe_name = f'pra_soffice_{os.getpid()}_{index}'
+        self.process = None
+        self.desktop = None
+        self._lock_file = None
+
+    def _acquire_profile(self):
+        """从 profile-{index} 起找一个未被其他实例占用的配置目录并加锁，实例关闭前一直持有"""
+        PROFILE_ROOT.mkdir(parents=True, exist_ok=True)
+        if not FLOCK_SUPPORT:
+            self.profile_dir = PROFILE_ROOT / f'profile-{self.index}-{os.getpid()}'
+            return
+        slot = self.index
+        while True:
+            lock_file = open(PROFILE_ROOT / f'profile-{slot}.lock', 'w')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                slot += 1
+                continue
+            self._lock_file = lock_file
+            self.profile_dir = PROFILE_ROOT / f'profile-{slot}'
+            return
+
+    def _release_profile(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _base_args(self):
+        return [self.soffice, '--headless', '--invisible', '--nologo',
+                '--norestore', '--nolockcheck', '--nodefault',
+                f'-env:UserInstallation={self.profile_dir.as_uri()}']
+
+    def start(self):
+        """启动实例并等待管道就绪"""
+        if self.profile_dir is None:
+            self._acquire_profile()
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        if not UNO_SUPPORT:
+            return
+
+        self.process = subprocess.Popen(
+            self._base_args() + [f'--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext'],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        local_ctx = uno.getComponentContext()
+        resolver = local_ctx.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local_ctx)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                ctx = resolver.resolve(
+                    f'uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext')
+                break
+            except Exception:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"LibreOffice实例{self.index}启动失败")
+                time.sleep(0.2)
+        self.desktop = ctx.ServiceManager.createInstanceWithContext(
+            'com.sun.star.frame.Desktop', ctx)
+
+    def alive(self):
+        if not UNO_SUPPORT:
+            return True
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        """关闭实例"""
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+        self._release_profile()
+        self.profile_dir = None
+
+    def restart(self):
+        """实例崩溃后重启"""
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+        self.desktop = None
+        self.start()
+
+    def convert(self, word_path, pdf_path):
+        """将Word文档转换为PDF"""
+        word_path = Path(word_path).resolve()
+        pdf_path = Path(pdf_path).resolve()
+
+        if not UNO_SUPPORT:
+            with tempfile.TemporaryDirectory(dir=pdf_path.parent) as tmp_dir:
+                result = subprocess.run(
+                    self._base_args() + ['--convert-to', 'pdf', '--outdir', tmp_dir, str(word_path)],
+                    capture_output=True,
+                    text=True,
+                    timeout=self.timeout
+                )
+                generated = Path(tmp_dir) / f"{word_path.stem}.pdf"
+                if result.returncode != 0 or not generated.exists():
+                    raise RuntimeError(f"PDF转换失败: {result.stderr.strip()}")
+                generated.replace(pdf_path)
+            return
+
+        # 超时看门狗：卡死的实例直接杀掉，调用方随即收到异常并重启实例
+        process = self.process
+        watchdog = threading.Timer(self.timeout, process.kill)
+        watchdog.start()
+        try:
+            doc = self.desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(str(word_path)), '_blank', 0, _uno_props(Hidden=True))
+            try:
+                doc.storeToURL(uno.systemPathToFileUrl(str(pdf_path)),
+                               _uno_props(FilterName='writer_pdf_Export'))
+            finally:
+                doc.close(True)
+        finally:
+            watchdog.cancel()
+
+
+class SofficePool:
+    """常驻LibreOffice实例池
+
+    用法:
+        with SofficePool(soffice, size=2) as pool:
+            pool.convert('a.docx', 'a.pdf')
+    """
+
+    def __init__(self, soffice, size=1, timeout=60):
+        self.instances = [SofficeInstance(soffice, i, timeout) for i in range(max(1, size))]
+        self._idle = queue.Queue()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def size(self):
+        return len(self.instances)
+
+    def start(self):
+        """并行启动全部实例；任一实例启动失败时关闭已启动的实例（进程和配置目录锁）后抛出"""
+        try:
+            with ThreadPoolExecutor(max_workers=self.size) as executor:
+                list(executor.map(lambda inst: inst.start(), self.instances))
+        except Exception:
+            # 异常从 __enter__ 抛出时 __exit__ 不会执行，须在这里清理
+            self.close()
+            raise
+        for inst in self.instances:
+            self._idle.put(inst)
+
+    def close(self):
+        for inst in self.instances:
+            inst.stop()
+
+    def convert(self, word_path, pdf_path):
+        """借用一个空闲实例完成转换；实例崩溃时重启并重试一次"""
+        inst = self._idle.get()
+        try:
+            if not inst.alive():
+                inst.restart()
+            try:
+                inst.convert(word_path, pdf_path)
+            except Exception:
+                if inst.alive():
+                    raise
+                print(f"  ⚠️  LibreOffice实例{inst.index}已崩溃，正在重启...")
+                inst.restart()
+                inst.convert(word_path, pdf_path)
+        finally:
+            self._idle.put(inst)
+
+
+def page_name(page, ext='png'):
+    """页码 → 截图文件名 page-NNN.ext"""
+    return f"page-{str(page).zfill(3)}.{ext}"
+
+
+def parse_page_range(spec):
+    """解析页码范围: "3-7" → (3, 7)，"5" → (5, 5)，"10-" → (10, None)"""
+    match = re.fullmatch(r'\s*(\d+)\s*(?:(-)\s*(\d*)\s*)?', spec or '')
+    if not match:
+        raise ValueError(f"无效的页码范围: {spec}")
+    first = int(match.group(1))
+    if not match.group(2):
+        last = first
+    else:
+        last = int(match.group(3)) if match.group(3) else None
+    if first < 1 or (last is not None and last < first):
+        raise ValueError(f"无效的页码范围: {spec}")
+    return first, last
+
+
+def get_page_count(pdf_path):
+    """读取PDF页数（依赖Poppler的pdfinfo，不可用时返回None）"""
+    pdfinfo = shutil.which('pdfinfo')
+    if not pdfinfo:
+        return None
+    result = subprocess.run([pdfinfo, str(pdf_path)], capture_output=True, text=True, timeout=30)
+    match = re.search(r'^Pages:\s+(\d+)', result.stdout, re.MULTILINE)
+    return int(match.group(1)) if match else None
+
+
+def split_page_chunks(pages, jobs):
+    """把页码列表切成连续页段（每段对应一次pdftoppm -f/-l调用）"""
+    runs = []
+    for page in sorted(pages):
+        if runs and page == runs[-1][-1] + 1:
+            runs[-1].append(page)
+        else:
+            runs.append([page])
+
+    # 按页数均分给各进程，保持页段连续
+    chunk_size = max(1, -(-len(pages) // max(1, jobs)))
+    chunks = []
+    for run in runs:
+        for i in range(0, len(run), chunk_size):
+            part = run[i:i + chunk_size]
+            chunks.append((part[0], part[-1]))
+    return chunks
+
+
+def _render_chunk(pdf_path, first, last, screenshots_dir, dpi, gray=False):
+    """渲染一个页段，输出直接落为 page-NNN.png（gray=True时为灰度 page-NNN.pgm）"""
+    ext = 'pgm' if gray else 'png'
+    with tempfile.TemporaryDirectory(dir=screenshots_dir, prefix='.render-') as tmp_dir:
+        cmd = ['pdftoppm', '-gray' if gray else '-png', '-r', str(dpi)]
+        if first is not None:
+            cmd += ['-f', str(first)]
+        if last is not None:
+            cmd += ['-l', str(last)]
+        result = subprocess.run(
+            cmd + [str(pdf_path), str(Path(tmp_dir) / 'p')],
+            capture_output=True,
+            text=True,
+            timeout=120
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip())
+
+        # pdftoppm输出名中的数字就是绝对页码（位数随总页数变化）
+        rendered = {}
+        for img_file in Path(tmp_dir).glob(f'p-*.{ext}'):
+            page = int(img_file.stem.rsplit('-', 1)[1])
+            target = screenshots_dir / page_name(page, ext)
+            img_file.replace(target)
+            rendered[page] = target
+        return rendered
+
+
+def render_pages(pdf_path, pages, screenshots_dir, dpi, jobs=None, gray=False):
+    """
+    并行渲染PDF页面为PNG
+
+    参数:
+        pages: 页码列表
+        jobs: 并行进程数（默认CPU核数）
+        gray: 输出灰度PGM（用于页面指纹）
+
+    返回:
+        dict: {页码: 图片路径}
+    """
+    if not pages:
+        return {}
+
+    jobs = jobs or os.cpu_count() or 1
+    chunks = split_page_chunks(pages, jobs)
+    rendered = {}
+    with ThreadPoolExecutor(max_workers=min(jobs, len(chunks))) as executor:
+        futures = [
+            executor.submit(_render_chunk, pdf_path, first, last, screenshots_dir, dpi, gray)
+            for first, last in chunks
+        ]
+        for future in futures:
+            rendered.update(future.result())
+    return rendered
+
+
+def fingerprint_pages(pdf_path, pages, work_dir, jobs=None):
+    """
+    计算页面内容指纹：低分辨率灰度渲染后取像素哈希
+
+    低DPI渲染比全分辨率快一个数量级，版面、文字、图片的任何可见变化都会改变指纹。
+
+    返回:
+        dict: {页码: 指纹}
+    """
+    with tempfile.TemporaryDirectory(dir=work_dir, prefix='.fingerprint-') as tmp_dir:
+        rendered = render_pages(pdf_path, pages, Path(tmp_dir), FINGERPRINT_DPI, jobs, gray=True)
+        return {
+            page: hashlib.sha1(path.read_bytes()).hexdigest()
+            for page, path in rendered.items()
+        }
+
+
+def load_manifest(screenshots_dir):
+    """读取截图目录中的页面指纹清单"""
+    manifest_file = screenshots_dir / MANIFEST_NAME
+    if not manifest_file.exists():
+        return {'version': 1, 'dpi': None, 'pages': {}}
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'version': 1, 'dpi': None, 'pages': {}}
+
+
+def save_manifest(screenshots_dir, manifest):
+    """保存页面指纹清单（临时文件 + 重命名）"""
+    temp_file = screenshots_dir / f'{MANIFEST_NAME}.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_file, screenshots_dir / MANIFEST_NAME)
+
+
+def render_changed_pages(pdf_path, pages, page_count, screenshots_dir, dpi, jobs=None,
+                         image_format='png', force=False):
+    """
+    增量渲染：对比指纹清单，只重新渲染内容变化（或截图缺失）的页面，
+    并写出变更页列表 changed-pages.json 供审阅；force=True 时全部重新渲染，指纹清单照常刷新
+
+    返回:
+        dict: {页码: 图片路径}（仅本次重新渲染的页面）
+    """
+    manifest = load_manifest(screenshots_dir)
+    same_output = (manifest.get('dpi') == dpi
+                   and manifest.get('format', 'png') == image_format)
+    old_pages = manifest.get('pages', {}) if same_output else {}
+    ext = IMAGE_FORMATS[image_format]
+
+    fingerprints = fingerprint_pages(pdf_path, pages, screenshots_dir, jobs)
+    changed = [
+        page for page in pages
+        if force or old_pages.get(str(page)) != fingerprints.get(page)
+        or not (screenshots_dir / page_name(page, ext)).exists()
+    ]
+    removed = sorted(int(p) for p in old_pages if int(p) > page_count)
+
+    print(f"  🔍 指纹对比: {len(changed)}/{len(pages)} 页有变化")
+    rendered = render_pages(pdf_path, changed, screenshots_dir, dpi, jobs)
+
+    new_pages = {p: fp for p, fp in old_pages.items() if int(p) <= page_count}
+    new_pages.update({str(page): fingerprints[page] for page in rendered})
+    save_manifest(screenshots_dir, {
+        'version': 1,
+        'dpi': dpi,
+        'format': image_format,
+        'pageCount': page_count,
+        'pages': dict(sorted(new_pages.items(), key=lambda kv: int(kv[0]))),
+    })
+
+    temp_file = screenshots_dir / f'{CHANGED_PAGES_NAME}.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'pageCount': page_count,
+            'checked': len(pages),
+            'changed': sorted(rendered),
+            'files': [page_name(p, ext) for p in sorted(rendered)],
+            'removed': removed,
+        }, f, ensure_ascii=False, indent=2)
+    os.replace(temp_file, screenshots_dir / CHANGED_PAGES_NAME)
+
+    return rendered
+
+
+def _encode_page(png_path, image_format):
+    """把pdftoppm输出的PNG重新编码为目标格式，返回最终文件路径"""
+    png_path = Path(png_path)
+    with Image.open(png_path) as img:
+        if image_format == 'webp':
+            target = png_path.with_suffix('.webp')
+            # 先写临时文件再替换，已有的同名截图可能是共享存储中的链接
+            temp_file = target.with_name(target.name + '.tmp')
+            img.convert('RGB').save(temp_file, 'WEBP', quality=85, method=4)
+            os.replace(temp_file, target)
+            png_path.unlink()
+        else:
+            # 论文页面以黑白文字为主，256色调色板几乎无损
+            target = png_path
+            img.convert('RGB').quantize(colors=256).save(target, 'PNG', optimize=True,
+                                                          dpi=img.info.get('dpi'))
+
+    # 切换格式后删除同页的其他格式旧文件
+    for ext in set(IMAGE_FORMATS.values()) - {target.suffix[1:]}:
+        png_path.with_suffix(f'.{ext}').unlink(missing_ok=True)
+    return target
+
+
+def encode_pages(rendered, image_format, jobs=None):
+    """
+    并行转换截图格式（png8: 调色板优化PNG；webp: WebP）
+
+    返回:
+        dict: {页码: 最终文件路径}
+    """
+    if image_format == 'png' or not rendered:
+        for path in rendered.values():
+            path.with_suffix('.webp').unlink(missing_ok=True)
+        return rendered
+
+    pages = sorted(rendered)
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        targets = executor.map(_encode_page, [rendered[p] for p in pages],
+                               [image_format] * len(pages))
+        return dict(zip(pages, targets))
+
+
+def _make_thumbnail(image_path, thumb_width):
+    """生成单页缩略图"""
+    with Image.open(image_path) as img:
+        img = img.convert('RGB')
+        img.thumbnail((thumb_width, thumb_width * 2))
+        return img
+
+
+def make_contact_sheets(page_files, screenshots_dir, columns=6, rows=4, thumb_width=240, jobs=None):
+    """
+    生成缩略图总览：每张总览平铺 columns×rows 页，页码标注在缩略图下方
+
+    返回:
+        list: 总览图片路径
+    """
+    if not page_files:
+        return []
+
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        thumbs = list(executor.map(_make_thumbnail, page_files, [thumb_width] * len(page_files)))
+
+    gap, label_height = 12, 20
+    cell_w = thumb_width + gap
+    cell_h = max(t.height for t in thumbs) + label_height + gap
+    per_sheet = columns * rows
+
+    sheets = []
+    for old in screenshots_dir.glob('contact-sheet-*.png'):
+        old.unlink()
+    for sheet_idx in range(0, len(thumbs), per_sheet):
+        batch = list(zip(page_files, thumbs))[sheet_idx:sheet_idx + per_sheet]
+        used_rows = -(-len(batch) // columns)
+        sheet = Image.new('RGB', (columns * cell_w + gap, used_rows * cell_h + gap), 'white')
+        draw = ImageDraw.Draw(sheet)
+        for idx, (page_file, thumb) in enumerate(batch):
+            x = gap + (idx % columns) * cell_w
+            y = gap + (idx // columns) * cell_h
+            sheet.paste(thumb, (x, y))
+            draw.rectangle([x - 1, y - 1, x + thumb.width, y + thumb.height], outline='#999999')
+            draw.text((x + thumb.width // 2 - 20, y + thumb.height + 4), Path(page_file).stem, fill='black')
+
+        target = screenshots_dir / f"contact-sheet-{sheet_idx // per_sheet + 1:02d}.png"
+        sheet.quantize(colors=256).save(target, 'PNG', optimize=True)
+        sheets.append(target)
+    return sheets
+
+
+def word_to_screenshots(word_file, output_dir=None, dpi=300, pool=None, page_range=None, jobs=None,
+                        incremental=False, qa=False, image_format='png', contact_sheet=False, force=False):
     """
     将Word文档转换为截图
 
@@ -64,6 +611,14 @@ def word_to_screenshots(word_file, output_dir=None, dpi=300):
         word_file: Word文档路径
         output_dir: 输出目录（默认为reference-papers）
         dpi: 分辨率（默认300）
+        pool: SofficePool实例（可选，提供时复用常驻LibreOffice转换PDF）
+        page_range: 只渲染的页码范围 (first, last)，last为None表示到最后一页
+        jobs: 并行渲染进程数（默认CPU核数）
+        incremental: 只重新渲染内容指纹发生变化的页面
+        qa: 渲染完成后运行 screenshots-qa.py 版面质检
+        image_format: 输出格式 png / png8（调色板优化PNG）/ webp
+        contact_sheet: 额外生成缩略图总览 contact-sheet-NN.png
+        force: 增量模式下忽略指纹清单，全部重新渲染
 
     返回:
         bool: 转换是否成功
@@ -74,7 +629,7 @@ def word_to_screenshots(word_file, output_dir=None, dpi=300):
         print(f"❌ 文件不存在: {word_file}")
         return False
 
-    if not (word_file.endswith('.docx') or word_file.endswith('.doc')):
+    if word_path.suffix.lower() not in ('.docx', '.doc'):
         print(f"❌ 仅支持.docx或.doc格式")
         return False
 
@@ -83,6 +638,11 @@ def word_to_screenshots(word_file, output_dir=None, dpi=300):
     if not deps_ok:
         return False
 
+    if (image_format != 'png' or contact_sheet) and not PIL_SUPPORT:
+        print("❌ 输出格式转换和缩略图总览需要Pillow")
+        print("   安装命令: pip install pillow")
+        return False
+
     # 创建输出目录
     if output_dir is None:
         output_dir = Path.cwd() / 'reference-papers'
@@ -103,57 +663,96 @@ def word_to_screenshots(word_file, output_dir=None, dpi=300):
     try:
         # 步骤1: Word → PDF
         print(f"\n🔄 步骤1: 转换Word为PDF...")
-        result = subprocess.run(
-            [soffice, '--headless', '--convert-to', 'pdf',
-             '--outdir', str(screenshots_dir), str(word_path)],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-
-        if result.returncode != 0:
-            print(f"❌ PDF转换失败: {result.stderr}")
-            return False
-
-        # LibreOffice会生成 basename.pdf
-        generated_pdf = screenshots_dir / f"{base_name}.pdf"
-        if generated_pdf.exists() and generated_pdf != temp_pdf:
-            generated_pdf.rename(temp_pdf)
+        with events.stage('pdf', document=base_name):
+            if pool is not None:
+                try:
+                    pool.convert(word_path, temp_pdf)
+                except Exception as e:
+                    events.warning(f"{base_name}: PDF转换失败: {e}", f"❌ PDF转换失败: {e}")
+                    return False
+            else:
+                result = subprocess.run(
+                    [soffice, '--headless', '--convert-to', 'pdf',
+                     '--outdir', str(screenshots_dir), str(word_path)],
+                    capture_output=True,
+                    text=True,
+                    timeout=60
+                )
+
+                if result.returncode != 0:
+                    events.warning(f"{base_name}: PDF转换失败: {result.stderr.strip()}", f"❌ PDF转换失败: {result.stderr}")
+                    return False
+
+                # LibreOffice会生成 basename.pdf
+                generated_pdf = screenshots_dir / f"{base_name}.pdf"
+                if generated_pdf.exists() and generated_pdf != temp_pdf:
+                    generated_pdf.rename(temp_pdf)
 
         if not temp_pdf.exists():
-            print("❌ PDF文件未生成")
+            events.warning(f"{base_name}: PDF文件未生成", "❌ PDF文件未生成")
             return False
 
         print("✅ PDF生成成功")
 
-        # 步骤2: PDF → PNG
+        # 步骤2: PDF → PNG（按页段并行渲染）
         print(f"\n🔄 步骤2: 转换PDF为图片...")
-        output_prefix = screenshots_dir / 'page'
-
-        result = subprocess.run(
-            ['pdftoppm', '-png', '-r', str(dpi),
-             str(temp_pdf), str(output_prefix)],
-            capture_output=True,
-            text=True,
-            timeout=120
-        )
-
-        if result.returncode != 0:
-            print(f"❌ 图片转换失败: {result.stderr}")
+        page_count = get_page_count(temp_pdf)
+        first, last = page_range or (1, None)
+        if page_count is not None and first > page_count:
+            message = f"页码范围超出文档页数: 从第 {first} 页开始，文档共 {page_count} 页"
+            events.warning(f"{base_name}: {message}", f"❌ {message}")
             return False
 
-        print("✅ 图片生成成功")
-
-        # 重命名图片文件
-        print(f"\n📝 重命名图片文件...")
-        image_files = sorted(screenshots_dir.glob('page-*.png'))
-        renamed_files = []
-
-        for idx, img_file in enumerate(image_files, 1):
-            new_name = f"page-{str(idx).zfill(3)}.png"
-            new_path = screenshots_dir / new_name
-            img_file.rename(new_path)
-            renamed_files.append(new_path)
+        if incremental and page_count is None:
+            print("  ⚠️  未找到pdfinfo，无法增量渲染，改为全量渲染")
+            incremental = False
+
+        with events.stage('render', document=base_name, dpi=dpi):
+            try:
+                if page_count is None:
+                    # 页数未知（无pdfinfo），单进程渲染
+                    rendered = _render_chunk(temp_pdf, first, last, screenshots_dir, dpi)
+                    target_pages = sorted(rendered)
+                    if not rendered:
+                        # 越界的范围由pdftoppm静默跳过，不能当作成功
+                        raise RuntimeError("页码范围内没有生成任何页面")
+                else:
+                    last = min(last or page_count, page_count)
+                    target_pages = list(range(first, last + 1))
+                    if incremental:
+                        rendered = render_changed_pages(temp_pdf, target_pages, page_count,
+                                                        screenshots_dir, dpi, jobs, image_format, force)
+                    else:
+                        rendered = render_pages(temp_pdf, target_pages, screenshots_dir, dpi, jobs)
+                        # 非增量渲染后旧指纹不再对应截图内容
+                        (screenshots_dir / MANIFEST_NAME).unlink(missing_ok=True)
+            except RuntimeError as e:
+                events.warning(f"{base_name}: 图片转换失败: {e}", f"❌ 图片转换失败: {e}")
+                return False
+
+            print(f"✅ 图片生成成功（{len(rendered)} 页）")
+
+            if image_format != 'png':
+                print(f"🗜️  并行编码为 {image_format}...")
+            rendered = encode_pages(rendered, image_format, jobs)
+            ext = IMAGE_FORMATS[image_format]
+            # 逐页事件（不逐页输出到控制台）
+            for page, path in sorted(rendered.items()):
+                events.item('page', Path(path).name, document=base_name, page=page,
+                            bytes=Path(path).stat().st_size)
+
+        # 全量渲染时清理上一次遗留的多余页面
+        if not page_range and page_count:
+            for stale in screenshots_dir.glob('page-*.*'):
+                if stale.suffix[1:] in IMAGE_FORMATS.values() and int(stale.stem.rsplit('-', 1)[1]) > page_count:
+                    stale.unlink()
+
+        renamed_files = [screenshots_dir / page_name(p, ext) for p in target_pages]
+
+        if contact_sheet:
+            all_pages = sorted(screenshots_dir.glob(f'page-*.{ext}'))
+            sheets = make_contact_sheets(all_pages, screenshots_dir, jobs=jobs)
+            print(f"🖼️  缩略图总览: {len(sheets)} 张")
 
         # 清理临时PDF
         if temp_pdf.exists():
@@ -167,44 +766,127 @@ def word_to_screenshots(word_file, output_dir=None, dpi=300):
         print(f"  - 总页数: {len(renamed_files)}")
         print(f"  - 总大小: {total_size / 1024 / 1024:.2f} MB")
         print(f"  - 分辨率: {dpi} DPI")
+        print(f"  - 格式: {image_format}")
         print(f"  - 输出目录: {screenshots_dir.name}")
 
+        if qa:
+            print(f"\n🔄 步骤3: 版面质检...")
+            # 质检子进程写入同一事件流
+            env, pass_fds = events.child_environment()
+            result = subprocess.run([
+                sys.executable, str(Path(__file__).parent / 'screenshots-qa.py'),
+                str(screenshots_dir), '--dpi', str(dpi)
+            ] + (['--jobs', str(jobs)] if jobs else []), env=env, pass_fds=pass_fds)
+            if result.returncode != 0:
+                events.warning(f"{base_name}: 版面质检失败（退出码 {result.returncode}）",
+                               f"❌ 版面质检失败（退出码 {result.returncode}）")
+                return False
+
         print("\n🎉 转换完成！")
         print(f"\n📂 图片位置: {screenshots_dir}")
 
         return True
 
     except subprocess.TimeoutExpired:
-        print("❌ 转换超时（文件可能过大）")
+        events.warning(f"{base_name}: 转换超时", "❌ 转换超时（文件可能过大）")
         return False
     except Exception as e:
-        print(f"❌ 转换失败: {e}")
+        events.warning(f"{base_name}: 转换失败: {e}", f"❌ 转换失败: {e}")
         import traceback
         traceback.print_exc()
         return False
 
 
+def word_to_screenshots_batch(word_files, output_dir=None, dpi=300, pool_size=1,
+                              page_range=None, jobs=None, incremental=False, qa=False,
+                              image_format='png', contact_sheet=False, force=False):
+    """
+    批量转换多个Word文档，所有文档共用一个常驻LibreOffice实例池
+
+    返回:
+        dict: {文档路径: 是否成功}
+    """
+    deps_ok, soffice, _ = check_dependencies()
+    if not deps_ok:
+        return {str(f): False for f in word_files}
+
+    print(f"🚀 启动 {pool_size} 个LibreOffice实例" + ("" if UNO_SUPPORT else "（未检测到UNO，使用预热配置单次转换）"))
+    with SofficePool(soffice, size=pool_size) as pool:
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            futures = {
+                str(f): executor.submit(word_to_screenshots, str(f), output_dir, dpi, pool,
+                                       page_range, jobs, incremental, qa,
+                                       image_format, contact_sheet, force)
+                for f in word_files
+            }
+            results = {name: future.result() for name, future in futures.items()}
+
+    ok = sum(1 for v in results.values() if v)
+    print(f"\n📦 批量完成: {ok}/{len(results)} 个文档成功")
+    return results
+
+
 def main():
     """命令行入口"""
-    if len(sys.argv) < 2:
-        print("使用方法:")
-        print(f"  python3 {sys.argv[0]} <word文件路径> [输出目录] [DPI]")
-        print("\n示例:")
-        print(f"  python3 {sys.argv[0]} paper.docx")
-        print(f"  python3 {sys.argv[0]} paper.docx reference-papers/")
-        print(f"  python3 {sys.argv[0]} paper.docx reference-papers/ 300")
-        print("\n默认输出目录: reference-papers/")
-        print("默认DPI: 300")
-        sys.exit(1)
-
-    word_file = sys.argv[1]
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else None
-    dpi = int(sys.argv[3]) if len(sys.argv) > 3 else 300
-
-    success = word_to_screenshots(word_file, output_dir, dpi)
+    parser = argparse.ArgumentParser(
+        description='将Word文档转换为PNG截图（每页一张）',
+        epilog='默认输出目录: reference-papers/，默认DPI: 300'
+    )
+    parser.add_argument('word_file', help='Word文件路径，或包含多个Word文件的目录（批量模式）')
+    parser.add_argument('output_dir', nargs='?', default=None, help='输出目录')
+    parser.add_argument('dpi', nargs='?', type=int, default=300, help='分辨率')
+    parser.add_argument('--pool', type=int, default=0,
+                        help='常驻LibreOffice实例数（默认0：每个文档单独启动soffice；批量模式至少1个）')
+    parser.add_argument('--pages', default=None, metavar='3-7',
+                        help='只渲染指定页码范围，如 3-7、5 或 10-（默认全部）')
+    parser.add_argument('--jobs', type=int, default=None, help='并行渲染进程数（默认CPU核数）')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量模式：只重新渲染内容变化的页面，并写出changed-pages.json')
+    parser.add_argument('--force', action='store_true',
+                        help='与--incremental同用：忽略指纹清单全部重新渲染，并刷新清单')
+    parser.add_argument('--qa', action='store_true',
+                        help='渲染完成后做版面质检（空白页、越界、大段留白），写出layout-qa报告')
+    parser.add_argument('--format', dest='image_format', choices=sorted(IMAGE_FORMATS), default='png',
+                        help='输出格式：png（默认）、png8（调色板优化PNG）、webp')
+    parser.add_argument('--contact-sheet', action='store_true',
+                        help='额外生成缩略图总览 contact-sheet-NN.png')
+    add_event_arguments(parser)
+    args = parser.parse_args()
+    configure_events('word-to-screenshots', args.events, args.quiet)
+
+    try:
+        page_range = parse_page_range(args.pages) if args.pages else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    word_path = Path(args.word_file)
+    if word_path.is_dir():
+        word_files = sorted(
+            f for f in word_path.iterdir()
+            if f.suffix.lower() in ('.docx', '.doc') and not f.name.startswith('.~')
+        )
+        if not word_files:
+            print(f"❌ 目录中没有Word文件: {word_path}")
+            sys.exit(1)
+        results = word_to_screenshots_batch(word_files, args.output_dir, args.dpi, max(1, args.pool),
+                                             page_range, args.jobs, args.incremental, args.qa,
+                                             args.image_format, args.contact_sheet, args.force)
+        sys.exit(0 if all(results.values()) else 1)
+
+    if args.pool > 0:
+        results = word_to_screenshots_batch([word_path], args.output_dir, args.dpi, args.pool,
+                                             page_range, args.jobs, args.incremental, args.qa,
+                                             args.image_format, args.contact_sheet, args.force)
+        sys.exit(0 if all(results.values()) else 1)
+
+    success = word_to_screenshots(args.word_file, args.output_dir, args.dpi,
+                                  page_range=page_range, jobs=args.jobs,
+                                  incremental=args.incremental, qa=args.qa,
+                                  image_format=args.image_format, contact_sheet=args.contact_sheet,
+                                  force=args.force)
 
     sys.exit(0 if success else 1)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()